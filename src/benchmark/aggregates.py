@@ -0,0 +1,320 @@
+import json
+import math
+from pathlib import Path
+from typing import Any, Iterable
+
+from benchmark.result_format import expand_results
+from benchmark.sketches import add_value, empty_sketch, get_quantiles, merge_sketch
+
+
+AGGREGATES_VERSION = 5
+
+# Metrics tracked per model; each keeps n/sum/sumsq so means and variances
+# can be derived without re-reading the individual results.
+METRIC_FIELDS = (
+    "wer",
+    "cer",
+    "accuracy",
+    "time",
+    "payload_bytes",
+    "queue_wait",
+    "encode_time",
+    "ttft",
+    "generation_time",
+    "tokens_per_sec",
+    "prompt_tokens",
+    "completion_tokens",
+    "cost",
+)
+
+# Metrics only some results have, averaged over the results that do, with the
+# rounding of their summary field. `time` stays the end-to-end request latency.
+OPTIONAL_METRICS = {
+    "payload_bytes": 1,
+    "queue_wait": 15,
+    "encode_time": 15,
+    "ttft": 15,
+    "generation_time": 15,
+    "tokens_per_sec": 15,
+    "prompt_tokens": 1,
+    "completion_tokens": 1,
+    "cost": 10,
+}
+
+# Metrics whose distribution is also tracked, in a mergeable quantile sketch
+# (see sketches), with the scale of their summary field: latencies in seconds,
+# error rates as percentages like their averages.
+SKETCHED_METRICS = {
+    "time": 1,
+    "ttft": 1,
+    "wer": 100,
+    "cer": 100,
+}
+
+PERCENTILES = (50, 95, 99)
+QUANTILES = tuple(percentile / 100 for percentile in PERCENTILES)
+
+
+def empty_model_stats() -> dict[str, Any]:
+    """
+    Create an empty running aggregate for one model in one folder.
+
+    Returns:
+        Aggregate with an image count and per-metric n/sum/sumsq accumulators,
+        plus a quantile sketch for the sketched metrics
+    """
+    stats: dict[str, Any] = {"images": 0}
+    for field in METRIC_FIELDS:
+        stats[field] = {"n": 0, "sum": 0.0, "sumsq": 0.0}
+        if field in SKETCHED_METRICS:
+            stats[field]["sketch"] = empty_sketch()
+    return stats
+
+
+def add_entry(stats: dict[str, Any], entry: dict[str, Any], sign: int = 1) -> None:
+    """
+    Add (sign=1) or remove (sign=-1) one per-image model entry from an aggregate.
+
+    Missing or null metric values are skipped but the image is still counted,
+    matching how folder summaries have always been computed.
+
+    Args:
+        stats: Running aggregate to update in place
+        entry: Per-image model entry (as stored in the image's JSON file)
+        sign: 1 to add the entry, -1 to remove a previously added one
+    """
+    stats["images"] += sign
+    for field in METRIC_FIELDS:
+        value = entry.get(field)
+        if value is None:
+            continue
+        acc = stats[field]
+        acc["n"] += sign
+        acc["sum"] += sign * value
+        acc["sumsq"] += sign * value * value
+        if field in SKETCHED_METRICS:
+            add_value(acc["sketch"], value, sign)
+
+
+def empty_aggregates() -> dict[str, Any]:
+    """
+    Create an empty aggregates state for a folder.
+    """
+    return {"version": AGGREGATES_VERSION, "models": {}}
+
+
+def apply_updates(
+    aggregates: dict[str, Any],
+    updates: Iterable[tuple[str, dict[str, Any], dict[str, Any] | None]],
+) -> None:
+    """
+    Apply result updates to a folder's aggregates state.
+
+    Args:
+        aggregates: Folder aggregates state to update in place
+        updates: (model_id, new_entry, previous_entry) triples; previous_entry is the
+            entry being replaced for the same image, or None for a new result
+    """
+    models = aggregates["models"]
+    for model_id, new_entry, previous_entry in updates:
+        stats = models.setdefault(model_id, empty_model_stats())
+        if isinstance(previous_entry, dict):
+            add_entry(stats, previous_entry, sign=-1)
+        add_entry(stats, new_entry)
+        if stats["images"] <= 0:
+            del models[model_id]
+
+
+def scan_aggregates(result_files: Iterable[Path]) -> dict[str, Any]:
+    """
+    Rebuild a folder's aggregates state by reading every individual result file.
+
+    Args:
+        result_files: Per-image JSON files of the folder
+
+    Returns:
+        Freshly computed aggregates state
+    """
+    aggregates = empty_aggregates()
+    models = aggregates["models"]
+    for json_file in result_files:
+        with open(json_file, "r", encoding="utf-8") as f:
+            data = expand_results(json.load(f), with_diffs=False)
+        for model_id, result in data.items():
+            if not isinstance(result, dict):
+                continue
+            add_entry(models.setdefault(model_id, empty_model_stats()), result)
+    return aggregates
+
+
+def load_aggregates(path: Path) -> dict[str, Any] | None:
+    """
+    Load a folder's aggregates state.
+
+    Args:
+        path: Aggregates file
+
+    Returns:
+        The aggregates state, or None if missing, unreadable or of another version
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            aggregates = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if aggregates.get("version") != AGGREGATES_VERSION:
+        return None
+    return aggregates
+
+
+def save_aggregates(path: Path, aggregates: dict[str, Any]) -> None:
+    """
+    Save a folder's aggregates state.
+
+    Args:
+        path: Aggregates file
+        aggregates: Aggregates state to persist
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aggregates, f, ensure_ascii=False)
+    tmp_path.replace(path)
+
+
+def merge_aggregates(states: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Combine the aggregates states of several folders into one.
+
+    Args:
+        states: Folder aggregates states
+
+    Returns:
+        Aggregates state covering the results of all the folders, as if they
+        had been aggregated together (sketches included)
+    """
+    merged = empty_aggregates()
+    models = merged["models"]
+    for state in states:
+        for model_id, stats in state["models"].items():
+            total = models.setdefault(model_id, empty_model_stats())
+            total["images"] += stats["images"]
+            for field in METRIC_FIELDS:
+                for key in ("n", "sum", "sumsq"):
+                    total[field][key] += stats[field][key]
+                if field in SKETCHED_METRICS:
+                    merge_sketch(total[field]["sketch"], stats[field]["sketch"])
+    return merged
+
+
+def rollup_aggregates(states: dict[str, dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """
+    Merge folder aggregates up the directory hierarchy.
+
+    Every folder's state is merged from the states of its subfolders (and its
+    own results, if it has any), deepest folders first, so no result is read
+    and every level costs one merge per child.
+
+    Args:
+        states: Aggregates states keyed by folder path relative to the
+            benchmarks root (e.g. GT4HistOCR/corpus/Kallimachos/1488-Heiligenleben-GWM11407)
+
+    Returns:
+        Aggregates states of the given folders and of all their ancestors, up
+        to the root ("")
+    """
+    rollups = dict(states)
+    children: dict[str, set[str]] = {}
+    for rel_dir in states:
+        while rel_dir:
+            parent = rel_dir.rpartition("/")[0]
+            siblings = children.setdefault(parent, set())
+            if rel_dir in siblings:
+                break
+            siblings.add(rel_dir)
+            rel_dir = parent
+
+    for parent in sorted(children, key=lambda rel: rel.count("/") if rel else -1, reverse=True):
+        own = [states[parent]] if parent in states else []
+        rollups[parent] = merge_aggregates([*own, *(rollups[child] for child in sorted(children[parent]))])
+    return rollups
+
+
+def summarize(aggregates: dict[str, Any], source_path: str | None) -> dict[str, Any]:
+    """
+    Build the `_summary.json` content from a folder's aggregates state.
+
+    Args:
+        aggregates: Folder aggregates state
+        source_path: Folder path reported in each model's summary (None to leave it out)
+
+    Returns:
+        Summary keyed by model_id
+    """
+    summary: dict[str, Any] = {}
+    for model_id, stats in aggregates["models"].items():
+        count = stats["images"]
+        if count > 0:
+            summary[model_id] = {} if source_path is None else {"source": source_path}
+            summary[model_id].update({
+                "images": count,
+                "avg_wer": round(stats["wer"]["sum"] / count * 100, 15),
+                "avg_cer": round(stats["cer"]["sum"] / count * 100, 15),
+                "avg_accuracy": round(stats["accuracy"]["sum"] / count * 100, 15),
+                "avg_time": round(stats["time"]["sum"] / count, 15),
+            })
+            for field, digits in OPTIONAL_METRICS.items():
+                # Averaged over the results recorded since the metric is tracked
+                acc = stats[field]
+                if acc["n"] > 0:
+                    summary[model_id][f"avg_{field}"] = round(acc["sum"] / acc["n"], digits)
+            for field, scale in SKETCHED_METRICS.items():
+                estimates = get_quantiles(stats[field]["sketch"], QUANTILES)
+                for percentile, value in zip(PERCENTILES, estimates):
+                    if value is not None:
+                        summary[model_id][f"p{percentile}_{field}"] = round(value * scale, 6)
+            cost = stats["cost"]
+            if cost["n"] > 0:
+                summary[model_id]["total_cost"] = round(cost["sum"], 6)
+                if cost["sum"] > 0:
+                    # Accuracy points (%) bought per dollar spent on each image
+                    avg_accuracy = summary[model_id]["avg_accuracy"]
+                    summary[model_id]["accuracy_per_dollar"] = round(avg_accuracy / (cost["sum"] / cost["n"]), 3)
+    return summary
+
+
+def compare_aggregates(expected: dict[str, Any], actual: dict[str, Any]) -> list[str]:
+    """
+    Compare two aggregates states, tolerating floating point summation order.
+
+    Args:
+        expected: Reference state, usually a full rescan
+        actual: State to check, usually the incrementally maintained one
+
+    Returns:
+        Human-readable descriptions of every mismatch (empty if they agree)
+    """
+    mismatches = []
+    expected_models = expected["models"]
+    actual_models = actual["models"]
+
+    for model_id in sorted(set(expected_models) | set(actual_models)):
+        if model_id not in actual_models:
+            mismatches.append(f"{model_id}: missing from aggregates")
+            continue
+        if model_id not in expected_models:
+            mismatches.append(f"{model_id}: no longer present in results")
+            continue
+
+        exp, act = expected_models[model_id], actual_models[model_id]
+        if exp["images"] != act["images"]:
+            mismatches.append(f"{model_id}: images {act['images']} != {exp['images']}")
+        for field in METRIC_FIELDS:
+            for key in ("n", "sum", "sumsq"):
+                if not math.isclose(exp[field][key], act[field][key], rel_tol=1e-9, abs_tol=1e-9):
+                    mismatches.append(
+                        f"{model_id}: {field}.{key} {act[field][key]} != {exp[field][key]}"
+                    )
+            if field in SKETCHED_METRICS and exp[field]["sketch"] != act[field]["sketch"]:
+                mismatches.append(f"{model_id}: {field}.sketch differs")
+    return mismatches
@@ -0,0 +1,406 @@
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any
+
+from benchmark import scan_index
+from benchmark.results_manager import get_scan_index_path, get_state_dir, read_results
+
+
+ANALYTICS_FILENAME = "analytics.sqlite"
+
+# Columns of every result row, besides its folder, model and image
+METRICS = ("wer", "cer", "accuracy", "time", "cost", "gt_chars", "response_chars")
+
+# Metrics where a higher value ranks better
+HIGHER_IS_BETTER = {"accuracy"}
+
+# Query dimensions: every one but `image` is constant within a (folder, model)
+# segment, so grouping and filtering on them only reads the segment statistics.
+# Images are named by their path in the tree, since file names repeat across books.
+DIMENSIONS = {
+    "model": "m.model_id",
+    "dataset": "f.dataset",
+    "corpus": "f.corpus",
+    "book": "f.book",
+    "year": "f.year",
+    "century": "f.century",
+    "folder": "f.rel_dir",
+    "image": "f.rel_dir || '/' || r.image",
+}
+ROW_DIMENSIONS = {"image"}
+NUMERIC_DIMENSIONS = {"year", "century"}
+
+_CONDITION = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$")
+_BOOK_YEAR = re.compile(r"^(\d{4})(?!\d)")
+
+
+def parse_folder(rel_dir: str) -> tuple[str, str, str, int | None, int | None]:
+    """
+    Get the dataset, corpus, book, year and century of a benchmark folder.
+
+    Example:
+        GT4HistOCR/corpus/EarlyModernLatin/1564-Thucydides-Valla
+        -> ("GT4HistOCR", "EarlyModernLatin", "1564-Thucydides-Valla", 1564, 16)
+
+    The year is read from the leading digits of the book's name, as GT4HistOCR
+    names its books; the century is ordinal (1501-1600 is the 16th).
+    """
+    parts = rel_dir.split("/")
+    book = parts[-1]
+    corpus = parts[-2] if len(parts) > 1 else ""
+    match = _BOOK_YEAR.match(book)
+    year = int(match.group(1)) if match else None
+    century = (year - 1) // 100 + 1 if year else None
+    return parts[0], corpus, book, year, century
+
+
+def parse_condition(condition: str) -> tuple[str, str, Any]:
+    """
+    Parse a filter such as "corpus=Kallimachos", "year<1500" or "model=a,b" (either one).
+
+    Returns:
+        (field, operator, value); the value is a list for "=" / "!=" with commas
+
+    Raises:
+        ValueError: If the filter is malformed or the field unknown
+    """
+    match = _CONDITION.match(condition)
+    if match is None:
+        raise ValueError(f"Filter must look like field=value or field<value, got {condition!r}")
+    field, operator, value = match.groups()
+    if field not in DIMENSIONS and field not in METRICS:
+        raise ValueError(f"Unknown field {field!r}: use one of {', '.join([*DIMENSIONS, *METRICS])}")
+
+    def convert(text: str) -> Any:
+        if field in NUMERIC_DIMENSIONS:
+            return int(text)
+        return float(text) if field in METRICS else text
+
+    if operator in ("=", "!=") and "," in value:
+        return field, operator, [convert(item) for item in value.split(",")]
+    return field, operator, convert(value)
+
+
+class AnalyticsStore:
+    """
+    Table of every individual result of a benchmarks tree, for cross-folder queries.
+
+    Every (image, model) result is one row: its folder's dataset, corpus, book,
+    year and century, and its metrics and text lengths. Rows are kept in
+    segments, one per (folder, model), each with its count and metric sums, so
+    grouped aggregates and leaderboards over model- and folder-level
+    dimensions are answered from the segments alone, however many rows there
+    are. Only queries grouping or filtering on images or row metrics scan the
+    rows.
+
+    The table is refreshed incrementally: only folders whose listing changed
+    are looked at, and only result files whose mtime or size changed are read
+    again. It lives in a SQLite file in the state folder.
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Args:
+            db_path: SQLite file backing the store (created if missing)
+        """
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        metric_columns = ", ".join(f"{metric} REAL" for metric in METRICS)
+        segment_columns = ", ".join(
+            f"{metric}_n INTEGER NOT NULL, {metric}_sum REAL" for metric in METRICS
+        )
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS folders ("
+            "folder_id INTEGER PRIMARY KEY, rel_dir TEXT NOT NULL UNIQUE, dataset TEXT, corpus TEXT, "
+            "book TEXT, year INTEGER, century INTEGER, mtime_ns INTEGER);"
+            "CREATE TABLE IF NOT EXISTS models (model_key INTEGER PRIMARY KEY, model_id TEXT NOT NULL UNIQUE);"
+            "CREATE TABLE IF NOT EXISTS files ("
+            "folder_id INTEGER NOT NULL, name TEXT NOT NULL, mtime_ns INTEGER, size INTEGER, "
+            "PRIMARY KEY (folder_id, name)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS results ("
+            f"folder_id INTEGER NOT NULL, model_key INTEGER NOT NULL, image TEXT NOT NULL, {metric_columns});"
+            "CREATE INDEX IF NOT EXISTS results_image ON results (folder_id, image);"
+            "CREATE TABLE IF NOT EXISTS segments ("
+            f"folder_id INTEGER NOT NULL, model_key INTEGER NOT NULL, results INTEGER NOT NULL, {segment_columns}, "
+            "PRIMARY KEY (folder_id, model_key)) WITHOUT ROWID;"
+        )
+        self._conn.commit()
+        self._model_keys = dict(self._conn.execute("SELECT model_id, model_key FROM models"))
+
+    def _model_key(self, model_id: str) -> int:
+        key = self._model_keys.get(model_id)
+        if key is None:
+            key = self._conn.execute("INSERT INTO models (model_id) VALUES (?)", (model_id,)).lastrowid
+            self._model_keys[model_id] = key
+        return key
+
+    def _read_file(self, folder_id: int, folder: Path, name: str) -> list[tuple]:
+        data = read_results(folder / name, with_diffs=False)
+        image = name.removesuffix(".json")
+        rows = []
+        for model_id, entry in data.items():
+            if not isinstance(entry, dict):
+                continue
+            gt, response = entry.get("gt"), entry.get("response")
+            rows.append((
+                folder_id,
+                self._model_key(model_id),
+                image,
+                *(entry.get(metric) for metric in METRICS[:5]),
+                len(gt) if isinstance(gt, str) else None,
+                len(response) if isinstance(response, str) else None,
+            ))
+        return rows
+
+    def _drop_image(self, folder_id: int, name: str) -> None:
+        self._conn.execute(
+            "DELETE FROM results WHERE folder_id = ? AND image = ?", (folder_id, name.removesuffix(".json"))
+        )
+
+    def _refresh_folder(self, folder_id: int, folder: Path, names: list[str]) -> int:
+        """
+        Bring one folder's rows and segments up to date with its result files.
+
+        Returns:
+            Number of result files read again or dropped
+        """
+        conn = self._conn
+        known = {
+            name: (mtime_ns, size)
+            for name, mtime_ns, size in conn.execute(
+                "SELECT name, mtime_ns, size FROM files WHERE folder_id = ?", (folder_id,)
+            )
+        }
+        now_ns = time.time_ns()
+        changed = 0
+        for name in names:
+            try:
+                stat = os.stat(folder / name)
+            except FileNotFoundError:
+                continue
+            cached = known.pop(name, None)
+            if cached is not None and cached == (stat.st_mtime_ns, stat.st_size):
+                continue
+            self._drop_image(folder_id, name)
+            conn.executemany(
+                f"INSERT INTO results VALUES ({', '.join('?' * (3 + len(METRICS)))})",
+                self._read_file(folder_id, folder, name),
+            )
+            # A file rewritten within the same mtime tick keeps its mtime: check recent ones again
+            mtime_ns = stat.st_mtime_ns if now_ns - stat.st_mtime_ns > scan_index.MTIME_SAFETY_NS else None
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (folder_id, name, mtime_ns, stat.st_size)
+            )
+            changed += 1
+        for name in known:
+            self._drop_image(folder_id, name)
+            conn.execute("DELETE FROM files WHERE folder_id = ? AND name = ?", (folder_id, name))
+            changed += 1
+
+        if changed:
+            sums = ", ".join(f"COUNT({metric}), SUM({metric})" for metric in METRICS)
+            conn.execute("DELETE FROM segments WHERE folder_id = ?", (folder_id,))
+            conn.execute(
+                f"INSERT INTO segments SELECT folder_id, model_key, COUNT(*), {sums} "
+                "FROM results WHERE folder_id = ? GROUP BY model_key",
+                (folder_id,),
+            )
+        return changed
+
+    def refresh(self, benchmarks_root: Path = Path("benchmarks")) -> int:
+        """
+        Bring the store up to date with a benchmarks tree.
+
+        Folders come from the persistent scan index (see refresh_scan_index),
+        which is updated along the way; folders whose mtime did not change
+        since the last refresh are skipped without looking at their files.
+        Result files are always replaced as a whole (see write_results),
+        which bumps their folder's mtime.
+
+        Args:
+            benchmarks_root: Root directory for all benchmarks
+
+        Returns:
+            Number of result files read again or dropped
+        """
+        index_path = get_scan_index_path(benchmarks_root)
+        listings, listed = scan_index.refresh_scan_index(benchmarks_root, scan_index.load_scan_index(index_path))
+        if listed:
+            scan_index.save_scan_index(index_path, listings)
+
+        try:
+            return self._sync(benchmarks_root, listings)
+        except BaseException:
+            # Model keys added by the rolled back transaction are gone
+            self._model_keys = dict(self._conn.execute("SELECT model_id, model_key FROM models"))
+            raise
+
+    def _sync(self, benchmarks_root: Path, listings: dict[str, Any]) -> int:
+        changed = 0
+        with self._conn as conn:
+            known = {
+                rel_dir: (folder_id, mtime_ns)
+                for folder_id, rel_dir, mtime_ns in conn.execute("SELECT folder_id, rel_dir, mtime_ns FROM folders")
+            }
+            for rel_dir, listing in listings.items():
+                if not rel_dir or not listing["files"]:
+                    known.pop(rel_dir, None)
+                    continue
+                folder_id, mtime_ns = known.pop(rel_dir, (None, None))
+                if folder_id is not None and mtime_ns is not None and mtime_ns == listing["mtime_ns"]:
+                    continue
+                if folder_id is None:
+                    folder_id = conn.execute(
+                        "INSERT INTO folders (rel_dir, dataset, corpus, book, year, century) VALUES (?, ?, ?, ?, ?, ?)",
+                        (rel_dir, *parse_folder(rel_dir)),
+                    ).lastrowid
+                changed += self._refresh_folder(folder_id, benchmarks_root / rel_dir, listing["files"])
+                conn.execute("UPDATE folders SET mtime_ns = ? WHERE folder_id = ?", (listing["mtime_ns"], folder_id))
+
+            # Folders gone from the tree (or left without results)
+            for folder_id, _ in known.values():
+                changed += conn.execute("DELETE FROM files WHERE folder_id = ?", (folder_id,)).rowcount
+                for table in ("results", "segments", "folders"):
+                    conn.execute(f"DELETE FROM {table} WHERE folder_id = ?", (folder_id,))
+        return changed
+
+    def query(
+        self,
+        group_by: list[str] | tuple[str, ...] = ("model",),
+        metrics: list[str] | tuple[str, ...] = ("wer", "cer", "accuracy", "time"),
+        where: list[str] | tuple[str, ...] = (),
+        sort: str | None = None,
+        descending: bool | None = None,
+        limit: int | None = None,
+        min_results: int = 1,
+    ) -> list[dict[str, Any]]:
+        """
+        Compute grouped averages of result metrics.
+
+        Args:
+            group_by: Dimensions to group by (model, dataset, corpus, book, year,
+                century, folder, image: the image's path in the tree); empty for
+                one overall row
+            metrics: Metrics to average (wer, cer, accuracy, time, cost,
+                gt_chars, response_chars)
+            where: Filters such as "corpus=Kallimachos", "year<1500",
+                "model=a,b" or "gt_chars>=50" (see parse_condition), all applied
+            sort: Column to sort by: a dimension, "results" or a metric
+                (default: the group columns)
+            descending: Sort order (default: best first for metrics, e.g.
+                lowest CER and highest accuracy first)
+            limit: Most rows to return
+            min_results: Leave out groups with fewer results
+
+        Returns:
+            One row per group: its dimension values, "results" (count) and
+            "avg_<metric>" for every metric (None if no result has it)
+
+        Raises:
+            ValueError: If a dimension, metric or filter is unknown
+        """
+        for name in group_by:
+            if name not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension {name!r}: use one of {', '.join(DIMENSIONS)}")
+        for metric in metrics:
+            if metric not in METRICS:
+                raise ValueError(f"Unknown metric {metric!r}: use one of {', '.join(METRICS)}")
+        conditions = [parse_condition(condition) for condition in where]
+
+        # Segments suffice unless rows must be told apart or filtered by their metrics
+        by_rows = any(name in ROW_DIMENSIONS for name in group_by) or any(
+            field in ROW_DIMENSIONS or field in METRICS for field, _, _ in conditions
+        )
+        if by_rows:
+            source = "results r"
+            count = "COUNT(*)"
+            averages = [f"AVG(r.{metric})" for metric in metrics]
+        else:
+            source = "segments r"
+            count = "SUM(r.results)"
+            averages = [f"SUM(r.{metric}_sum) / NULLIF(SUM(r.{metric}_n), 0)" for metric in metrics]
+
+        clauses, params = [], []
+        for field, operator, value in conditions:
+            column = DIMENSIONS.get(field) or f"r.{field}"
+            if isinstance(value, list):
+                clauses.append(f"{column} {'NOT IN' if operator == '!=' else 'IN'} ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
+
+        columns = [f"{DIMENSIONS[name]} AS {name}" for name in group_by]
+        columns.append(f"{count} AS results")
+        columns.extend(f"{average} AS avg_{metric}" for average, metric in zip(averages, metrics))
+        sql = (
+            f"SELECT {', '.join(columns)} FROM {source} "
+            "JOIN folders f ON f.folder_id = r.folder_id JOIN models m ON m.model_key = r.model_key"
+        )
+        if clauses:
+            sql += f" WHERE {' AND '.join(clauses)}"
+        if group_by:
+            # By expression: a grouped alias may shadow a column (results.image)
+            sql += f" GROUP BY {', '.join(DIMENSIONS[name] for name in group_by)}"
+        sql += " HAVING results >= ?"
+        params.append(min_results)
+
+        if sort is not None:
+            if sort in METRICS:
+                if sort not in metrics:
+                    raise ValueError(f"Cannot sort by {sort!r}: it is not among the queried metrics")
+                if descending is None:
+                    descending = sort in HIGHER_IS_BETTER
+                sort = f"avg_{sort}"
+            elif sort != "results" and sort not in group_by:
+                raise ValueError(f"Cannot sort by {sort!r}: use a grouped dimension, 'results' or a queried metric")
+            # Groups without the metric go last either way
+            sql += f" ORDER BY {sort} IS NULL, {sort} {'DESC' if descending else 'ASC'}"
+        elif group_by:
+            sql += f" ORDER BY {', '.join(group_by)}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        cursor = self._conn.execute(sql, params)
+        names = [description[0] for description in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def leaderboard(
+        self,
+        metric: str = "cer",
+        where: list[str] | tuple[str, ...] = (),
+        by: str = "model",
+        limit: int | None = 10,
+        min_results: int = 1,
+    ) -> list[dict[str, Any]]:
+        """
+        Rank models (or another dimension) by a metric, best first (see query).
+        """
+        return self.query([by], [metric], where, sort=metric, limit=limit, min_results=min_results)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def open_analytics(benchmarks_root: Path = Path("benchmarks"), refresh: bool = True) -> AnalyticsStore:
+    """
+    Open the analytics store of a benchmarks tree, refreshed with its latest results.
+
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        refresh: Sync the store with the result files first (incremental)
+
+    Returns:
+        The store; close it when done
+    """
+    store = AnalyticsStore(get_state_dir(benchmarks_root) / ANALYTICS_FILENAME)
+    if refresh:
+        store.refresh(benchmarks_root)
+    return store
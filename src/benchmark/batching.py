@@ -0,0 +1,49 @@
+import re
+
+
+NUMBERED_LINE = re.compile(r"^\s*(\d+)\s*[:.)]\s?(.*)$")
+
+
+def split_batch_response(response: str, count: int) -> tuple[list[str], bool]:
+    """
+    Split the response to a multi-line request back into per-line transcriptions.
+
+    The model is asked for numbered lines ("1: ..."). When every number from 1
+    to `count` appears exactly once, those lines are used and anything else
+    (e.g. a preamble) is ignored. Otherwise the non-empty lines are taken in
+    order, without their numbers; if their count doesn't match, extra lines
+    are merged into the last transcription or missing ones left empty. Such
+    splits are flagged as ambiguous, as are wrongly numbered ones.
+
+    Args:
+        response: Model response
+        count: Number of line images sent in the request
+
+    Returns:
+        One transcription per line image, and whether the split is ambiguous
+    """
+    lines = [line for line in response.strip().splitlines() if line.strip()]
+
+    numbered: dict[int, str] = {}
+    duplicate = False
+    for line in lines:
+        match = NUMBERED_LINE.match(line)
+        if match is None:
+            continue
+        number = int(match.group(1))
+        if number in numbered:
+            duplicate = True
+        numbered[number] = match.group(2).strip()
+    if not duplicate and set(numbered) == set(range(1, count + 1)):
+        return [numbered[number] for number in range(1, count + 1)], False
+
+    if numbered:
+        # Numbered but not 1..count: keep the order, drop the numbers
+        lines = [match.group(2) if (match := NUMBERED_LINE.match(line)) else line for line in lines]
+    lines = [line.strip() for line in lines]
+    if len(lines) == count:
+        # In order, but wrongly numbered lines may be out of place
+        return lines, bool(numbered)
+    if len(lines) > count:
+        return lines[: count - 1] + [" ".join(lines[count - 1:])], True
+    return lines + [""] * (count - len(lines)), True
@@ -0,0 +1,468 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+
+# Every command imports what it needs when it runs: langchain, the OpenRouter
+# client and the metrics libraries take seconds to load, and only `run` (and
+# `rescore`, for the metrics) needs them.
+
+
+def _get_folders(args) -> list[Path]:
+    from benchmark.results_manager import list_benchmark_folders
+
+    return args.folders or list_benchmark_folders(args.root)
+
+
+def _load_config(args):
+    from config.schemas import load_config
+
+    return load_config(args.images_config, args.models_config, args.model_validation)
+
+
+def _compact_pending(benchmarks_root: Path, include_unsealed: bool = False) -> int:
+    """
+    Fold results left in the journal, e.g. by an interrupted run, into the result files and summaries.
+    """
+    from benchmark.journal import compact_journal
+    from benchmark.results_manager import update_folder_summary
+
+    result_paths = compact_journal(benchmarks_root, include_unsealed)
+    for folder in sorted({result_path.parent for result_path in result_paths}):
+        update_folder_summary(folder, benchmarks_root)
+    if result_paths:
+        print(f"Saved {len(result_paths)} result files from the journal")
+    return len(result_paths)
+
+
+def _run_worker(config: str, run_id: str, score_workers: int) -> None:
+    import asyncio
+
+    from benchmark.execution import run_all
+    from config.schemas import CleanConfig
+
+    asyncio.run(run_all(CleanConfig.model_validate_json(config), run_id=run_id, score_workers=score_workers))
+
+
+def run_command(args) -> int:
+    """
+    Plan and run the configured models on the selected images, resume a run,
+    or estimate the cost of a run.
+    """
+    import asyncio
+    import multiprocessing
+
+    from benchmark.execution import estimate_cost, plan_run, run_all
+    from benchmark.results_manager import get_state_dir
+    from benchmark.run_queue import RUN_QUEUE_FILENAME, RunQueue
+    from config.schemas import CleanConfig
+    from utils.preprocessing import select_images
+
+    # Results sealed by interrupted runs count as processed for the selection
+    _compact_pending(Path("benchmarks"))
+    run_queue = RunQueue(get_state_dir() / RUN_QUEUE_FILENAME)
+    try:
+        if args.resume:
+            try:
+                cfg = CleanConfig.model_validate_json(run_queue.get_config(args.resume))
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                return 1
+            run_id = args.resume
+            if args.retry_failed:
+                print(f"Requeued {run_queue.retry_failed(run_id)} failed items")
+        else:
+            cfg = _load_config(args)
+            if args.shard and cfg.seed is None:
+                print(
+                    "Sharding needs a seed, or every machine selects different images (set seed in images.yaml)",
+                    file=sys.stderr,
+                )
+                return 1
+            images = select_images(cfg, for_shard=args.shard is not None)
+            if args.dry_run:
+                _print_estimate(estimate_cost(cfg, images))
+                return 0
+            run_id = plan_run(cfg, images, run_queue, args.shard)
+        print(f"Run {run_id}:", run_queue.progress(run_id))
+        print(f"Resume it with: palladia run --resume {run_id}")
+    finally:
+        run_queue.close()
+
+    if args.workers == 1:
+        asyncio.run(run_all(cfg, run_id=run_id))
+        return 0
+
+    # Worker processes lease from the same run; they share the CPUs for scoring
+    score_workers = max(1, (os.cpu_count() or 1) // args.workers)
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_run_worker, args=(cfg.model_dump_json(), run_id, score_workers))
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return 0 if all(worker.exitcode == 0 for worker in workers) else 1
+
+
+def _print_estimate(estimates: dict[str, dict]) -> None:
+    total = 0.0
+    for model_id, estimate in estimates.items():
+        cost = estimate["cost"]
+        total += cost or 0.0
+        print(
+            f"{model_id}: {estimate['images']} images in {estimate['requests']} requests, "
+            f"~{estimate['prompt_tokens']} prompt + ~{estimate['completion_tokens']} completion tokens, "
+            + (f"~${cost:.4f}" if cost is not None else "no price available")
+            + f" ({estimate['basis']})"
+        )
+    print(f"Estimated total: ~${total:.4f}")
+
+
+def select_command(args) -> int:
+    """
+    Print the images a run would process, one path per line.
+    """
+    from utils.preprocessing import select_images
+
+    for image in select_images(_load_config(args)):
+        print(image)
+    return 0
+
+
+def summarize_command(args) -> int:
+    """
+    Write the folder summaries, or check their running aggregates.
+    """
+    from benchmark.results_manager import update_folder_summary, verify_folder_summary
+
+    _compact_pending(args.root)
+    mismatches = 0
+    for folder in _get_folders(args):
+        if args.verify:
+            for problem in verify_folder_summary(folder, args.root):
+                mismatches += 1
+                print(f"{folder}: {problem}")
+            continue
+        summary_path = update_folder_summary(folder, args.root, rebuild=args.rebuild)
+        print(f"Updated folder summary: {summary_path}")
+    return 1 if mismatches else 0
+
+
+def manifest_command(args) -> int:
+    """
+    Generate the manifest of the benchmarks tree.
+    """
+    from benchmark.results_manager import generate_manifest
+
+    _compact_pending(args.root)
+    manifest_path = generate_manifest(args.root, args.subtree, args.rescan)
+    print(f"Generated manifest: {manifest_path}")
+    return 0
+
+
+def recover_command(args) -> int:
+    """
+    Save the results of segments left unsealed in the journal by runs that died.
+    """
+    if not _compact_pending(args.root, include_unsealed=True):
+        print("Nothing to recover")
+    return 0
+
+
+def rescore_command(args) -> int:
+    """
+    Score the stored responses again and refresh the folder summaries.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from benchmark.rescoring import rescore_folder
+    from benchmark.results_manager import update_folder_summary
+
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count() or 1) as executor:
+        for folder in _get_folders(args):
+            changed = rescore_folder(folder, args.root, executor)
+            summary_path = update_folder_summary(folder, args.root)
+            print(f"Rescored {folder}: {changed} results changed, updated {summary_path}")
+    return 0
+
+
+def merge_command(args) -> int:
+    """
+    Merge benchmarks trees into the local one.
+    """
+    from benchmark.merging import merge_trees
+
+    try:
+        report = merge_trees(args.sources, args.root, args.replace, args.workers)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    conflicts = report["conflicts"]
+    print(
+        f"Merged {report['folders']} folders: {report['added']} results added, "
+        f"{report['duplicates']} duplicates skipped, {report['images']} images copied, "
+        f"{len(conflicts)} conflicts ({'source' if args.replace else 'target'} kept)"
+    )
+    for conflict in conflicts[:20]:
+        print(f"  conflict: {conflict}")
+    if len(conflicts) > 20:
+        print(f"  ... and {len(conflicts) - 20} more")
+    print(f"Generated manifest: {report['manifest']}")
+    return 0
+
+
+def migrate_command(args) -> int:
+    """
+    Rewrite the per-image result files in the compact format.
+    """
+    from benchmark.migration import migrate_results
+
+    report = migrate_results(args.root, args.dry_run, args.workers)
+    before, after = report["bytes_before"], report["bytes_after"]
+    print(
+        f"{report['files']} result files, {report['rewritten']} "
+        + ("to rewrite" if args.dry_run else "rewritten")
+        + f", {len(report['mismatches'])} left as they were"
+    )
+    print(f"Size: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB ({(after - before) / max(before, 1):+.0%})")
+    print(
+        f"Parse time: {report['parse_before']:.3f} s -> {report['parse_after']:.3f} s, "
+        f"plus {report['expand_after']:.3f} s to expand the compact files"
+    )
+    for path in report["mismatches"]:
+        print(f"  not migrated, does not read back the same: {path}")
+    return 1 if report["mismatches"] else 0
+
+
+def query_command(args) -> int:
+    """
+    Print grouped averages of the results across the whole tree.
+    """
+    import json
+
+    from benchmark.analytics import open_analytics
+
+    store = open_analytics(args.root, refresh=not args.no_refresh)
+    try:
+        rows = store.query(
+            args.by, args.metric, args.where, args.sort, args.desc or None, args.limit, args.min_results
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+        return 0
+    if not rows:
+        print("No results")
+        return 0
+    columns = list(rows[0])
+    cells = [
+        [f"{value:.3f}" if isinstance(value, float) else "-" if value is None else str(value) for value in row.values()]
+        for row in rows
+    ]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+    return 0
+
+
+def _shard(value: str) -> tuple[int, int]:
+    from benchmark.sharding import parse_shard
+
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the `palladia` argument parser with one subcommand per command.
+
+    Returns:
+        The parser; each subcommand sets `handler` to its command function
+    """
+    parser = argparse.ArgumentParser(prog="palladia", description="Benchmark OCR models on historical documents")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    config_options = argparse.ArgumentParser(add_help=False)
+    config_options.add_argument(
+        "--images-config", type=Path, default=Path("src/config/images.yaml"), help="Images configuration file"
+    )
+    config_options.add_argument(
+        "--models-config", type=Path, default=Path("src/config/models.yaml"), help="Models configuration file"
+    )
+    config_options.add_argument(
+        "--model-validation",
+        choices=["online", "offline", "skip"],
+        default="online",
+        help="Check model IDs against the cached OpenRouter model list (online: refreshed daily, "
+        "offline: never downloaded) or not at all",
+    )
+
+    results_options = argparse.ArgumentParser(add_help=False)
+    results_options.add_argument(
+        "--root", type=Path, default=Path("benchmarks"), help="Root directory for all benchmarks"
+    )
+
+    folder_options = argparse.ArgumentParser(add_help=False)
+    folder_options.add_argument(
+        "folders", nargs="*", type=Path, help="Benchmark folders (default: every folder with results)"
+    )
+
+    run = commands.add_parser(
+        "run", parents=[config_options], help="Run the configured models on the selected images"
+    )
+    run_mode = run.add_mutually_exclusive_group()
+    run_mode.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only estimate the token usage and cost of the run, without calling any model",
+    )
+    run_mode.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Continue a planned run where it stopped, with the configuration it was planned with",
+    )
+    run.add_argument("--retry-failed", action="store_true", help="With --resume, also retry the failed items")
+    run.add_argument(
+        "--shard",
+        type=_shard,
+        metavar="I/N",
+        help="Only plan the I-th of N shards of the (model, image) pairs, to split a run across machines",
+    )
+    run.add_argument(
+        "--workers", type=_positive_int, default=1, help="Worker processes draining the run's queue (default: 1)"
+    )
+    run.set_defaults(handler=run_command)
+
+    select = commands.add_parser(
+        "select", parents=[config_options], help="Print the images the configured run would process"
+    )
+    select.set_defaults(handler=select_command, model_validation="skip")
+
+    summarize = commands.add_parser(
+        "summarize", parents=[results_options, folder_options], help="Write the folder summaries"
+    )
+    summarize.add_argument(
+        "--rebuild", action="store_true", help="Recompute the aggregates from the result files first"
+    )
+    summarize.add_argument(
+        "--verify",
+        action="store_true",
+        help="Only check the aggregates against the result files (exit status 1 on a mismatch)",
+    )
+    summarize.set_defaults(handler=summarize_command)
+
+    manifest = commands.add_parser("manifest", parents=[results_options], help="Generate manifest.json")
+    manifest.add_argument(
+        "--subtree", type=Path, help="Only refresh this part of the tree, relative to the root"
+    )
+    manifest.add_argument("--rescan", action="store_true", help="Ignore the scan index and list every folder")
+    manifest.set_defaults(handler=manifest_command)
+
+    recover = commands.add_parser(
+        "recover",
+        parents=[results_options],
+        help="Save the results left unsealed in the journal by runs that died (only while no run is active)",
+    )
+    recover.set_defaults(handler=recover_command)
+
+    rescore = commands.add_parser(
+        "rescore",
+        parents=[results_options, folder_options],
+        help="Score the stored responses again, e.g. after a metric changed",
+    )
+    rescore.add_argument("--workers", type=int, help="Scoring processes (default: CPU count)")
+    rescore.set_defaults(handler=rescore_command)
+
+    merge = commands.add_parser(
+        "merge", parents=[results_options], help="Merge benchmarks trees, e.g. of sharded runs, into the root"
+    )
+    merge.add_argument("sources", nargs="+", type=Path, help="Roots of the benchmarks trees to merge")
+    merge.add_argument(
+        "--replace", action="store_true", help="On conflicting results, take the source's (default: keep the root's)"
+    )
+    merge.add_argument("--workers", type=int, help="Merging processes (default: CPU count)")
+    merge.set_defaults(handler=merge_command)
+
+    migrate = commands.add_parser(
+        "migrate", parents=[results_options], help="Rewrite the result files in the compact format"
+    )
+    migrate.add_argument("--dry-run", action="store_true", help="Only report the sizes and parse times")
+    migrate.add_argument("--workers", type=int, help="Migrating processes (default: CPU count)")
+    migrate.set_defaults(handler=migrate_command)
+
+    query = commands.add_parser(
+        "query",
+        parents=[results_options],
+        help="Average the metrics across the tree, grouped by model, corpus, book, year, century, ...",
+    )
+    query.add_argument(
+        "--by",
+        nargs="*",
+        default=["model"],
+        metavar="DIMENSION",
+        help="Group by model, dataset, corpus, book, year, century, folder or image (default: model)",
+    )
+    query.add_argument(
+        "--metric",
+        nargs="+",
+        default=["wer", "cer", "accuracy", "time"],
+        help="Metrics to average: wer, cer, accuracy, time, cost, gt_chars, response_chars",
+    )
+    query.add_argument(
+        "--where",
+        action="append",
+        default=[],
+        metavar="FILTER",
+        help="Filter such as corpus=RefCorpus-ENHG-Incunabula, year<1500 or model=a,b (repeatable)",
+    )
+    query.add_argument("--sort", help="Sort by a metric (best first), a grouped dimension or 'results'")
+    query.add_argument("--desc", action="store_true", help="Sort in descending order")
+    query.add_argument("--limit", type=_positive_int, help="Most rows to print")
+    query.add_argument(
+        "--min-results", type=_positive_int, default=1, help="Leave out groups with fewer results"
+    )
+    query.add_argument(
+        "--no-refresh", action="store_true", help="Query the store as is, without syncing it with the result files"
+    )
+    query.add_argument("--json", action="store_true", help="Print the rows as JSON")
+    query.set_defaults(handler=query_command)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Entry point of the `palladia` command.
+
+    Args:
+        argv: Command line arguments (default: sys.argv[1:])
+
+    Returns:
+        Exit status
+    """
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
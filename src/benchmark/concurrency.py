@@ -0,0 +1,218 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator
+
+
+def get_status_code(error: BaseException) -> int | None:
+    """
+    Get the HTTP status code carried by a client error, if any.
+
+    Args:
+        error: Exception raised by a model call (openai / httpx errors carry the status)
+
+    Returns:
+        The status code, or None for errors without one (timeouts, connection errors...)
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def get_retry_after(error: BaseException) -> float | None:
+    """
+    Get the delay requested by a Retry-After (or retry-after-ms) response header.
+
+    Args:
+        error: Exception raised by a model call
+
+    Returns:
+        Delay in seconds, or None if the response did not ask for one
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttling(status: int | None) -> bool:
+    """
+    Whether a status code means the provider wants us to slow down (429 or 5xx).
+    """
+    return status is not None and (status == 429 or status >= 500)
+
+
+class TokenBucket:
+    """
+    Token bucket capping the request rate: `rate` requests per second on average,
+    with bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        """
+        Args:
+            rate: Sustained requests per second
+            burst: Bucket capacity (default: max(1, rate))
+        """
+        self.rate = rate
+        self.capacity = float(burst or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available and take it.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """
+    Per-model concurrency limit that adapts to the provider (AIMD).
+
+    While the limit is fully used and latency stays near its best observed value,
+    the limit grows additively (about +1 per limit's worth of successful requests).
+    It halves on 429/5xx responses, and new requests are held back for as long
+    as a Retry-After header asks. Latency climbing well above its baseline
+    (queueing on the provider side) shrinks the limit gently. An optional token
+    bucket caps the request rate on top.
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 16,
+        latency_tolerance: float = 2.0,
+        rate: float | None = None,
+        burst: int | None = None,
+    ):
+        """
+        Args:
+            initial: Starting concurrency
+            minimum: Lowest concurrency the limit can shrink to
+            maximum: Highest concurrency the limit can grow to
+            latency_tolerance: Back off when smoothed latency exceeds this multiple
+                of the best smoothed latency seen so far
+            rate: Optional requests-per-second cap (token bucket)
+            burst: Token bucket capacity
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance
+        self.bucket = TokenBucket(rate, burst) if rate else None
+
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self.peak_limit = self.limit
+
+        self._latency_ewma: float | None = None
+        self._latency_best: float | None = None
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one unit of concurrency for a request and learn from its outcome.
+
+        Usage:
+            async with limiter.slot():
+                response = await llm.ainvoke(...)
+        """
+        await self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as error:
+            self._on_failure(error)
+            raise
+        else:
+            self._on_success(time.monotonic() - start)
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    async def _acquire(self) -> None:
+        # Wait for the rate cap first so requests held back by it don't count as in flight
+        if self.bucket is not None:
+            await self.bucket.acquire()
+
+        async with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), pause)
+                    except TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                await self._condition.wait()
+            self.in_flight += 1
+
+    def _on_success(self, latency: float) -> None:
+        self.successes += 1
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        if self._latency_best is None or self._latency_ewma < self._latency_best:
+            self._latency_best = self._latency_ewma
+
+        if self._latency_ewma > self.latency_tolerance * self._latency_best:
+            self.limit = max(float(self.minimum), self.limit * 0.9)
+        elif self.in_flight >= int(self.limit):
+            # Only grow when the current limit is actually the bottleneck
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _on_failure(self, error: BaseException) -> None:
+        status = get_status_code(error)
+        if not is_throttling(status):
+            return
+
+        self.throttled += 1
+        self.limit = max(float(self.minimum), self.limit / 2)
+        retry_after = get_retry_after(error)
+        if retry_after is None and status == 429:
+            retry_after = 1.0
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def report(self) -> dict[str, float | int]:
+        """
+        Get the limiter's counters for the run report.
+        """
+        return {
+            "limit": round(self.limit, 2),
+            "peak_limit": round(self.peak_limit, 2),
+            "successes": self.successes,
+            "throttled": self.throttled,
+        }
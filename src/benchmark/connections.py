@@ -0,0 +1,194 @@
+import asyncio
+import importlib.util
+import math
+from typing import Any, AsyncIterator, Callable
+
+import httpx
+
+from config.schemas import HttpConfig
+
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# How much of an unread response tail is drained to keep its connection
+DRAIN_MAX_BYTES = 64 * 1024
+DRAIN_TIMEOUT = 1.0
+
+# Connections per pool shard: httpcore rescans every connection of a pool for
+# each request it assigns, which gets slow past a few dozen connections
+POOL_SHARD_SIZE = 16
+
+
+class _DrainingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        task = asyncio.current_task()
+        try:
+            # Not when the request was cancelled, e.g. a hedge that lost
+            if task is None or not task.cancelling():
+                drained = 0
+                async with asyncio.timeout(DRAIN_TIMEOUT):
+                    async for chunk in self._stream:
+                        drained += len(chunk)
+                        if drained > DRAIN_MAX_BYTES:
+                            break
+        except (httpx.HTTPError, TimeoutError):
+            pass
+        finally:
+            self._release()
+            await self._stream.aclose()
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """
+    Connection pool for all model clients, split into small shards.
+
+    Every request goes to the shard with the fewest requests in flight, so
+    connections are reused across models while each shard stays small enough
+    for httpcore to assign requests quickly.
+
+    Responses are also read to their end before their connection is released:
+    the OpenAI SDK stops reading a streamed response at its `[DONE]` event and
+    closes it while the end of the body is still unread, and on HTTP/1.1 the
+    pool then has to drop the connection instead of reusing it. Draining that
+    short tail, within a size and time bound, keeps the connection alive.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        http2: bool = False,
+    ):
+        """
+        Args:
+            max_connections: Connections open at once, over all shards
+            max_keepalive_connections: Idle connections kept open, over all shards
+            keepalive_expiry: Seconds an idle connection is kept open
+            http2: Use HTTP/2 where the server supports it
+        """
+        shards = math.ceil(max_connections / POOL_SHARD_SIZE)
+        limits = httpx.Limits(
+            max_connections=math.ceil(max_connections / shards),
+            max_keepalive_connections=math.ceil(max_keepalive_connections / shards),
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._pools = [httpx.AsyncHTTPTransport(limits=limits, http2=http2) for _ in range(shards)]
+        self._in_flight = [0] * shards
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        shard = min(range(len(self._pools)), key=self._in_flight.__getitem__)
+        self._in_flight[shard] += 1
+        try:
+            response = await self._pools[shard].handle_async_request(request)
+        except BaseException:
+            self._in_flight[shard] -= 1
+            raise
+
+        def release() -> None:
+            self._in_flight[shard] -= 1
+
+        response.stream = _DrainingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        for pool in self._pools:
+            await pool.aclose()
+
+
+class ConnectionStats:
+    """
+    Counts requests and new connections of an HTTP client, to report connection reuse.
+
+    Hooked into every request through httpx's request event hook and the
+    transport's trace extension, so it sees connections the pool opens as well
+    as TLS handshakes and the protocol each request went over.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+
+    async def on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    async def trace(self, name: str, info: dict[str, Any]) -> None:
+        if name == "connection.connect_tcp.complete":
+            self.connections += 1
+        elif name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+        elif name == "http2.send_request_headers.started":
+            self.http2_requests += 1
+
+    def report(self) -> dict[str, float | int]:
+        """
+        Get the connection counters for the run report.
+        """
+        reused = max(self.requests - self.connections, 0)
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "tls_handshakes": self.tls_handshakes,
+            "http2_requests": self.http2_requests,
+            "reused": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+def build_http_client(
+    config: HttpConfig | None = None,
+    concurrency: int = 16,
+    stats: ConnectionStats | None = None,
+) -> httpx.AsyncClient:
+    """
+    Build the async HTTP client shared by every model of a run.
+
+    One pool for all models means connections (and TLS sessions) to the API
+    host are reused across models instead of each model client opening its own.
+
+    Args:
+        config: Pool, keep-alive, protocol and timeout settings
+        concurrency: Requests that can be in flight at once, the default pool size
+        stats: Optional counters to hook into every request
+
+    Returns:
+        The client; close it with `await client.aclose()` at the end of the run
+    """
+    config = config or HttpConfig()
+    max_connections = config.max_connections or concurrency
+    http2 = config.http2 and HTTP2_AVAILABLE
+    if config.http2 and not HTTP2_AVAILABLE:
+        print('HTTP/2 needs the h2 package (pip install "httpx[http2]"), using HTTP/1.1')
+
+    transport = SharedTransport(
+        max_connections=max_connections,
+        max_keepalive_connections=(
+            config.max_keepalive_connections
+            if config.max_keepalive_connections is not None
+            else max_connections
+        ),
+        keepalive_expiry=config.keepalive_expiry,
+        http2=http2,
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(
+            connect=config.connect_timeout,
+            read=config.read_timeout,
+            write=config.write_timeout,
+            pool=config.pool_timeout,
+        ),
+        event_hooks={"request": [stats.on_request]} if stats is not None else None,
+    )
@@ -3,49 +3,42 @@ from langchain_core.messages import HumanMessage
 from pydantic import SecretStr
 from pathlib import Path
 
-from config.schemas import load_config
-from utils.converters import convert_to_b64
-from utils.preprocessing import random_selection
-from benchmark.prompts import SYSTEM_MESSAGE
-from benchmark.metrics import get_diff, get_metrics
+from utils.converters import get_data_mime_type, get_mime_type, preprocess_image_cached, to_data_url
+from utils.catalog import get_ground_truth_path
+from benchmark.prompts import SYSTEM_MESSAGE, BATCH_MESSAGE
+from benchmark.batching import split_batch_response
+from benchmark import aggregates
+from benchmark.metrics import score
 from benchmark.results_manager import (
-    save_individual_result,
+    get_result_key,
+    get_state_dir,
+    load_model_totals,
+    should_skip_image,
     update_folder_summary,
-    get_benchmark_path,
+)
+from benchmark.journal import ResultsJournal, compact_journal
+from benchmark.concurrency import AdaptiveLimiter
+from benchmark.retries import RequestPolicy, call_with_policy
+from benchmark.payloads import Payload, PayloadCache
+from benchmark.streaming import Completion, stream_completion
+from benchmark.pricing import ModelPrice, load_price_table
+from benchmark.connections import ConnectionStats, build_http_client
+from benchmark.run_queue import LEASE_SECONDS, RUN_QUEUE_FILENAME, RunQueue, new_worker_id
+from benchmark.sharding import get_shard
+from benchmark.response_cache import (
+    RESPONSE_CACHE_FILENAME,
+    ResponseCache,
+    ResponseCacheMiss,
+    get_generation_params,
 )
 
 import os
+import sys
 import asyncio
+import hashlib
+import json
 import time
-
-from dotenv import load_dotenv
-load_dotenv()
-
-
-cfg = load_config()
-images = random_selection(cfg.source, cfg.images_to_process, cfg.avoid_rescan)
-
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-if not OPENROUTER_API_KEY:
-    raise ValueError("OPENROUTER_API_KEY environment variable is not set")
-
-
-def get_ground_truth_path(image_path: Path) -> Path:
-    """
-    Get the corresponding ground truth file path for an image.
-    
-    Args:
-        image_path: Path to the image file
-        
-    Returns:
-        Path to the ground truth text file
-    """
-    filename = image_path.name
-    if filename.endswith('.bin.png'):
-        gt_filename = filename.replace('.bin.png', '.gt.txt')
-    else:
-        gt_filename = filename.rsplit('.', 1)[0] + '.gt.txt'
-    return image_path.parent / gt_filename
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
 def load_ground_truth(image_path: Path) -> str:
@@ -68,131 +61,779 @@ def load_ground_truth(image_path: Path) -> str:
         return ""
 
 
-async def run_model_on_image(
-    model_id: str,
-    llm: ChatOpenAI,
+PREPROCESSED_DIRNAME = "images"
+
+# Rough token counts for cost estimates of models without results yet:
+# historical orthography tokenizes poorly, and a line image is a few tiles
+CHARS_PER_TOKEN = 3
+PROMPT_CHARS_PER_TOKEN = 4
+IMAGE_TOKENS_ESTIMATE = 600
+
+# Seconds between checks for work items another process may give up
+LEASE_POLL_SECONDS = 5.0
+
+
+def prepare_payload(
     image: Path,
-    semaphore: asyncio.Semaphore,
-):
+    preprocessing: dict | None = None,
+    cache_dir: Path | None = None,
+) -> Payload:
     """
-    Run a specific model on a single image and calculate performance metrics.
+    Read, optionally preprocess and encode an image and load its ground truth
+    (blocking file I/O).
     
     Args:
-        model_id: ID of the model being used
-        llm: ChatOpenAI instance configured with the model
         image: Path to the image to process
-        semaphore: Semaphore to limit concurrency
+        preprocessing: Keyword arguments of preprocess_image, None to upload the original
+        cache_dir: Folder caching preprocessed images (default: under the state folder)
         
     Returns:
-        Dictionary containing model_id, image path, processing time, prediction,
-        ground truth, diff result, WER, and CER
+        Payload with the image as a data URL, the ground truth text, the
+        SHA-256 and size of the uploaded bytes and the time it took to prepare
+    """
+    start = time.perf_counter()
+    with open(image, "rb") as f:
+        data = f.read()
+    mime_type = get_mime_type(image)
+    if preprocessing:
+        data = preprocess_image_cached(data, preprocessing, cache_dir or get_state_dir() / PREPROCESSED_DIRNAME)
+        mime_type = get_data_mime_type(data) or mime_type
+    return Payload(
+        to_data_url(data, mime_type),
+        load_ground_truth(image),
+        hashlib.sha256(data).hexdigest(),
+        len(data),
+        time.perf_counter() - start,
+    )
+
+
+def get_preprocessing_options(model) -> dict | None:
     """
-    async with semaphore:
-        start = time.perf_counter()
+    Get the preprocess_image arguments configured for a model.
+    
+    Args:
+        model: Model configuration
         
-        image_base64 = convert_to_b64(image)
-        ground_truth = load_ground_truth(image)
+    Returns:
+        Keyword arguments of preprocess_image, or None if the model uses original images
+    """
+    preprocessing = model.preprocessing
+    if preprocessing is None:
+        return None
+    return {
+        "max_height": preprocessing.max_height,
+        "color": preprocessing.color,
+        "image_format": preprocessing.format,
+        "quality": preprocessing.quality,
+    }
+
+
+async def request_completion(
+    llm: ChatOpenAI,
+    prompt: str,
+    image_urls: list[str],
+    limiter: AdaptiveLimiter,
+    policy: RequestPolicy | None = None,
+    cache: ResponseCache | None = None,
+    image_shas: list[str] | None = None,
+) -> tuple[Completion, float]:
+    """
+    Send a prompt with one or more encoded images to a model.
+    
+    Only the network call holds a slot of the model's limiter and is timed, so
+    neither file I/O nor scoring of other tasks ends up in the measured latency.
+    The response is streamed to time the first token and the generation.
+    Transient failures are retried and slow calls hedged as the policy allows.
+    With a response cache, a cached answer is returned with the latency and token
+    usage of the request that originally produced it (and no streaming timings).
+    
+    Args:
+        llm: ChatOpenAI instance configured with the model
+        prompt: Text sent before the images
+        image_urls: Images encoded as data URLs
+        limiter: The model's adaptive concurrency limiter
+        policy: The model's retry and hedging policy (default: retries, no hedging)
+        cache: Optional response cache
+        image_shas: SHA-256 of each image's bytes, required with a cache
+        
+    Returns:
+        The model's streamed response and the time of the request that produced it, in seconds
+        
+    Raises:
+        ResponseCacheMiss: If the cache is in replay mode and has no answer for the request
+    """
+    key = None
+    if cache is not None:
+        key = cache.make_key(llm.model_name, ",".join(image_shas), prompt, get_generation_params(llm))
+        cached = cache.get(key)
+        if cached is not None:
+            text, elapsed, usage = cached
+            output_tokens = usage.get("output_tokens") if usage else None
+            return Completion(text, time.perf_counter(), None, None, output_tokens, usage), elapsed
+        if cache.replay:
+            raise ResponseCacheMiss(f"No cached response for {llm.model_name} (replay mode)")
 
-        content = [
-            {"type": "text", "text": SYSTEM_MESSAGE},
+    content = [
+        {"type": "text", "text": prompt},
+        *(
             {
                 "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
-            },
-        ]
+                "image_url": {"url": image_url},
+            }
+            for image_url in image_urls
+        ),
+    ]
+    message = HumanMessage(content)
+    
+    completion, elapsed = await call_with_policy(
+        lambda: stream_completion(llm, [message]), limiter, policy or RequestPolicy()
+    )
+    if cache is not None:
+        cache.put(key, llm.model_name, completion.text, elapsed, completion.usage)
+    return completion, elapsed
+
 
-        message = HumanMessage(content)
-        response = await llm.ainvoke([message])
+async def request_transcription(
+    llm: ChatOpenAI,
+    image_url: str,
+    limiter: AdaptiveLimiter,
+    policy: RequestPolicy | None = None,
+    cache: ResponseCache | None = None,
+    image_sha: str | None = None,
+) -> tuple[Completion, float]:
+    """
+    Ask a model to transcribe an encoded image (see request_completion).
+    
+    Args:
+        llm: ChatOpenAI instance configured with the model
+        image_url: Image encoded as a data URL
+        limiter: The model's adaptive concurrency limiter
+        policy: The model's retry and hedging policy (default: retries, no hedging)
+        cache: Optional response cache
+        image_sha: SHA-256 of the image bytes, required with a cache
         
-        elapsed = time.perf_counter() - start
+    Returns:
+        The model's transcription (as a streamed completion) and the time of
+        the request that produced it, in seconds
+    """
+    return await request_completion(
+        llm, SYSTEM_MESSAGE, [image_url], limiter, policy, cache, [image_sha] if image_sha else None
+    )
+
+
+async def request_batch_transcription(
+    llm: ChatOpenAI,
+    image_urls: list[str],
+    limiter: AdaptiveLimiter,
+    policy: RequestPolicy | None = None,
+    cache: ResponseCache | None = None,
+    image_shas: list[str] | None = None,
+) -> tuple[list[str], bool, Completion, float]:
+    """
+    Ask a model to transcribe several line images in one request (see request_completion).
+    
+    The images are sent as separate parts of one message and the model answers
+    with one numbered line per image, which is split back into transcriptions.
+    
+    Args:
+        llm: ChatOpenAI instance configured with the model
+        image_urls: Line images encoded as data URLs, in order
+        limiter: The model's adaptive concurrency limiter
+        policy: The model's retry and hedging policy (default: retries, no hedging)
+        cache: Optional response cache
+        image_shas: SHA-256 of each image's bytes, required with a cache
         
-        prediction = str(response.content)
+    Returns:
+        One transcription per image, whether splitting the response was
+        ambiguous, the streamed completion and the time of the request in seconds
+    """
+    prompt = SYSTEM_MESSAGE + BATCH_MESSAGE.format(count=len(image_urls))
+    completion, elapsed = await request_completion(llm, prompt, image_urls, limiter, policy, cache, image_shas)
+    predictions, ambiguous = split_batch_response(completion.text, len(image_urls))
+    return predictions, ambiguous, completion, elapsed
+
+
+def get_result_details(
+    payload: Payload,
+    completion: Completion,
+    ready_at: float | None = None,
+    lines: int = 1,
+    price: ModelPrice | None = None,
+) -> dict:
+    """
+    Break a request's latency and usage down into the fields stored with each result.
+    
+    Args:
+        payload: The uploaded image's payload
+        completion: The streamed response
+        ready_at: perf_counter() when the payload was queued for the request
+        lines: Line images sent in the request (1 for unbatched requests)
+        price: The model's price, None if unknown (no cost is recorded)
         
-        diff_result = get_diff(prediction, ground_truth)
-        wer, cer = get_metrics(prediction, ground_truth)
+    Returns:
+        Dictionary of payload size, queue wait, encode time, time to first
+        token, generation time, output tokens per second, prompt and completion
+        tokens and cost in USD; in a batch, each line is charged an equal share
+        of the generation time, tokens and cost
+    """
+    usage = completion.usage or {}
+    prompt_tokens = usage.get("input_tokens")
+    completion_tokens = usage.get("output_tokens")
+    cost = None
+    if price is not None and prompt_tokens is not None and completion_tokens is not None:
+        cost = price.cost(prompt_tokens, completion_tokens, images=lines) / lines
+    return {
+        "payload_bytes": payload.payload_bytes,
+        "queue_wait": completion.started_at - ready_at if ready_at is not None else None,
+        "encode_time": payload.encode_time,
+        "ttft": completion.ttft,
+        "generation_time": completion.generation_time / lines if completion.generation_time is not None else None,
+        "tokens_per_sec": completion.tokens_per_sec,
+        "prompt_tokens": prompt_tokens / lines if prompt_tokens is not None else None,
+        "completion_tokens": completion_tokens / lines if completion_tokens is not None else None,
+        "cost": cost,
+    }
+
+
+def score_result(
+    model_id: str,
+    image: Path,
+    prediction: str,
+    ground_truth: str,
+    elapsed: float,
+    details: dict | None = None,
+) -> dict:
+    """
+    Calculate performance metrics for a transcription (CPU bound, runs in a worker process).
+    
+    Args:
+        model_id: ID of the model being used
+        image: Path to the processed image
+        prediction: The model's transcription
+        ground_truth: Ground truth text
+        elapsed: Request time in seconds
+        details: Optional fields stored with the result, e.g. payload size,
+            latency breakdown (see get_result_details) and batch details
         
-        return {
-            "model_id": model_id,
-            "image": str(image),
-            "time_sec": elapsed,
-            "content": prediction,
-            "ground_truth": ground_truth,
-            "diff": diff_result,
-            "wer": wer,
-            "cer": cer,
-        }
+    Returns:
+        Dictionary containing model_id, image path, processing time, prediction,
+        ground truth, diff result, WER, CER and the given details
+    """
+    scores = score(prediction, ground_truth)
+    
+    return {
+        "model_id": model_id,
+        "image": str(image),
+        "time_sec": elapsed,
+        "content": prediction,
+        "ground_truth": ground_truth,
+        "diff": {
+            key: scores[key]
+            for key in ("diffs", "matches", "deletions", "insertions", "accuracy")
+        },
+        "wer": scores["wer"],
+        "cer": scores["cer"],
+        **(details or {}),
+    }
 
 
-def build_llms(cfg) -> dict[str, ChatOpenAI]:
+async def run_model_on_image(
+    model_id: str,
+    llm: ChatOpenAI,
+    image: Path,
+    limiter: AdaptiveLimiter,
+    policy: RequestPolicy | None = None,
+    cache: ResponseCache | None = None,
+    preprocessing: dict | None = None,
+    price: ModelPrice | None = None,
+):
+    """
+    Run a specific model on a single image and calculate performance metrics.
+    
+    Convenience wrapper running all pipeline stages for one item; run_all runs
+    them as separate stages instead.
+    
+    Args:
+        model_id: ID of the model being used
+        llm: ChatOpenAI instance configured with the model
+        image: Path to the image to process
+        limiter: The model's adaptive concurrency limiter
+        policy: The model's retry and hedging policy
+        cache: Optional response cache
+        preprocessing: Keyword arguments of preprocess_image, None to upload the original
+        price: The model's price, to record the cost of the request
+        
+    Returns:
+        Dictionary containing model_id, image path, processing time, prediction,
+        ground truth, diff result, WER, CER, payload size, latency breakdown,
+        token usage and cost
+    """
+    payload = await asyncio.to_thread(prepare_payload, image, preprocessing)
+    ready_at = time.perf_counter()
+    completion, elapsed = await request_transcription(
+        llm, payload.data_url, limiter, policy, cache, payload.image_sha
+    )
+    return await asyncio.to_thread(
+        score_result, model_id, image, completion.text, payload.ground_truth, elapsed,
+        get_result_details(payload, completion, ready_at, price=price),
+    )
+
+
+def build_llms(cfg, offline: bool = False, http_client=None) -> dict[str, ChatOpenAI]:
     """
     Build a dictionary of ChatOpenAI instances for all configured models.
     
     Args:
         cfg: Configuration object containing model information
+        offline: Don't require an API key, for runs that never call the models (replay)
+        http_client: Async HTTP client shared by all models (see build_http_client);
+            None lets each model use the library default
         
     Returns:
-        Dictionary mapping model IDs to ChatOpenAI instances
+        Dictionary mapping result IDs (label or model ID) to ChatOpenAI instances
+        
+    Raises:
+        ValueError: If the API key is missing and the run is not offline
     """
-    assert OPENROUTER_API_KEY is not None
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key and not offline:
+        raise ValueError("OPENROUTER_API_KEY environment variable is not set")
     
     return {
-        model.model_id: ChatOpenAI(
+        model.result_id: ChatOpenAI(
             model=model.model_id,
-            api_key=SecretStr(OPENROUTER_API_KEY),
-            base_url="https://openrouter.ai/api/v1",
+            api_key=SecretStr(api_key or "offline"),
+            base_url=cfg.http.base_url,
+            http_async_client=http_client,
+            # Report token usage at the end of streamed responses
+            stream_usage=True,
+            # Retries are classified and scheduled by the request policy instead
+            max_retries=0,
         )
         for model in cfg.models
     }
     
 
-async def run_all(cfg, images, max_concurrency=5):
+def build_limiters(cfg) -> dict[str, AdaptiveLimiter]:
+    """
+    Build an adaptive concurrency limiter for every configured model.
+    
+    Args:
+        cfg: Configuration object containing model information
+        
+    Returns:
+        Dictionary mapping result IDs to their limiters
+    """
+    limiters = {}
+    for model in cfg.models:
+        rate_limit = model.rate_limit
+        limiters[model.result_id] = AdaptiveLimiter(
+            initial=model.concurrency.initial,
+            minimum=model.concurrency.min,
+            maximum=model.concurrency.max,
+            rate=rate_limit.requests_per_second if rate_limit else None,
+            burst=rate_limit.burst if rate_limit else None,
+        )
+    return limiters
+
+
+def build_policies(cfg) -> dict[str, RequestPolicy]:
+    """
+    Build the retry and hedging policy of every configured model.
+    
+    Args:
+        cfg: Configuration object containing model information
+        
+    Returns:
+        Dictionary mapping result IDs to their request policies
+    """
+    policies = {}
+    for model in cfg.models:
+        hedging = model.hedging
+        policies[model.result_id] = RequestPolicy(
+            max_attempts=model.retries.max_attempts,
+            base_delay=model.retries.base_delay,
+            max_delay=model.retries.max_delay,
+            hedge_percentile=hedging.percentile if hedging else None,
+            hedge_budget=hedging.budget if hedging else 0.0,
+            hedge_min_samples=hedging.min_samples if hedging else 0,
+        )
+    return policies
+
+
+def estimate_cost(cfg, images, prices: dict[str, ModelPrice] | None = None) -> dict[str, dict]:
     """
-    Run all configured models on selected images.
+    Project the token usage and cost of a planned run without calling any model.
+    
+    Models with results use their average prompt and completion tokens per
+    image so far; the others get a rough estimate from the prompt and ground
+    truth lengths. Images a model would skip (avoid_rescan) are not counted.
     
     Args:
         cfg: Configuration object containing model and source information
         images: List of image paths to process
-        max_concurrency: Maximum number of concurrent model runs
+        prices: Model ID to price (default: the cached OpenRouter price table)
+        
+    Returns:
+        Dictionary mapping result IDs to the images, requests, estimated prompt
+        and completion tokens, estimated cost in USD (None without a price) and
+        the basis of the estimate ("history" or "heuristic")
+    """
+    if prices is None:
+        prices = load_price_table(get_state_dir())
+    history = aggregates.summarize(load_model_totals(), None)
+    ground_truth_tokens = {image: len(load_ground_truth(image)) / CHARS_PER_TOKEN + 1 for image in images}
+    
+    estimates = {}
+    for model in cfg.models:
+        planned = [
+            image for image in images
+            if not (cfg.avoid_rescan and should_skip_image(image, model.result_id))
+        ]
+        requests = -(-len(planned) // model.batch_size)
+        past = history.get(model.result_id, {})
+        if "avg_prompt_tokens" in past and "avg_completion_tokens" in past:
+            basis = "history"
+            prompt_tokens = past["avg_prompt_tokens"] * len(planned)
+            completion_tokens = past["avg_completion_tokens"] * len(planned)
+        else:
+            basis = "heuristic"
+            prompt = SYSTEM_MESSAGE if model.batch_size == 1 else SYSTEM_MESSAGE + BATCH_MESSAGE
+            prompt_tokens = requests * len(prompt) / PROMPT_CHARS_PER_TOKEN + len(planned) * IMAGE_TOKENS_ESTIMATE
+            completion_tokens = sum(ground_truth_tokens[image] for image in planned)
+        
+        price = prices.get(model.model_id)
+        estimates[model.result_id] = {
+            "images": len(planned),
+            "requests": requests,
+            "prompt_tokens": round(prompt_tokens),
+            "completion_tokens": round(completion_tokens),
+            "cost": price.cost(prompt_tokens, completion_tokens, len(planned), requests) if price else None,
+            "basis": basis,
+        }
+    return estimates
+
+
+def plan_run(cfg, images, run_queue: RunQueue, shard: tuple[int, int] | None = None) -> str:
+    """
+    Record every (model, image) pair a run will process in the run queue.
+    
+    Args:
+        cfg: Configuration object containing model information
+        images: List of image paths to process
+        run_queue: Queue to plan the run in
+        shard: (index, count) to only plan the pairs of one shard of the work set
+            (see get_shard), e.g. (2, 4) on the second of four machines
         
     Returns:
-        None
-    """
-    semaphore = asyncio.Semaphore(max_concurrency)
-    llms = build_llms(cfg)
-
-    tasks = []
-    processed_folders = set()
-
-    for model_id, llm in llms.items():
-        for image in images:
-            tasks.append(
-                run_model_on_image(
-                    model_id=model_id,
-                    llm=llm,
-                    image=image,
-                    semaphore=semaphore,
+        ID of the planned run
+    """
+    items = [
+        (model.result_id, str(image))
+        for model in cfg.models
+        for image in images
+        if shard is None or get_shard(model.result_id, get_result_key(image), shard[1]) == shard[0]
+        # Don't pay twice for a (model, image) pair that already has a result
+        if not (cfg.avoid_rescan and should_skip_image(image, model.result_id))
+    ]
+    return run_queue.create_run(cfg.model_dump_json(), items)
+
+
+async def run_all(
+    cfg,
+    images=None,
+    run_id=None,
+    prepare_workers=4,
+    score_workers=None,
+    queue_size=None,
+    payload_cache_mb=16,
+    lease_seconds=LEASE_SECONDS,
+):
+    """
+    Run all configured models on selected images, or on what is left of a planned run.
+    
+    Work items come from the persistent run queue (see RunQueue): each model
+    leases its pending (model, image) pairs in chunks and renews the leases
+    while they are in flight, so several processes can work on the same run,
+    and items are marked done once their results are sealed in the journal.
+    A run that was interrupted is resumed by passing its ID.
+    
+    Work flows through a pipeline of stages connected by bounded queues:
+    - lease: take the model's next items from the run queue
+    - prepare: read/encode images and load ground truth in a thread pool, once
+      per image: the payload is shared by every model through the payload cache
+    - request: call the models; each model has its own lane (queue and workers)
+      gated by an adaptive limiter, so a throttled model never holds back the others;
+      transient failures are retried with backoff and slow calls optionally hedged;
+      models with a batch_size above 1 get several line images per request;
+      all models share one tuned HTTP connection pool
+    - score: compute metrics in a process pool, off the event loop
+    - persist: a single writer appending results to the journal
+    
+    Args:
+        cfg: Configuration object containing model and source information
+        images: List of image paths to process, planned as a new run
+        run_id: Planned run to work on instead (see plan_run)
+        prepare_workers: Threads reading and encoding images
+        score_workers: Processes scoring results (default: CPU count)
+        queue_size: Capacity of each inter-stage queue (default: twice the model's
+            max concurrency for request queues, twice the total for shared ones),
+            which bounds how many encoded payloads and results are held in memory
+        payload_cache_mb: Size bound of the shared payload cache (0 to encode
+            the image again for every model)
+        lease_seconds: Seconds a work item stays leased to this process without renewal
+        
+    Returns:
+        ID of the run
+    """
+    run_queue = RunQueue(get_state_dir() / RUN_QUEUE_FILENAME)
+    if run_id is None:
+        run_id = plan_run(cfg, images, run_queue)
+    worker_id = new_worker_id()
+
+    limiters = build_limiters(cfg)
+    policies = build_policies(cfg)
+    total_concurrency = sum(limiter.maximum for limiter in limiters.values())
+    # One connection pool for all models; hedged requests may double what is in flight
+    connections = ConnectionStats()
+    http_client = build_http_client(cfg.http, 2 * total_concurrency, connections)
+    llms = build_llms(cfg, offline=cfg.response_cache == "replay", http_client=http_client)
+    cache = None
+    if cfg.response_cache != "disabled":
+        cache = ResponseCache(
+            get_state_dir() / RESPONSE_CACHE_FILENAME,
+            max_bytes=cfg.response_cache_max_mb * 1024 * 1024,
+            replay=cfg.response_cache == "replay",
+        )
+    payloads = PayloadCache(payload_cache_mb * 1024 * 1024)
+    preprocessing = {model.result_id: get_preprocessing_options(model) for model in cfg.models}
+    batch_sizes = {model.result_id: model.batch_size for model in cfg.models}
+    prices = load_price_table(get_state_dir(), offline=cfg.response_cache == "replay")
+    model_prices = {model.result_id: prices.get(model.model_id) for model in cfg.models}
+    spent = dict.fromkeys(llms, 0.0)
+    preprocessed_dir = get_state_dir() / PREPROCESSED_DIRNAME
+    score_workers = score_workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+
+    # Leased items wait here for preparation; a lease covers a couple of requests per worker
+    lease_sizes = {model_id: 2 * limiters[model_id].maximum * batch_sizes[model_id] for model_id in llms}
+    prepare_queues: dict[str, asyncio.Queue] = {
+        model_id: asyncio.Queue(maxsize=lease_sizes[model_id]) for model_id in llms
+    }
+    request_queues: dict[str, asyncio.Queue] = {
+        model_id: asyncio.Queue(maxsize=queue_size or 2 * limiters[model_id].maximum)
+        for model_id in llms
+    }
+    score_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or 2 * total_concurrency)
+    persist_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or 2 * total_concurrency)
+
+    # (model_id, image) items whose results are in the journal but not yet sealed
+    unsealed: list[tuple[str, str]] = []
+
+    def seal(journal):
+        # Items are done once their results survive this process
+        journal.checkpoint()
+        run_queue.complete(run_id, unsealed)
+        unsealed.clear()
+
+    async def lease_stage(model_id):
+        prepare_queue = prepare_queues[model_id]
+        while leased := run_queue.lease(run_id, model_id, worker_id, lease_sizes[model_id], lease_seconds):
+            for image in leased:
+                await prepare_queue.put(Path(image))
+
+    async def renew_stage():
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            try:
+                run_queue.renew(run_id, worker_id, lease_seconds)
+            except Exception as e:
+                # Try again on the next tick, well before the leases expire
+                print("Error renewing leases:", e)
+
+    async def prepare_stage(model_id, thread_pool):
+        prepare_queue, request_queue = prepare_queues[model_id], request_queues[model_id]
+        options = preprocessing[model_id]
+        batch = []
+        while True:
+            image = await prepare_queue.get()
+            try:
+                # Models with the same preprocessing share the payload
+                key = (image, json.dumps(options, sort_keys=True))
+                payload = await payloads.get(
+                    key,
+                    lambda: loop.run_in_executor(
+                        thread_pool, prepare_payload, image, options, preprocessed_dir
+                    ),
                 )
-            )
+                batch.append((image, payload))
+            except Exception as e:
+                print(f"Error preparing {image}:", e)
+                run_queue.fail(run_id, [(model_id, str(image))], str(e))
+            finally:
+                # Requests carry batch_size lines; the last one takes what is left
+                if batch and (len(batch) == batch_sizes[model_id] or prepare_queue.empty()):
+                    await request_queue.put((time.perf_counter(), batch))
+                    batch = []
+                prepare_queue.task_done()
 
-    for coroutine in asyncio.as_completed(tasks):
-        result = await coroutine
-        if isinstance(result, Exception | BaseException):
-            print("Error:", result)
-        else:
-            # Save individual result as JSON
-            result_path = save_individual_result(result)
-            print(f"Saved result to: {result_path}")
-            
-            # Track the folder for summary update
-            benchmark_dir = get_benchmark_path(Path(result["image"]))
-            processed_folders.add(benchmark_dir)
-            
-            print(result)
+    async def request_stage(model_id):
+        request_queue = request_queues[model_id]
+        while True:
+            ready_at, items = await request_queue.get()
+            try:
+                if len(items) == 1 and batch_sizes[model_id] == 1:
+                    image, payload = items[0]
+                    completion, elapsed = await request_transcription(
+                        llms[model_id],
+                        payload.data_url,
+                        limiters[model_id],
+                        policies[model_id],
+                        cache,
+                        payload.image_sha,
+                    )
+                    await score_queue.put((
+                        model_id, image, completion.text, payload.ground_truth, elapsed,
+                        get_result_details(payload, completion, ready_at, price=model_prices[model_id]),
+                    ))
+                    continue
+
+                predictions, ambiguous, completion, elapsed = await request_batch_transcription(
+                    llms[model_id],
+                    [payload.data_url for _, payload in items],
+                    limiters[model_id],
+                    policies[model_id],
+                    cache,
+                    [payload.image_sha for _, payload in items],
+                )
+                for (image, payload), prediction in zip(items, predictions):
+                    # Each line is charged an equal share of the request time
+                    details = get_result_details(payload, completion, ready_at, len(items), model_prices[model_id])
+                    details.update(batch_size=len(items), batch_ambiguous=ambiguous)
+                    await score_queue.put((
+                        model_id, image, prediction, payload.ground_truth, elapsed / len(items), details,
+                    ))
+            except Exception as e:
+                images = ", ".join(str(image) for image, _ in items)
+                print(f"Error running {model_id} on {images}:", e)
+                run_queue.fail(run_id, [(model_id, str(image)) for image, _ in items], str(e))
+            finally:
+                request_queue.task_done()
+
+    async def score_stage(process_pool):
+        while True:
+            item = await score_queue.get()
+            try:
+                result = await loop.run_in_executor(process_pool, score_result, *item)
+                await persist_queue.put(result)
+            except Exception as e:
+                print(f"Error scoring {item[1]} for {item[0]}:", e)
+                run_queue.fail(run_id, [(item[0], str(item[1]))], str(e))
+            finally:
+                score_queue.task_done()
+
+    async def persist_stage(journal):
+        while True:
+            result = await persist_queue.get()
+            try:
+                # Append to the results journal; per-image files are written on compaction
+                journal.append(result)
+                unsealed.append((result["model_id"], result["image"]))
+                spent[result["model_id"]] += result.get("cost") or 0.0
+                print(result)
+            except Exception as e:
+                print(f"Error saving {result['image']} for {result['model_id']}:", e)
+                run_queue.fail(run_id, [(result["model_id"], result["image"])], str(e))
+                continue
+            finally:
+                persist_queue.task_done()
+            if len(unsealed) >= journal.batch_size:
+                try:
+                    seal(journal)
+                except Exception as e:
+                    # The results stay unsealed and are sealed with the next batch
+                    print("Error sealing the journal:", e)
+
+    async def watch(awaitable, stages):
+        # Stages only stop on an error nothing caught, which would leave their queue undrained
+        waiter = asyncio.ensure_future(awaitable)
+        await asyncio.wait([waiter, *stages], return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            waiter.cancel()
+            stopped = next(stage for stage in stages if stage.done())
+            raise RuntimeError("A pipeline stage stopped") from stopped.exception()
+        return waiter.result()
+
+    try:
+        with (
+            ThreadPoolExecutor(max_workers=prepare_workers) as thread_pool,
+            ProcessPoolExecutor(max_workers=score_workers) as process_pool,
+            ResultsJournal() as journal,
+        ):
+            leases = []
+            stages = [
+                asyncio.create_task(renew_stage()),
+                *(asyncio.create_task(prepare_stage(model_id, thread_pool)) for model_id in llms),
+                # One worker per unit of the model's max concurrency; the limiter decides how many run
+                *(
+                    asyncio.create_task(request_stage(model_id))
+                    for model_id, limiter in limiters.items()
+                    for _ in range(limiter.maximum)
+                ),
+                *(asyncio.create_task(score_stage(process_pool)) for _ in range(score_workers)),
+                asyncio.create_task(persist_stage(journal)),
+            ]
+
+            try:
+                while True:
+                    leases = [asyncio.create_task(lease_stage(model_id)) for model_id in llms]
+                    # Drain the stages in order once every item is leased; each queue is
+                    # empty once its upstream is done
+                    await watch(asyncio.gather(*leases), stages)
+                    for queue in (*prepare_queues.values(), *request_queues.values(), score_queue, persist_queue):
+                        await watch(queue.join(), stages)
+                    seal(journal)
+                    if not any(run_queue.leased_by_others(run_id, model_id, worker_id) for model_id in llms):
+                        break
+                    # Another process holds the rest: take it over if that process dies
+                    await asyncio.sleep(min(lease_seconds / 4, LEASE_POLL_SECONDS))
+            finally:
+                for stage in (*leases, *stages):
+                    stage.cancel()
+                await asyncio.gather(*leases, *stages, return_exceptions=True)
+    finally:
+        # The journal is sealed on exit; items without a result go back to the queue
+        run_queue.complete(run_id, unsealed)
+        run_queue.release(run_id, worker_id)
+        print(f"Run {run_id}:", run_queue.progress(run_id))
+        run_queue.close()
+        await http_client.aclose()
+        if cache is not None:
+            cache.close()
+
+    for model_id, limiter in limiters.items():
+        print(
+            f"Requests for {model_id}:",
+            {**limiter.report(), **policies[model_id].report(), "cost_usd": round(spent[model_id], 6)},
+        )
+    print("HTTP connections:", connections.report())
+    print("Payload cache:", payloads.report())
+    if cache is not None:
+        print("Response cache:", cache.report())
+
+    # Fold the journal into the per-image JSON files
+    result_paths = compact_journal()
+    print(f"Saved {len(result_paths)} result files")
+    processed_folders = {result_path.parent for result_path in result_paths}
     
     # Update folder summaries for all processed folders
     for folder in processed_folders:
         summary_path = update_folder_summary(folder)
         print(f"Updated folder summary: {summary_path}")
-            
+    
+    return run_id
+
 
-asyncio.run(run_all(cfg, images))
+if __name__ == "__main__":
+    from benchmark.cli import main
+    sys.exit(main(["run", *sys.argv[1:]]))
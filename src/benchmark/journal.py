@@ -0,0 +1,290 @@
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+from benchmark.results_manager import (
+    build_model_result,
+    get_benchmark_path,
+    get_result_filename,
+    get_result_key,
+    get_state_dir,
+    read_results,
+    record_processed,
+    record_result_updates,
+    write_results,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: compaction falls back to the segment rename claim only
+    fcntl = None
+
+
+JOURNAL_DIRNAME = "journal"
+SEGMENT_SUFFIX = ".jsonl"
+OPEN_SUFFIX = ".part"
+CLAIMED_SUFFIX = ".compacting"
+
+
+def get_journal_dir(benchmarks_root: Path = Path("benchmarks")) -> Path:
+    """
+    Get the directory holding journal segments for a benchmarks tree.
+
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+
+    Returns:
+        Path to the journal directory
+    """
+    return get_state_dir(benchmarks_root) / JOURNAL_DIRNAME
+
+
+class ResultsJournal:
+    """
+    Append-only store for run results.
+
+    Each result is appended as one JSON line to a segment owned by this writer, so
+    the cost of saving a result does not depend on how many models are already
+    stacked on the image. Lines are buffered and flushed in batches; the segment is
+    sealed on close and folded into the per-image JSON files by compact_journal.
+    """
+
+    def __init__(self, benchmarks_root: Path = Path("benchmarks"), batch_size: int = 50):
+        """
+        Args:
+            benchmarks_root: Root directory for all benchmarks
+            batch_size: Number of buffered results that triggers a flush to disk
+        """
+        self.benchmarks_root = benchmarks_root
+        self.batch_size = max(1, batch_size)
+
+        self._journal_dir = get_journal_dir(benchmarks_root)
+        self._journal_dir.mkdir(parents=True, exist_ok=True)
+
+        self._new_segment()
+        self._buffer: list[str] = []
+        self.closed = False
+
+    def _new_segment(self) -> None:
+        segment_id = f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.segment_path = self._journal_dir / f"{segment_id}{SEGMENT_SUFFIX}"
+        self._open_path = self._journal_dir / f"{segment_id}{SEGMENT_SUFFIX}{OPEN_SUFFIX}"
+
+    def append(self, result: dict[str, Any]) -> None:
+        """
+        Append a single run result to the journal.
+
+        Args:
+            result: Result dictionary as returned by run_model_on_image
+        """
+        if self.closed:
+            raise ValueError("Cannot append to a closed journal")
+
+        record = {
+            "image": result["image"],
+            "model_id": result["model_id"],
+            "entry": build_model_result(result),
+        }
+        self._buffer.append(json.dumps(record, ensure_ascii=False))
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write buffered results to the segment and fsync it.
+        """
+        if not self._buffer:
+            return
+
+        with open(self._open_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(self._buffer) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._buffer.clear()
+
+    def checkpoint(self) -> None:
+        """
+        Seal the results appended so far and continue in a new segment.
+
+        Everything appended before a checkpoint can be compacted even if this
+        writer never gets to close, e.g. because its process was killed.
+        """
+        if self.closed:
+            raise ValueError("Cannot checkpoint a closed journal")
+
+        self.flush()
+        if self._open_path.exists():
+            os.replace(self._open_path, self.segment_path)
+        self._new_segment()
+
+    def close(self) -> None:
+        """
+        Flush remaining results and seal the segment so it can be compacted.
+        """
+        if self.closed:
+            return
+
+        self.flush()
+        if self._open_path.exists():
+            os.replace(self._open_path, self.segment_path)
+        self.closed = True
+
+    def __enter__(self) -> "ResultsJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+@contextmanager
+def _compaction_lock(journal_dir: Path) -> Iterator[None]:
+    """
+    Hold an exclusive lock so only one process rewrites per-image files at a time.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with open(journal_dir / ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _writer_alive(segment: Path) -> bool:
+    """
+    Check whether the process that wrote an unsealed segment is still running on this machine.
+    """
+    # Segments are named <timestamp>-<pid>-<random>
+    try:
+        pid = int(segment.name.split("-")[1])
+    except (IndexError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_segment(segment: Path) -> Iterator[dict[str, Any]]:
+    """
+    Yield the records of a journal segment, skipping a torn trailing line.
+    """
+    with open(segment, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def compact_journal(
+    benchmarks_root: Path = Path("benchmarks"),
+    include_unsealed: bool = False,
+) -> list[Path]:
+    """
+    Fold sealed journal segments into the per-image JSON files the website expects.
+
+    Records are grouped by image so every touched results file is read and rewritten
+    once per compaction, however many models or results landed on it. Later records
+    for the same (image, model) pair win. The running aggregates of every touched
+    folder and the processed-pairs index are updated along the way. Compacted
+    segments are removed.
+
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        include_unsealed: Also compact segments that were never sealed, e.g. left
+            behind by a crashed run. Only safe when no writer is still active:
+            segments whose writer is still running on this machine are skipped,
+            but writers on other machines sharing the tree cannot be detected.
+
+    Returns:
+        Paths of the per-image result files that were written
+    """
+    journal_dir = get_journal_dir(benchmarks_root)
+    if not journal_dir.exists():
+        return []
+
+    written: list[Path] = []
+
+    with _compaction_lock(journal_dir):
+        patterns = [f"*{SEGMENT_SUFFIX}", f"*{CLAIMED_SUFFIX}"]
+        if include_unsealed:
+            patterns.append(f"*{SEGMENT_SUFFIX}{OPEN_SUFFIX}")
+
+        segments: list[Path] = []
+        for pattern in patterns:
+            for segment in sorted(journal_dir.glob(pattern)):
+                if segment.name.endswith(CLAIMED_SUFFIX):
+                    segments.append(segment)
+                    continue
+                if segment.name.endswith(OPEN_SUFFIX) and _writer_alive(segment):
+                    continue
+                claimed = segment.with_name(segment.name + CLAIMED_SUFFIX)
+                try:
+                    os.replace(segment, claimed)
+                except FileNotFoundError:
+                    continue
+                segments.append(claimed)
+
+        pending: dict[Path, dict[str, dict[str, Any]]] = {}
+        sources: dict[Path, Path] = {}
+        updates: dict[Path, list[tuple[str, dict[str, Any], dict[str, Any] | None]]] = {}
+
+        for segment in sorted(segments):
+            for record in _read_segment(segment):
+                image_path = Path(record["image"])
+                result_path = get_benchmark_path(image_path, benchmarks_root) / get_result_filename(image_path)
+                pending.setdefault(result_path, {})[record["model_id"]] = record["entry"]
+                sources[result_path] = image_path
+
+        for result_path, entries in pending.items():
+            result_path.parent.mkdir(parents=True, exist_ok=True)
+
+            existing_data: dict[str, Any] = {}
+            if result_path.exists():
+                existing_data = read_results(result_path)
+
+            folder_updates = updates.setdefault(result_path.parent, [])
+            for model_id, entry in entries.items():
+                folder_updates.append((model_id, entry, existing_data.get(model_id)))
+
+            existing_data.update(entries)
+            write_results(result_path, existing_data)
+            written.append(result_path)
+
+            image_path = sources[result_path]
+            image_dest = result_path.parent / image_path.name
+            if not image_dest.exists() and image_path.exists():
+                shutil.copy2(image_path, image_dest)
+
+        for benchmark_dir, folder_updates in updates.items():
+            record_result_updates(benchmark_dir, folder_updates, benchmarks_root)
+
+        record_processed(
+            [
+                (get_result_key(sources[result_path]), model_id)
+                for result_path, entries in pending.items()
+                for model_id in entries
+            ],
+            benchmarks_root,
+        )
+
+        for segment in segments:
+            segment.unlink(missing_ok=True)
+
+    return written
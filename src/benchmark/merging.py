@@ -0,0 +1,163 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from benchmark.results_manager import (
+    generate_manifest,
+    list_benchmark_folders,
+    read_results,
+    record_processed,
+    record_result_updates,
+    update_folder_summary,
+    write_results,
+)
+
+
+class FolderMerge(NamedTuple):
+    rel_dir: str
+    added: int  # model entries added or replaced
+    duplicates: int  # entries already present, identical
+    conflicts: list[str]  # "<result file>: <model>" for differing entries
+    images: int  # input images copied
+    pairs: list[tuple[str, str]]  # (result_key, model_id) of the added entries
+
+
+def _link_or_copy(source: Path, destination: Path) -> None:
+    # A hard link costs no copy when both trees are on the same filesystem
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def merge_folder(target_root: Path, rel_dir: str, sources: list[Path], replace: bool = False) -> FolderMerge:
+    """
+    Merge one folder of several benchmarks trees into the target tree.
+
+    Model entries are merged into the per-image files by model key; entries
+    identical to the ones already there are skipped, differing ones are
+    conflicts. Input images are copied once. The folder's running aggregates
+    and summary are updated with the changed entries.
+
+    Args:
+        target_root: Root of the benchmarks tree merged into
+        rel_dir: Folder to merge, relative to the roots
+        sources: Roots of the trees holding the folder
+        replace: On a conflict, take the source's entry (default: keep the target's)
+
+    Returns:
+        What was merged
+    """
+    target_dir = target_root / rel_dir
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    merged: dict[str, dict[str, Any]] = {}
+    original: dict[str, dict[str, Any]] = {}
+    duplicates = images = 0
+    conflicts = []
+
+    for source in sources:
+        with os.scandir(source / rel_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or name == "_summary.json" or not entry.is_file():
+                    continue
+                if not name.endswith(".json"):
+                    destination = target_dir / name
+                    if not destination.exists():
+                        _link_or_copy(Path(entry.path), destination)
+                        images += 1
+                    continue
+
+                if name not in merged:
+                    try:
+                        original[name] = read_results(target_dir / name)
+                    except FileNotFoundError:
+                        original[name] = {}
+                    merged[name] = dict(original[name])
+                data = merged[name]
+
+                incoming = read_results(Path(entry.path))
+                for model_id, model_entry in incoming.items():
+                    existing = data.get(model_id)
+                    if existing is None:
+                        data[model_id] = model_entry
+                    elif existing == model_entry:
+                        duplicates += 1
+                    else:
+                        conflicts.append(f"{rel_dir}/{name}: {model_id}")
+                        if replace:
+                            data[model_id] = model_entry
+
+    updates = []
+    pairs = []
+    for name, data in merged.items():
+        before = original[name]
+        changed = [model_id for model_id, entry in data.items() if before.get(model_id) != entry]
+        if not changed:
+            continue
+        write_results(target_dir / name, data)
+        for model_id in changed:
+            updates.append((model_id, data[model_id], before.get(model_id)))
+            pairs.append((f"{rel_dir}/{name}", model_id))
+
+    if updates:
+        record_result_updates(target_dir, updates, target_root)
+        update_folder_summary(target_dir, target_root)
+    return FolderMerge(rel_dir, len(updates), duplicates, conflicts, images, pairs)
+
+
+def merge_trees(
+    sources: list[Path],
+    target_root: Path = Path("benchmarks"),
+    replace: bool = False,
+    workers: int | None = None,
+) -> dict[str, Any]:
+    """
+    Merge benchmarks trees, e.g. written by sharded runs on several machines, into one.
+
+    Every folder is merged by one worker process (see merge_folder), which
+    reads each source file once and each target file at most once, so the
+    cost grows with the number of files merged rather than with the size of
+    the target tree. The processed-pairs index and the manifest are updated
+    once at the end. Run it while no run is writing to the target tree.
+
+    Args:
+        sources: Roots of the trees to merge
+        target_root: Root of the benchmarks tree merged into
+        replace: On a conflict, take the source's entry (default: keep the target's)
+        workers: Processes merging folders (default: CPU count)
+
+    Returns:
+        Counts of folders, added, duplicate and conflicting entries and copied
+        images, the conflicts themselves and the manifest path
+
+    Raises:
+        ValueError: If a source is the target tree itself
+    """
+    folders: dict[str, list[Path]] = {}
+    for source in sources:
+        if source.resolve() == target_root.resolve():
+            raise ValueError(f"Cannot merge {source} into itself")
+        for folder in list_benchmark_folders(source):
+            folders.setdefault(folder.relative_to(source).as_posix(), []).append(source)
+
+    target_root.mkdir(parents=True, exist_ok=True)
+    merge = partial(merge_folder, target_root, replace=replace)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(merge, folders, folders.values(), chunksize=16))
+
+    record_processed([pair for result in results for pair in result.pairs], target_root)
+    manifest_path = generate_manifest(target_root)
+
+    return {
+        "folders": len(results),
+        "added": sum(result.added for result in results),
+        "duplicates": sum(result.duplicates for result in results),
+        "conflicts": [conflict for result in results for conflict in result.conflicts],
+        "images": sum(result.images for result in results),
+        "manifest": manifest_path,
+    }
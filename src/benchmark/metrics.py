@@ -1,31 +1,131 @@
+import re
+from typing import Any, Iterable
+
 from diff_match_patch import diff_match_patch
-from jiwer import wer, cer
+from rapidfuzz.distance import Levenshtein
 
 
-def get_diff(candidate: str, reference: str):
-    """Get character-level differences and an accuracy score."""
-    dmp = diff_match_patch()
-    diffs = dmp.diff_main(reference, candidate)
-    dmp.diff_cleanupSemantic(diffs)
+# Same normalization jiwer applies by default: characters are compared after
+# stripping, words after collapsing whitespace runs and splitting on spaces.
+_WHITESPACE_RUNS = re.compile(r"\s\s+")
+
+_dmp = diff_match_patch()
+
+
+def _words(text: str) -> list[str]:
+    return [w for w in _WHITESPACE_RUNS.sub(" ", text).strip().split(" ") if w]
+
+
+def _error_rate(distance: int, reference_length: int, candidate_length: int) -> float:
+    """
+    Edit distance over reference length, clipped to 1.0.
+
+    An empty reference scores every candidate token as an insertion, as jiwer does.
+    """
+    if reference_length == 0:
+        return min(float(candidate_length), 1.0)
+    return min(distance / reference_length, 1.0)
+
+
+def score(candidate: str, reference: str) -> dict[str, Any]:
+    """
+    Score a transcription against its ground truth in one call.
+
+    Computes the character diff with its match/insertion/deletion counts and
+    accuracy, plus the character and word edit distances behind CER and WER.
+    The diff is the semantic diff_match_patch diff the website renders; the edit
+    distances use a single Levenshtein pass per granularity with jiwer's default
+    normalization, so all values match get_diff and get_metrics.
+
+    Args:
+        candidate: Model transcription
+        reference: Ground truth
+
+    Returns:
+        Dictionary with diffs, matches, deletions, insertions, accuracy,
+        char_distance, word_distance, cer and wer
+    """
+    if candidate == reference:
+        # Nothing to align: every character and word matches
+        diffs = [(0, reference)] if reference else []
+        matches, deletions, insertions = len(reference), 0, 0
+        char_distance = word_distance = 0
+        reference_chars = len(reference.strip())
+        reference_words = candidate_words = len(_words(reference))
+        candidate_chars = reference_chars
+    else:
+        diffs = _dmp.diff_main(reference, candidate)
+        _dmp.diff_cleanupSemantic(diffs)
 
-    match_count = sum(len(text) for op, text in diffs if op == 0)
-    deletion_count = sum(len(text) for op, text in diffs if op == -1)
-    insertion_count = sum(len(text) for op, text in diffs if op == 1)
+        matches = deletions = insertions = 0
+        for op, text in diffs:
+            if op == 0:
+                matches += len(text)
+            elif op == -1:
+                deletions += len(text)
+            else:
+                insertions += len(text)
+
+        stripped_reference, stripped_candidate = reference.strip(), candidate.strip()
+        char_distance = Levenshtein.distance(stripped_reference, stripped_candidate)
+        reference_chars, candidate_chars = len(stripped_reference), len(stripped_candidate)
+
+        split_reference, split_candidate = _words(reference), _words(candidate)
+        word_distance = Levenshtein.distance(split_reference, split_candidate)
+        reference_words, candidate_words = len(split_reference), len(split_candidate)
 
     total = max(len(reference), len(candidate))
-    accuracy = match_count / total if total > 0 else 1.0
+    accuracy = matches / total if total > 0 else 1.0
 
     return {
         "diffs": diffs,  # list of (op, text)
-        "matches": match_count,
-        "deletions": deletion_count,
-        "insertions": insertion_count,
+        "matches": matches,
+        "deletions": deletions,
+        "insertions": insertions,
         "accuracy": accuracy,
+        "char_distance": char_distance,
+        "word_distance": word_distance,
+        "cer": _error_rate(char_distance, reference_chars, candidate_chars),
+        "wer": _error_rate(word_distance, reference_words, candidate_words),
+    }
+
+
+def score_batch(pairs: Iterable[tuple[str, str]]) -> list[dict[str, Any]]:
+    """
+    Score many (candidate, reference) pairs.
+
+    Identical pairs (e.g. several models returning the same transcription of a
+    line) are aligned once.
+
+    Args:
+        pairs: (candidate, reference) tuples
+
+    Returns:
+        One score dictionary per pair, in input order (see score)
+    """
+    cache: dict[tuple[str, str], dict[str, Any]] = {}
+    results = []
+    for pair in pairs:
+        result = cache.get(pair)
+        if result is None:
+            result = cache[pair] = score(*pair)
+        results.append(dict(result))
+    return results
+
+
+def get_diff(candidate: str, reference: str):
+    """Get character-level differences and an accuracy score."""
+    result = score(candidate, reference)
+    return {
+        "diffs": result["diffs"],  # list of (op, text)
+        "matches": result["matches"],
+        "deletions": result["deletions"],
+        "insertions": result["insertions"],
+        "accuracy": result["accuracy"],
     }
 
 
 def get_metrics(candidate: str, reference: str):
     """Get word error rate and character error rate."""
-    w_error = min(wer(reference, candidate), 1.0)
-    c_error = min(cer(reference, candidate), 1.0)
-    return w_error, c_error
+    result = score(candidate, reference)
+    return result["wer"], result["cer"]
@@ -0,0 +1,104 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from benchmark.result_format import dump_results, expand_results
+from benchmark.results_manager import list_benchmark_folders, list_result_files, write_results
+
+
+class FolderMigration(NamedTuple):
+    files: int
+    rewritten: int
+    mismatches: list[str]  # files left as they were: the compact form did not read back the same
+    bytes_before: int
+    bytes_after: int
+    parse_before: float  # seconds to parse the files as they were
+    parse_after: float  # seconds to parse them in the compact format
+    expand_after: float  # seconds to expand the parsed compact files back to the full shape
+
+
+def migrate_folder(benchmark_dir: Path, dry_run: bool = False) -> FolderMigration:
+    """
+    Rewrite the per-image result files of a folder in the compact format.
+
+    A file is only rewritten if its compact form reads back to exactly the
+    same results; files already compact are left alone. The running
+    aggregates need no update, since the results themselves do not change.
+
+    Args:
+        benchmark_dir: Benchmark folder to migrate
+        dry_run: Only measure, don't rewrite anything
+
+    Returns:
+        Counts, sizes and parse times before and after, and the time to expand
+        the compact files
+    """
+    rewritten = bytes_before = bytes_after = 0
+    parse_before = parse_after = expand_after = 0.0
+    mismatches = []
+    result_files = list_result_files(benchmark_dir)
+
+    for result_path in result_files:
+        stored = result_path.read_bytes()
+        start = time.perf_counter()
+        raw = json.loads(stored)
+        parse_before += time.perf_counter() - start
+        data = expand_results(raw)
+
+        compact = dump_results(data).encode("utf-8")
+        start = time.perf_counter()
+        raw = json.loads(compact)
+        parsed = time.perf_counter()
+        reread = expand_results(raw)
+        parse_after += parsed - start
+        expand_after += time.perf_counter() - parsed
+
+        bytes_before += len(stored)
+        if reread != data:
+            mismatches.append(str(result_path))
+            bytes_after += len(stored)
+            continue
+        bytes_after += len(compact)
+        if compact != stored:
+            rewritten += 1
+            if not dry_run:
+                write_results(result_path, data, compact=True)
+
+    return FolderMigration(
+        len(result_files), rewritten, mismatches, bytes_before, bytes_after, parse_before, parse_after, expand_after
+    )
+
+
+def migrate_results(
+    benchmarks_root: Path = Path("benchmarks"),
+    dry_run: bool = False,
+    workers: int | None = None,
+) -> dict[str, Any]:
+    """
+    Migrate every per-image result file of a benchmarks tree to the compact format.
+
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        dry_run: Only measure, don't rewrite anything
+        workers: Processes migrating folders (default: CPU count)
+
+    Returns:
+        Totals over the tree: files, rewritten files, mismatching files, the
+        size and parse time of the files before and after, and the time to
+        expand the compact files
+    """
+    folders = list_benchmark_folders(benchmarks_root)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(partial(migrate_folder, dry_run=dry_run), folders, chunksize=16))
+
+    report: dict[str, Any] = {
+        field: sum(getattr(result, field) for result in results)
+        for field in (
+            "files", "rewritten", "bytes_before", "bytes_after", "parse_before", "parse_after", "expand_after"
+        )
+    }
+    report["mismatches"] = [path for result in results for path in result.mismatches]
+    return report
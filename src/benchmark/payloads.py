@@ -0,0 +1,117 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, NamedTuple
+
+
+class Payload(NamedTuple):
+    data_url: str
+    ground_truth: str
+    image_sha: str  # SHA-256 of the uploaded image bytes
+    payload_bytes: int  # size of the uploaded image bytes
+    encode_time: float  # seconds spent reading, preprocessing and encoding the image
+
+    @property
+    def size(self) -> int:
+        """Approximate memory held by the payload, in bytes."""
+        return len(self.data_url) + len(self.ground_truth.encode("utf-8"))
+
+
+class PayloadCache:
+    """
+    Per-run, memory-bounded cache of encoded images shared by all models.
+
+    Every model lane asks for the same images, so each image (in each
+    preprocessing variant) is read and encoded once and the same data URL string is shared by all in-flight
+    requests instead of being copied per model. Concurrent requests for an
+    image that is still loading wait for that load. Least recently used
+    payloads are dropped once the cached payloads exceed `max_bytes`; a
+    max_bytes of 0 disables caching (every request loads its own payload).
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: Size bound of the cached payloads
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self.peak_bytes = 0
+
+        self._entries: OrderedDict[Hashable, Payload] = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Payload]]) -> Payload:
+        """
+        Get the payload of an image, loading it on a miss.
+
+        Args:
+            key: Identifies the image and its preprocessing, e.g. (path, options)
+            load: Coroutine function reading and encoding the image
+
+        Returns:
+            The image's payload
+        """
+        payload = self._entries.get(key)
+        if payload is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+        loading = self._loading.get(key)
+        if loading is not None:
+            self.hits += 1
+            return await asyncio.shield(loading)
+
+        self.misses += 1
+        if self.max_bytes <= 0:
+            return await self._timed_load(load)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            payload = await self._timed_load(load)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            del self._loading[key]
+
+        future.set_result(payload)
+        self._store(key, payload)
+        return payload
+
+    async def _timed_load(self, load: Callable[[], Awaitable[Payload]]) -> Payload:
+        start = time.perf_counter()
+        try:
+            return await load()
+        finally:
+            self.encode_seconds += time.perf_counter() - start
+
+    def _store(self, key: Hashable, payload: Payload) -> None:
+        if payload.size > self.max_bytes:
+            return
+        self._entries[key] = payload
+        self._bytes += payload.size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+        self.peak_bytes = max(self.peak_bytes, self._bytes)
+
+    def report(self) -> dict[str, float | int]:
+        """
+        Get the cache counters for the run report.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "encode_seconds": round(self.encode_seconds, 3),
+            "peak_cached_bytes": self.peak_bytes,
+        }
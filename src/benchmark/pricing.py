@@ -0,0 +1,71 @@
+from pathlib import Path
+from typing import NamedTuple
+
+from config.registry import PRICE_FIELDS, REGISTRY_MAX_AGE, REGISTRY_PATH, load_registry
+
+
+class ModelPrice(NamedTuple):
+    prompt: float  # USD per prompt token (image tokens included)
+    completion: float  # USD per completion token (reasoning tokens included)
+    image: float = 0.0  # USD per input image, for models billing images separately
+    request: float = 0.0  # USD per request
+
+    def cost(self, prompt_tokens: int, completion_tokens: int, images: int = 1, requests: int = 1) -> float:
+        """
+        Compute the cost of one or more requests.
+
+        Args:
+            prompt_tokens: Prompt tokens billed
+            completion_tokens: Completion tokens billed
+            images: Images sent
+            requests: Requests made
+
+        Returns:
+            Cost in USD
+        """
+        return (
+            prompt_tokens * self.prompt
+            + completion_tokens * self.completion
+            + images * self.image
+            + requests * self.request
+        )
+
+
+def _to_price(value: str | None) -> float:
+    # OpenRouter reports prices as decimal strings; "-1" marks variable pricing
+    try:
+        return max(float(value), 0.0) if value is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+def load_price_table(
+    state_dir: Path,
+    max_age: float = REGISTRY_MAX_AGE,
+    offline: bool = False,
+) -> dict[str, ModelPrice]:
+    """
+    Get the price of every OpenRouter model from the cached model list.
+
+    Prices come from the same snapshot of the OpenRouter model list that
+    config validation uses (see load_registry), so they are downloaded at
+    most once a day. A missing price never stops a run: models without one
+    simply get no cost.
+
+    Args:
+        state_dir: Directory holding the cached model list
+        max_age: Seconds after which the model list is downloaded again
+        offline: Never download, only use the cached model list
+
+    Returns:
+        Model ID to price; empty if no model list could be loaded
+    """
+    try:
+        registry = load_registry(state_dir / REGISTRY_PATH.name, max_age, offline)
+    except ValueError as e:
+        print("No OpenRouter price table:", e)
+        return {}
+    return {
+        model_id: ModelPrice(*(_to_price(prices.get(field)) for field in PRICE_FIELDS))
+        for model_id, prices in (registry or {}).items()
+    }
@@ -0,0 +1,102 @@
+import sqlite3
+from pathlib import Path
+from typing import Iterable
+
+
+class ProcessedIndex:
+    """
+    Persistent index of which (image, model) pairs already have results.
+
+    Pairs are stored in a small SQLite table and mirrored in memory, so
+    membership checks are O(1) dictionary lookups that never touch the
+    per-image result files. Images are identified by their result key: the
+    result file path relative to the benchmarks root.
+
+    The index is only complete once it has been built from the results tree
+    (see replace_all); until then, e.g. after a build was interrupted,
+    is_built is False.
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Args:
+            db_path: SQLite file backing the index (created if missing)
+        """
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            "result_key TEXT NOT NULL, model_id TEXT NOT NULL, "
+            "PRIMARY KEY (result_key, model_id))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        self.is_built = self._conn.execute("SELECT 1 FROM meta WHERE key = 'built'").fetchone() is not None
+        self._pairs: dict[str, set[str]] = {}
+        for result_key, model_id in self._conn.execute("SELECT result_key, model_id FROM processed"):
+            self._pairs.setdefault(result_key, set()).add(model_id)
+
+    def is_processed(self, result_key: str, model_id: str) -> bool:
+        """
+        Check whether a model already has a result for an image.
+        """
+        return model_id in self._pairs.get(result_key, ())
+
+    def is_processed_by_any(self, result_key: str) -> bool:
+        """
+        Check whether any model has a result for an image.
+        """
+        return bool(self._pairs.get(result_key))
+
+    def models_for(self, result_key: str) -> set[str]:
+        """
+        Get the models that already have a result for an image.
+        """
+        return set(self._pairs.get(result_key, ()))
+
+    def add(self, pairs: Iterable[tuple[str, str]]) -> None:
+        """
+        Record (result_key, model_id) pairs as processed.
+        """
+        new_pairs = [
+            (result_key, model_id) for result_key, model_id in pairs
+            if not self.is_processed(result_key, model_id)
+        ]
+        if not new_pairs:
+            return
+
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO processed (result_key, model_id) VALUES (?, ?)", new_pairs
+        )
+        self._conn.commit()
+        for result_key, model_id in new_pairs:
+            self._pairs.setdefault(result_key, set()).add(model_id)
+
+    def replace_all(self, pairs: Iterable[tuple[str, str]]) -> None:
+        """
+        Replace the whole index, e.g. after rebuilding it from the results tree.
+
+        The index is marked as built in the same transaction, so a build that
+        does not finish leaves it unbuilt.
+        """
+        pairs = list(pairs)
+        with self._conn:
+            self._conn.execute("DELETE FROM processed")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO processed (result_key, model_id) VALUES (?, ?)", pairs
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', '1')")
+        self._pairs = {}
+        for result_key, model_id in pairs:
+            self._pairs.setdefault(result_key, set()).add(model_id)
+        self.is_built = True
+
+    def __len__(self) -> int:
+        return sum(len(models) for models in self._pairs.values())
+
+    def close(self) -> None:
+        self._conn.close()
@@ -26,4 +26,12 @@ SYSTEM_MESSAGE = """
             
         DO NOT RETURN DUPLICATES.
             
-    """
\ No newline at end of file
+    """
+
+BATCH_MESSAGE = """
+        You will receive {count} images, each showing a single line of text. Transcribe every image following the rules above, in the order the images were given.
+        Output exactly {count} lines, one per image, each prefixed with the image number and a colon, for example:
+        1: first line transcription
+        2: second line transcription
+        Output nothing else.
+    """
@@ -0,0 +1,73 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from benchmark.metrics import score_batch
+from benchmark.results_manager import list_result_files, read_results, record_result_updates, write_results
+
+
+# Per-image fields derived from the stored response and ground truth
+SCORE_FIELDS = ("wer", "cer", "accuracy", "diffs", "matches", "deletions", "insertions")
+
+
+def rescore_file(result_path: Path) -> list[tuple[str, dict[str, Any], dict[str, Any]]]:
+    """
+    Score every model entry of a per-image result file again and save the changes.
+
+    Only the metrics are recomputed, from the response and ground truth already
+    stored; timings, usage and cost are kept as recorded.
+
+    Args:
+        result_path: Per-image JSON file
+
+    Returns:
+        (model_id, new_entry, previous_entry) triples for the entries whose
+        metrics changed, as expected by record_result_updates
+    """
+    data = read_results(result_path)
+
+    entries = {
+        model_id: entry for model_id, entry in data.items()
+        if isinstance(entry, dict) and "gt" in entry and "response" in entry
+    }
+    scores = score_batch((entry["response"], entry["gt"]) for entry in entries.values())
+
+    updates = []
+    for (model_id, entry), scores in zip(entries.items(), scores):
+        # Compare as stored: diffs are saved as lists, not tuples
+        rescored = {**entry, **json.loads(json.dumps({field: scores[field] for field in SCORE_FIELDS}))}
+        if rescored != entry:
+            data[model_id] = rescored
+            updates.append((model_id, rescored, entry))
+
+    if updates:
+        write_results(result_path, data)
+    return updates
+
+
+def rescore_folder(
+    benchmark_dir: Path,
+    benchmarks_root: Path = Path("benchmarks"),
+    executor: ProcessPoolExecutor | None = None,
+) -> int:
+    """
+    Score every result of a benchmark folder again, e.g. after a metric changed.
+
+    The folder's running aggregates are updated with the changed entries only;
+    its summary is left to update_folder_summary.
+
+    Args:
+        benchmark_dir: Path to the benchmark folder
+        benchmarks_root: Root directory for all benchmarks
+        executor: Process pool to score the files in (default: this process)
+
+    Returns:
+        Number of model entries whose metrics changed
+    """
+    result_files = list_result_files(benchmark_dir)
+    per_file = executor.map(rescore_file, result_files) if executor else map(rescore_file, result_files)
+    updates = [update for file_updates in per_file for update in file_updates]
+    if updates:
+        record_result_updates(benchmark_dir, updates, benchmarks_root)
+    return len(updates)
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any
+
+
+RESPONSE_CACHE_FILENAME = "responses.sqlite"
+
+# Model attributes that change what a model answers for the same image and prompt
+GENERATION_PARAMS = ("model_name", "temperature", "top_p", "max_tokens", "seed", "reasoning_effort", "model_kwargs")
+
+
+class ResponseCacheMiss(LookupError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_generation_params(llm: Any) -> dict[str, Any]:
+    """
+    Get the generation parameters of a chat model that are part of a cache key.
+
+    Args:
+        llm: ChatOpenAI instance (or anything exposing the same attributes)
+
+    Returns:
+        Parameter name to value, for the parameters the model defines
+    """
+    return {name: getattr(llm, name) for name in GENERATION_PARAMS if getattr(llm, name, None) is not None}
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of model responses, addressed by request content.
+
+    A response is stored with the token usage the provider reported for it, so
+    results served from the cache keep their token counts and cost. It is keyed
+    on the model id, the SHA-256 of the image bytes, the
+    hash of the prompt and the generation parameters, so any change to one of
+    them is a miss. Entries are evicted least recently used first once the
+    stored responses exceed `max_bytes`. In replay mode the cache is read-only
+    and a miss raises ResponseCacheMiss instead of calling the model, which
+    makes whole-pipeline reruns possible without network access.
+    """
+
+    def __init__(self, db_path: Path, max_bytes: int = 1024 * 1024 * 1024, replay: bool = False):
+        """
+        Args:
+            db_path: SQLite file backing the cache (created if missing)
+            max_bytes: Size bound of the stored responses
+            replay: Serve cached responses only, never store new ones
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                elapsed REAL NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                usage TEXT
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        if "usage" not in columns:
+            # Caches written before usage was stored: their entries have none
+            self._conn.execute("ALTER TABLE responses ADD COLUMN usage TEXT")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_id: str, image_sha: str, prompt: str, params: dict[str, Any]) -> str:
+        """
+        Build the cache key of a request.
+
+        Args:
+            model_id: Model the request goes to
+            image_sha: SHA-256 of the image bytes
+            prompt: Prompt sent with the image
+            params: Generation parameters (see get_generation_params)
+
+        Returns:
+            Hex digest identifying the request
+        """
+        material = json.dumps(
+            {"model_id": model_id, "image": image_sha, "prompt": hash_text(prompt), "params": params},
+            sort_keys=True,
+            default=str,
+        )
+        return hash_text(material)
+
+    def get(self, key: str) -> tuple[str, float, dict[str, Any] | None] | None:
+        """
+        Look up a response and mark it as recently used.
+
+        Args:
+            key: Request key (see make_key)
+
+        Returns:
+            The cached response content, the latency of the original request and
+            its token usage (None if unknown), or None on a miss
+        """
+        row = self._conn.execute(
+            "SELECT content, elapsed, usage FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if not self.replay:
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return row[0], row[1], json.loads(row[2]) if row[2] is not None else None
+
+    def put(
+        self, key: str, model_id: str, content: str, elapsed: float, usage: dict[str, Any] | None = None
+    ) -> None:
+        """
+        Store a response, evicting the least recently used ones past the size bound.
+
+        Args:
+            key: Request key (see make_key)
+            model_id: Model that produced the response
+            content: Response content
+            elapsed: Latency of the request in seconds
+            usage: Token usage reported by the provider, if any
+        """
+        if self.replay:
+            return
+
+        size = len(content.encode("utf-8"))
+        with self._conn:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model_id, content, elapsed, size, last_used, usage) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, model_id, content, elapsed, size, time.time(),
+                    json.dumps(usage, default=str) if usage is not None else None,
+                ),
+            )
+            self._size += size - (previous[0] if previous else 0)
+
+            while self._size > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_used LIMIT 64"
+                ).fetchall()
+                if not oldest:
+                    break
+                for old_key, old_size in oldest:
+                    if self._size <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    self._size -= old_size
+                    self.evictions += 1
+
+    def report(self) -> dict[str, int]:
+        """
+        Get the cache counters for the run report.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stored_bytes": self._size,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,179 @@
+import json
+import re
+from collections import Counter
+from typing import Any
+
+
+# Version 1 files map model IDs straight to their entries. Version 2 stores
+# the ground truth once per image and the diffs as opcodes:
+#
+#     {"version": 2, "gt": "...", "models": {"<model_id>": {"response": "...", "ops": "=20-1+1=20", ...}}}
+#
+# An entry only keeps its own "gt" when it differs from the image's (null if
+# the entry had none). "ops" lists the diff's runs in order, each an opcode
+# ("=" equal, "-" deleted from the ground truth, "+" inserted by the model)
+# followed by its length in Unicode code points: equal and deleted runs are
+# read from the ground truth, equal and inserted runs from the response, each
+# continuing where the previous run stopped. Diffs that do not line up with
+# their texts are kept as lists under "diffs".
+RESULTS_FORMAT_VERSION = 2
+
+# Every compact file starts with this (see dump_results); version 1 files are indented
+COMPACT_PREFIX = b'{"version":'
+
+_OPCODES = {0: "=", -1: "-", 1: "+"}
+_OPERATIONS = {symbol: op for op, symbol in _OPCODES.items()}
+_OPCODE_RUN = re.compile(r"([=+-])(\d+)")
+
+
+def encode_diffs(diffs: list, reference: str, candidate: str) -> str | None:
+    """
+    Encode a diff of a response against its ground truth as opcodes.
+
+    Args:
+        diffs: (op, text) pairs, as produced by score
+        reference: Ground truth the diff was computed from
+        candidate: Response the diff was computed from
+
+    Returns:
+        The opcodes, or None if the diff does not reproduce both texts
+    """
+    parts = []
+    reference_pos = candidate_pos = 0
+    try:
+        for op, text in diffs:
+            length = len(text)
+            if op != 1:
+                if reference[reference_pos:reference_pos + length] != text:
+                    return None
+                reference_pos += length
+            if op != -1:
+                if candidate[candidate_pos:candidate_pos + length] != text:
+                    return None
+                candidate_pos += length
+            parts.append(f"{_OPCODES[op]}{length}")
+    except (KeyError, TypeError, ValueError):
+        return None
+    if reference_pos != len(reference) or candidate_pos != len(candidate):
+        return None
+    return "".join(parts)
+
+
+def decode_diffs(ops: str, reference: str, candidate: str) -> list[list]:
+    """
+    Rebuild the [op, text] pairs of a diff from its opcodes (see encode_diffs).
+    """
+    diffs = []
+    reference_pos = candidate_pos = 0
+    for symbol, length in _OPCODE_RUN.findall(ops):
+        length = int(length)
+        op = _OPERATIONS[symbol]
+        if op == 1:
+            text = candidate[candidate_pos:candidate_pos + length]
+            candidate_pos += length
+        else:
+            text = reference[reference_pos:reference_pos + length]
+            reference_pos += length
+            if op == 0:
+                candidate_pos += length
+        diffs.append([op, text])
+    return diffs
+
+
+def compact_results(data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Convert an image's results to the compact format (version 2).
+
+    Args:
+        data: Results keyed by model ID, as returned by expand_results
+
+    Returns:
+        The compact representation, with the most common ground truth stored once
+    """
+    ground_truths = Counter(
+        entry["gt"] for entry in data.values() if isinstance(entry, dict) and isinstance(entry.get("gt"), str)
+    )
+    ground_truth = ground_truths.most_common(1)[0][0] if ground_truths else None
+
+    models = {}
+    for model_id, entry in data.items():
+        if not isinstance(entry, dict):
+            models[model_id] = entry
+            continue
+        compact = {}
+        if "gt" not in entry:
+            compact["gt"] = None
+        reference, candidate = entry.get("gt"), entry.get("response")
+        for field, value in entry.items():
+            if field == "gt":
+                if value != ground_truth:
+                    compact["gt"] = value
+            elif field == "diffs":
+                ops = None
+                if isinstance(reference, str) and isinstance(candidate, str) and isinstance(value, (list, tuple)):
+                    ops = encode_diffs(value, reference, candidate)
+                if ops is None:
+                    compact["diffs"] = value
+                else:
+                    compact["ops"] = ops
+            else:
+                compact[field] = value
+        models[model_id] = compact
+
+    compact_data: dict[str, Any] = {"version": RESULTS_FORMAT_VERSION}
+    if ground_truth is not None:
+        compact_data["gt"] = ground_truth
+    compact_data["models"] = models
+    return compact_data
+
+
+def expand_results(raw: dict[str, Any], with_diffs: bool = True) -> dict[str, Any]:
+    """
+    Convert an image's results as stored, in any format version, to results keyed by model ID.
+
+    Every entry gets back its "gt" and its "diffs" as [op, text] lists, as
+    version 1 files store them.
+
+    Args:
+        raw: Parsed content of a per-image result file
+        with_diffs: Decode the diffs of compact files; readers that only need
+            the metrics can skip it (the entries then have no "diffs")
+
+    Returns:
+        Results keyed by model ID
+
+    Raises:
+        ValueError: If the file was written by a newer format version
+    """
+    version = raw.get("version")
+    if not isinstance(version, int) or not isinstance(raw.get("models"), dict):
+        # Version 1: model IDs straight to their entries
+        return raw
+    if version > RESULTS_FORMAT_VERSION:
+        raise ValueError(f"Result file format version {version} is newer than supported ({RESULTS_FORMAT_VERSION})")
+
+    ground_truth = raw.get("gt")
+    data = {}
+    for model_id, compact in raw["models"].items():
+        if not isinstance(compact, dict):
+            data[model_id] = compact
+            continue
+        reference = compact.get("gt", ground_truth)
+        entry = {} if reference is None else {"gt": reference}
+        for field, value in compact.items():
+            if field == "gt":
+                continue
+            if field == "ops":
+                if with_diffs:
+                    entry["diffs"] = decode_diffs(value, reference or "", compact.get("response") or "")
+            else:
+                entry[field] = value
+        data[model_id] = entry
+    return data
+
+
+def dump_results(data: dict[str, Any]) -> str:
+    """
+    Serialize an image's results in the compact format, minified.
+    """
+    return json.dumps(compact_results(data), ensure_ascii=False, separators=(",", ":"))
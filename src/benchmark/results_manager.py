@@ -1,8 +1,48 @@
 import json
+import os
+import shutil
 from datetime import datetime
 from pathlib import Path
 from typing import Any
 
+from benchmark import aggregates, scan_index
+from benchmark.processed_index import ProcessedIndex
+from benchmark.result_format import COMPACT_PREFIX, dump_results, expand_results
+
+
+# Bookkeeping (journal, indexes) lives in a hidden folder under the benchmarks root,
+# so it never shows up next to the per-image results the website downloads.
+STATE_DIRNAME = ".palladia"
+
+# Per-image fields that not every result has (payload size, latency breakdown,
+# token usage and cost, batching)
+OPTIONAL_RESULT_FIELDS = (
+    "payload_bytes",
+    "queue_wait",
+    "encode_time",
+    "ttft",
+    "generation_time",
+    "tokens_per_sec",
+    "prompt_tokens",
+    "completion_tokens",
+    "cost",
+    "batch_size",
+    "batch_ambiguous",
+)
+
+
+def get_state_dir(benchmarks_root: Path = Path("benchmarks")) -> Path:
+    """
+    Get the directory holding Palladia's internal bookkeeping for a benchmarks tree.
+    
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        
+    Returns:
+        Path to the state directory (not created)
+    """
+    return benchmarks_root / STATE_DIRNAME
+
 
 def get_benchmark_path(image_path: Path, benchmarks_root: Path = Path("benchmarks")) -> Path:
     """
@@ -49,16 +89,91 @@ def load_existing_results(image_path: Path, benchmarks_root: Path = Path("benchm
     result_path = benchmark_dir / result_filename
     
     if result_path.exists():
-        with open(result_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return read_results(result_path)
     
     return {}
 
 
-import json
-import shutil
-from pathlib import Path
-from typing import Any
+def read_results(result_path: Path, with_diffs: bool = True) -> dict[str, Any]:
+    """
+    Read an image's results file, in any format version.
+    
+    Args:
+        result_path: Per-image JSON file
+        with_diffs: Decode the diffs, for readers that need more than the metrics
+        
+    Returns:
+        Results keyed by model_id, each entry with its gt and diffs (see expand_results)
+    """
+    with open(result_path, "r", encoding="utf-8") as f:
+        return expand_results(json.load(f), with_diffs)
+
+
+def build_model_result(result: dict[str, Any]) -> dict[str, Any]:
+    """
+    Build the per-model entry stored in an image's JSON file from a raw run result.
+    
+    Args:
+        result: Result dictionary as returned by run_model_on_image
+        
+    Returns:
+        The model entry (gt, response, metrics, timing, diffs, payload size,
+        latency breakdown, token usage, cost and batch details)
+    """
+    diff_data = result.get("diff", {})
+    entry = {
+        "gt": result.get("ground_truth", ""),
+        "response": result.get("content", ""),
+        "wer": result.get("wer", 0.0),
+        "cer": result.get("cer", 0.0),
+        "accuracy": diff_data.get("accuracy", 0.0),
+        "time": result.get("time_sec", 0.0),
+        "diffs": diff_data.get("diffs", []),
+        "matches": diff_data.get("matches", 0),
+        "deletions": diff_data.get("deletions", 0),
+        "insertions": diff_data.get("insertions", 0),
+    }
+    for field in OPTIONAL_RESULT_FIELDS:
+        # Only stored when recorded, so older, cached and unbatched results keep their shape
+        if result.get(field) is not None:
+            entry[field] = result[field]
+    return entry
+
+
+def write_results(result_path: Path, data: dict[str, Any], compact: bool | None = None) -> None:
+    """
+    Atomically write an image's results file.
+    
+    The data is written to a temporary sibling first and then moved into place,
+    so readers (and the website) never observe a half-written file. Files are
+    written in the original format (version 1) until the website reads the
+    compact one (see compact_results); a file already compact stays compact, so
+    a tree rewritten by 'palladia migrate' is kept that way. Read either with
+    read_results.
+    
+    Args:
+        result_path: Destination JSON file
+        data: Results keyed by model_id
+        compact: Write the compact format (True) or the original one (False);
+            by default the format the file already has
+    """
+    if compact is None:
+        compact = _is_compact(result_path)
+    tmp_path = result_path.with_name(f".{result_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if compact:
+            f.write(dump_results(data))
+        else:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, result_path)
+
+
+def _is_compact(result_path: Path) -> bool:
+    try:
+        with open(result_path, "rb") as f:
+            return f.read(len(COMPACT_PREFIX)) == COMPACT_PREFIX
+    except FileNotFoundError:
+        return False
 
 
 def save_individual_result(
@@ -80,25 +195,13 @@ def save_individual_result(
     result_path = benchmark_dir / result_filename
 
     existing_data = load_existing_results(image_path, benchmarks_root)
-
-    diff_data = result.get("diff", {})
-    model_result = {
-        "gt": result.get("ground_truth", ""),
-        "response": result.get("content", ""),
-        "wer": result.get("wer", 0.0),
-        "cer": result.get("cer", 0.0),
-        "accuracy": diff_data.get("accuracy", 0.0),
-        "time": result.get("time_sec", 0.0),
-        "diffs": diff_data.get("diffs", []),
-        "matches": diff_data.get("matches", 0),
-        "deletions": diff_data.get("deletions", 0),
-        "insertions": diff_data.get("insertions", 0),
-    }
-
-    existing_data[model_id] = model_result
-
-    with open(result_path, "w", encoding="utf-8") as f:
-        json.dump(existing_data, f, indent=2, ensure_ascii=False)
+    previous_entry = existing_data.get(model_id)
+    existing_data[model_id] = build_model_result(result)
+    write_results(result_path, existing_data)
+    record_result_updates(
+        benchmark_dir, [(model_id, existing_data[model_id], previous_entry)], benchmarks_root
+    )
+    record_processed([(get_result_key(image_path), model_id)], benchmarks_root)
 
     image_dest = benchmark_dir / image_path.name
     if not image_dest.exists():
@@ -107,10 +210,81 @@ def save_individual_result(
     return result_path
 
 
+def get_result_key(image_path: Path) -> str:
+    """
+    Get the key identifying an image's results, independent of the benchmarks root.
+    
+    Example:
+        GT4HistOCR/corpus/EarlyModernLatin/1564-Thucydides-Valla/00082.bin.png
+        -> GT4HistOCR/corpus/EarlyModernLatin/1564-Thucydides-Valla/00082.bin.json
+    """
+    return (image_path.parent / get_result_filename(image_path)).as_posix()
+
+
+_processed_indexes: dict[Path, ProcessedIndex] = {}
+
+
+def _scan_processed_pairs(benchmarks_root: Path) -> list[tuple[str, str]]:
+    """
+    Read every result file in the tree and list its (result_key, model_id) pairs.
+    """
+    folders, _ = scan_index.refresh_scan_index(benchmarks_root, {})
+    pairs = []
+    for rel_dir, entry in folders.items():
+        if not rel_dir:
+            continue  # manifest.json lives at the root
+        for name in entry["files"]:
+            data = read_results(benchmarks_root / rel_dir / name, with_diffs=False)
+            pairs.extend(
+                (f"{rel_dir}/{name}", model_id) for model_id, result in data.items()
+                if isinstance(result, dict)
+            )
+    return pairs
+
+
+def get_processed_index(benchmarks_root: Path = Path("benchmarks"), rebuild: bool = False) -> ProcessedIndex:
+    """
+    Get the processed-pairs index of a benchmarks tree, shared within the process.
+    
+    The index is built from the results tree the first time it is needed (or
+    again if that build never finished) and kept up to date as results are
+    saved. Rebuild it after results were copied or edited by hand.
+    
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        rebuild: Rebuild the index by reading every result file in the tree
+        
+    Returns:
+        The processed-pairs index
+    """
+    key = benchmarks_root.resolve()
+    index = _processed_indexes.get(key)
+    if index is None:
+        index = ProcessedIndex(get_state_dir(benchmarks_root) / "processed.sqlite")
+        _processed_indexes[key] = index
+    
+    if rebuild or not index.is_built:
+        index.replace_all(_scan_processed_pairs(benchmarks_root))
+    return index
+
+
+def record_processed(pairs: list[tuple[str, str]], benchmarks_root: Path = Path("benchmarks")) -> None:
+    """
+    Record (result_key, model_id) pairs as processed in the index.
+    
+    Args:
+        pairs: Result keys (see get_result_key) and the models that produced them
+        benchmarks_root: Root directory for all benchmarks
+    """
+    get_processed_index(benchmarks_root).add(pairs)
+
+
 def is_image_processed_by_any_model(image_path: Path, benchmarks_root: Path = Path("benchmarks")) -> bool:
     """
     Check if an image has been processed by any model.
     
+    Answered from the processed-pairs index without opening the result file.
+    
     Args:
         image_path: Path to the image
         benchmarks_root: Root directory for all benchmarks
@@ -118,13 +292,110 @@ def is_image_processed_by_any_model(image_path: Path, benchmarks_root: Path = Pa
     Returns:
         True if the image has been processed by any model, False otherwise
     """
-    existing_data = load_existing_results(image_path, benchmarks_root)
-    return len(existing_data) > 0
+    return get_processed_index(benchmarks_root).is_processed_by_any(get_result_key(image_path))
+
+
+def list_result_files(benchmark_dir: Path) -> list[Path]:
+    """
+    List the individual per-image result files of a benchmark folder.
+    
+    Args:
+        benchmark_dir: Path to the benchmark folder
+        
+    Returns:
+        Sorted paths of the per-image JSON files (summary excluded)
+    """
+    return sorted(
+        json_file for json_file in benchmark_dir.glob("*.json")
+        if json_file.name != "_summary.json"
+    )
+
+
+def list_benchmark_folders(benchmarks_root: Path = Path("benchmarks")) -> list[Path]:
+    """
+    List every benchmark folder holding per-image results.
+    
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        
+    Returns:
+        Sorted folder paths under benchmarks_root (state directory excluded)
+    """
+    folders, _ = scan_index.refresh_scan_index(benchmarks_root, {})
+    return sorted(
+        benchmarks_root / rel_dir for rel_dir, entry in folders.items()
+        if rel_dir and entry["files"]  # manifest.json lives at the root
+    )
+
+
+def get_aggregates_path(benchmark_dir: Path, benchmarks_root: Path = Path("benchmarks")) -> Path:
+    """
+    Get the path of the running aggregates kept for a benchmark folder.
+    
+    Args:
+        benchmark_dir: Path to the benchmark folder
+        benchmarks_root: Root directory for all benchmarks
+        
+    Returns:
+        Path to the folder's aggregates file inside the state directory
+    """
+    relative_dir = benchmark_dir.resolve().relative_to(benchmarks_root.resolve())
+    return get_state_dir(benchmarks_root) / "aggregates" / relative_dir / "_aggregates.json"
 
 
-def update_folder_summary(benchmark_dir: Path) -> Path:
+def record_result_updates(
+    benchmark_dir: Path,
+    updates: list[tuple[str, dict[str, Any], dict[str, Any] | None]],
+    benchmarks_root: Path = Path("benchmarks"),
+) -> None:
     """
-    Update the folder-level summary file based on all individual JSON results in the folder.
+    Fold freshly saved results into a folder's running aggregates.
+    
+    Must be called after the per-image files have been written. If the folder has
+    no aggregates yet (e.g. results predating them), they are rebuilt from a full
+    rescan, which already includes the new results.
+    
+    Args:
+        benchmark_dir: Path to the benchmark folder the results were saved in
+        updates: (model_id, new_entry, previous_entry) triples; previous_entry is
+            the replaced entry for the same image, or None
+        benchmarks_root: Root directory for all benchmarks
+    """
+    aggregates_path = get_aggregates_path(benchmark_dir, benchmarks_root)
+    state = aggregates.load_aggregates(aggregates_path)
+    
+    if state is None:
+        state = aggregates.scan_aggregates(list_result_files(benchmark_dir))
+    else:
+        aggregates.apply_updates(state, updates)
+    
+    aggregates.save_aggregates(aggregates_path, state)
+
+
+def load_model_totals(benchmarks_root: Path = Path("benchmarks")) -> dict[str, Any]:
+    """
+    Merge the running aggregates of every benchmark folder.
+    
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        
+    Returns:
+        Aggregates state covering all results in the tree (see aggregates.summarize)
+    """
+    states = (
+        aggregates.load_aggregates(path)
+        for path in (get_state_dir(benchmarks_root) / "aggregates").rglob("_aggregates.json")
+    )
+    return aggregates.merge_aggregates(state for state in states if state is not None)
+
+
+def update_folder_summary(
+    benchmark_dir: Path,
+    benchmarks_root: Path = Path("benchmarks"),
+    rebuild: bool = False,
+) -> Path:
+    """
+    Write the folder-level summary file from the folder's running aggregates.
     
     The summary contains per-model aggregated statistics:
     - source: the folder path
@@ -133,9 +404,21 @@ def update_folder_summary(benchmark_dir: Path) -> Path:
     - avg_cer: average character error rate (as percentage)
     - avg_accuracy: average accuracy (as percentage)
     - avg_time: average processing time in seconds
+    - avg_payload_bytes, avg_queue_wait, avg_encode_time, avg_ttft,
+      avg_generation_time, avg_tokens_per_sec, avg_prompt_tokens,
+      avg_completion_tokens, avg_cost: averages over the results that
+      recorded them (avg_cost is the cost per image in USD)
+    - total_cost, accuracy_per_dollar: for models with recorded costs
+    - p50_time, p95_time, p99_time (and the same for ttft, wer and cer):
+      percentiles estimated within 1% from the aggregates' quantile sketches
+    
+    Writing the summary costs O(models). The individual result files are only
+    read when the aggregates are missing or a rebuild is requested.
     
     Args:
         benchmark_dir: Path to the benchmark folder containing individual result JSONs
+        benchmarks_root: Root directory for all benchmarks
+        rebuild: Recompute the aggregates from a full rescan of the folder
         
     Returns:
         Path to the saved summary file
@@ -143,52 +426,15 @@ def update_folder_summary(benchmark_dir: Path) -> Path:
     summary_filename = "_summary.json"
     summary_path = benchmark_dir / summary_filename
     
-    model_stats: dict[str, dict[str, float]] = {}
+    aggregates_path = get_aggregates_path(benchmark_dir, benchmarks_root)
+    state = None if rebuild else aggregates.load_aggregates(aggregates_path)
     
-    for json_file in benchmark_dir.glob("*.json"):
-        if json_file.name == "_summary.json":
-            continue
-            
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            
-            for model_id, result in data.items():
-                if not isinstance(result, dict):
-                    continue
-                    
-                if model_id not in model_stats:
-                    model_stats[model_id] = {
-                        "wer_sum": 0.0,
-                        "cer_sum": 0.0,
-                        "accuracy_sum": 0.0,
-                        "time_sum": 0.0,
-                        "count": 0,
-                    }
-                
-                if "wer" in result and result["wer"] is not None:
-                    model_stats[model_id]["wer_sum"] += result["wer"]
-                if "cer" in result and result["cer"] is not None:
-                    model_stats[model_id]["cer_sum"] += result["cer"]
-                if "accuracy" in result and result["accuracy"] is not None:
-                    model_stats[model_id]["accuracy_sum"] += result["accuracy"]
-                if "time" in result and result["time"] is not None:
-                    model_stats[model_id]["time_sum"] += result["time"]
-                model_stats[model_id]["count"] += 1
-    
-    summary: dict[str, Any] = {}
-    source_path = str(benchmark_dir).replace("benchmarks/", "")
+    if state is None:
+        state = aggregates.scan_aggregates(list_result_files(benchmark_dir))
+        aggregates.save_aggregates(aggregates_path, state)
     
-    for model_id, stats in model_stats.items():
-        count = stats["count"]
-        if count > 0:
-            summary[model_id] = {
-                "source": source_path,
-                "images": count,
-                "avg_wer": round(stats["wer_sum"] / count * 100, 15),
-                "avg_cer": round(stats["cer_sum"] / count * 100, 15),
-                "avg_accuracy": round(stats["accuracy_sum"] / count * 100, 15),
-                "avg_time": round(stats["time_sum"] / count, 15),
-            }
+    source_path = str(benchmark_dir).replace("benchmarks/", "")
+    summary = aggregates.summarize(state, source_path)
     
     with open(summary_path, "w", encoding="utf-8") as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
@@ -196,10 +442,31 @@ def update_folder_summary(benchmark_dir: Path) -> Path:
     return summary_path
 
 
+def verify_folder_summary(benchmark_dir: Path, benchmarks_root: Path = Path("benchmarks")) -> list[str]:
+    """
+    Check a folder's running aggregates against a full rescan of its result files.
+    
+    Args:
+        benchmark_dir: Path to the benchmark folder
+        benchmarks_root: Root directory for all benchmarks
+        
+    Returns:
+        Descriptions of every mismatch; empty if the aggregates are accurate
+    """
+    state = aggregates.load_aggregates(get_aggregates_path(benchmark_dir, benchmarks_root))
+    if state is None:
+        return ["aggregates missing"]
+    
+    expected = aggregates.scan_aggregates(list_result_files(benchmark_dir))
+    return aggregates.compare_aggregates(expected, state)
+
+
 def should_skip_image(image_path: Path, model_id: str, benchmarks_root: Path = Path("benchmarks")) -> bool:
     """
     Check if an image should be skipped because it was already processed by this model.
     
+    Answered from the processed-pairs index without opening the result file.
+    
     Args:
         image_path: Path to the image
         model_id: The model ID to check
@@ -208,11 +475,27 @@ def should_skip_image(image_path: Path, model_id: str, benchmarks_root: Path = P
     Returns:
         True if the image was already processed by this model, False otherwise
     """
-    existing_data = load_existing_results(image_path, benchmarks_root)
-    return model_id in existing_data
+    return get_processed_index(benchmarks_root).is_processed(get_result_key(image_path), model_id)
+
+
+def get_scan_index_path(benchmarks_root: Path = Path("benchmarks")) -> Path:
+    """
+    Get the path of the persistent scan index used for manifest generation.
+    
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        
+    Returns:
+        Path to the scan index file inside the state directory
+    """
+    return get_state_dir(benchmarks_root) / "scan_index.json"
 
 
-def generate_manifest(benchmarks_root: Path = Path("benchmarks")) -> Path:
+def generate_manifest(
+    benchmarks_root: Path = Path("benchmarks"),
+    subtree: Path | None = None,
+    rescan: bool = False,
+) -> Path:
     """
     Generate a manifest.json file containing the overall structure of benchmarked data.
     
@@ -221,21 +504,57 @@ def generate_manifest(benchmarks_root: Path = Path("benchmarks")) -> Path:
     - generated: ISO timestamp of when the manifest was created
     - structure: Hierarchical structure of all benchmark folders with their summaries
       and individual result files
+    - models: Per-model statistics over every folder in the structure (accuracy,
+      cost per image, tokens per second, accuracy per dollar, latency and
+      error rate percentiles...), merged from the folders' running aggregates
+    - rollups: The same statistics for every folder above the benchmark
+      folders (e.g. GT4HistOCR/corpus/Kallimachos), keyed by its path
+    
+    Rollups are merged up the folder hierarchy from the folders' aggregates,
+    quantile sketches included, so no individual result is read. Only
+    folders whose aggregates cannot be loaded (missing, unreadable or written
+    with another AGGREGATES_VERSION) are rescanned. Aggregates that fell out
+    of step with the result files, e.g. after a hand edit, are not detected
+    here: `palladia summarize --verify` / `--rebuild` handle those.
+    
+    Folder listings are cached in a persistent scan index, so only folders that
+    changed since the last generation are listed again. With `subtree`, only that
+    part of the tree is checked for changes and the rest comes from the index.
     
     Args:
         benchmarks_root: Root directory for all benchmarks
+        subtree: Corpus path to refresh (e.g. GT4HistOCR/corpus/EarlyModernLatin),
+            relative to benchmarks_root; None refreshes the whole tree
+        rescan: Ignore the scan index and list every folder again
         
     Returns:
         Path to the saved manifest file
     """
     manifest_path = benchmarks_root / "manifest.json"
+    index_path = get_scan_index_path(benchmarks_root)
+    
+    start = subtree.as_posix().strip("/") if subtree is not None else ""
+    if start == ".":
+        start = ""
+    
+    folders = scan_index.load_scan_index(index_path)
+    if start and not folders:
+        # Without an index there is nothing to reuse for the rest of the tree
+        start = ""
+    folders, changed = scan_index.refresh_scan_index(benchmarks_root, folders, start, rescan)
+    if changed:
+        scan_index.save_scan_index(index_path, folders)
     
     structure: dict[str, Any] = {}
+    folder_aggregates = {}
+    aggregates_root = get_state_dir(benchmarks_root) / "aggregates"
     
-    for summary_file in benchmarks_root.rglob("_summary.json"):
-        rel_path = summary_file.relative_to(benchmarks_root)
+    for rel_dir in sorted(folders):
+        entry = folders[rel_dir]
+        if not entry["has_summary"]:
+            continue
         
-        parts = list(rel_path.parent.parts)
+        parts = rel_dir.split("/") if rel_dir else []
         
         if len(parts) < 2:
             continue
@@ -260,25 +579,32 @@ def generate_manifest(benchmarks_root: Path = Path("benchmarks")) -> Path:
         
         doc_folder = relevant_parts[-1]
         
-        benchmark_dir = summary_file.parent
-        
-        individual_files = []
-        for json_file in sorted(benchmark_dir.glob("*.json")):
-            if json_file.name == "_summary.json":
-                continue
-            rel_json_path = json_file.relative_to(benchmarks_root)
-            individual_files.append(str(rel_json_path))
+        individual_files = [f"{rel_dir}/{name}" for name in entry["files"]]
         
         current[doc_folder] = {
-            "aggregated": str(rel_path),
+            "aggregated": f"{rel_dir}/_summary.json",
             "individual_files": individual_files,
             "image_count": len(individual_files),
         }
+        
+        aggregates_path = aggregates_root / rel_dir / "_aggregates.json"
+        state = aggregates.load_aggregates(aggregates_path)
+        if state is None:
+            state = aggregates.scan_aggregates(benchmarks_root / rel_dir / name for name in entry["files"])
+            aggregates.save_aggregates(aggregates_path, state)
+        folder_aggregates[rel_dir] = state
     
+    rollups = aggregates.rollup_aggregates(folder_aggregates)
     manifest = {
         "description": "Auto-generated manifest of all available JSON files based on the available corpus structure",
         "generated": datetime.now().isoformat(),
         "structure": structure,
+        "models": aggregates.summarize(rollups.get("", aggregates.empty_aggregates()), None),
+        "rollups": {
+            rel_dir: aggregates.summarize(state, None)
+            for rel_dir, state in sorted(rollups.items())
+            if rel_dir and rel_dir not in folder_aggregates
+        },
     }
     
     with open(manifest_path, "w", encoding="utf-8") as f:
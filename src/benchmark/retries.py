@@ -0,0 +1,197 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+import openai
+
+from benchmark.concurrency import AdaptiveLimiter, get_retry_after, get_status_code
+
+
+T = TypeVar("T")
+
+# Statuses worth another attempt: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = {408, 409, 425, 429}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classify a failed model call as transient (worth retrying) or permanent.
+
+    Rate limits, server errors, timeouts and connection failures are transient;
+    client errors such as a bad request, bad credentials or an unknown model are not.
+
+    Args:
+        error: Exception raised by a model call
+
+    Returns:
+        True if the call should be retried
+    """
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError, openai.APIConnectionError, httpx.TransportError))
+
+
+class RequestPolicy:
+    """
+    Retry and hedging behaviour for one model's requests, with its counters.
+
+    Retries use exponential backoff with full jitter, stretched to honour a
+    Retry-After header. When hedging is enabled, a call still running after the
+    model's recent latency percentile gets a duplicate, and the first answer
+    wins; hedges are capped to a fraction of requests so they can't multiply spend.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        hedge_percentile: float | None = None,
+        hedge_budget: float = 0.05,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+    ):
+        """
+        Args:
+            max_attempts: Attempts per request, including the first one
+            base_delay: Backoff before the first retry, doubled on every attempt
+            max_delay: Upper bound of a single backoff
+            hedge_percentile: Latency percentile (0-100) after which to hedge, None to disable
+            hedge_budget: Maximum hedges as a fraction of requests
+            hedge_min_samples: Latencies to observe before hedging starts
+            latency_window: Recent latencies the percentile is computed over
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.hedge_min_samples = hedge_min_samples
+
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        Get the delay before retrying after a failed attempt (0-based).
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = get_retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def hedge_delay(self) -> float | None:
+        """
+        Get how long to wait for a call before hedging it, or None if hedging is off
+        or there are not enough observed latencies yet.
+        """
+        if self.hedge_percentile is None or len(self.latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    def can_hedge(self) -> bool:
+        return self.hedges + 1 <= self.hedge_budget * self.requests
+
+    def report(self) -> dict[str, int]:
+        """
+        Get the policy's counters for the run report.
+        """
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+async def _timed(call: Callable[[], Awaitable[T]], limiter: AdaptiveLimiter) -> tuple[T, float]:
+    async with limiter.slot():
+        start = time.perf_counter()
+        result = await call()
+        return result, time.perf_counter() - start
+
+
+async def _first_success(tasks: list[asyncio.Task]) -> tuple[asyncio.Task, tuple]:
+    """
+    Wait for the first task to succeed, cancel the rest, and raise the last
+    error if they all fail.
+    """
+    pending = set(tasks)
+    error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task, task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _hedged(
+    call: Callable[[], Awaitable[T]],
+    limiter: AdaptiveLimiter,
+    policy: RequestPolicy,
+) -> tuple[T, float]:
+    policy.requests += 1
+    primary = asyncio.ensure_future(_timed(call, limiter))
+    tasks = [primary]
+    try:
+        delay = policy.hedge_delay()
+        if delay is not None:
+            await asyncio.wait(tasks, timeout=delay)
+            if not primary.done() and policy.can_hedge():
+                policy.hedges += 1
+                tasks.append(asyncio.ensure_future(_timed(call, limiter)))
+
+        winner, result = await _first_success(tasks)
+        if winner is not primary:
+            policy.hedge_wins += 1
+        policy.latencies.append(result[1])
+        return result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_policy(
+    call: Callable[[], Awaitable[T]],
+    limiter: AdaptiveLimiter,
+    policy: RequestPolicy,
+) -> tuple[T, float]:
+    """
+    Run a model call through the model's limiter, retrying transient failures
+    and hedging slow calls as the policy allows.
+
+    Args:
+        call: Coroutine function making one request
+        limiter: The model's adaptive concurrency limiter (every attempt and hedge takes a slot)
+        policy: The model's retry and hedging policy
+
+    Returns:
+        The call's result and the latency of the attempt that produced it, in seconds
+
+    Raises:
+        Exception: The last error, once it is permanent or attempts are exhausted
+    """
+    attempt = 0
+    while True:
+        try:
+            return await _hedged(call, limiter, policy)
+        except Exception as error:
+            attempt += 1
+            if attempt >= policy.max_attempts or not is_retryable(error):
+                raise
+            policy.retries += 1
+            await asyncio.sleep(policy.backoff(attempt - 1, error))
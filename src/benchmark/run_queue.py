@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+
+RUN_QUEUE_FILENAME = "run_queue.sqlite"
+
+# Seconds a worker holds a work item without renewing its lease
+LEASE_SECONDS = 300.0
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+
+class RunQueue:
+    """
+    Persistent plan of a run: every (model, image) work item with its status.
+
+    A run is planned once, up front, and its items are then leased by workers:
+    a lease hands an item to one worker until it expires, so items held by a
+    worker that died are handed out again once their lease runs out. Items are
+    marked done only after their results were sealed in the results journal,
+    so a run resumed after a crash redoes exactly the items without a durable
+    result.
+
+    The queue lives in a SQLite file (WAL mode), so several worker processes
+    on one machine can lease from the same run safely: leasing is a single
+    UPDATE, which SQLite serializes across processes.
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Args:
+            db_path: SQLite file backing the queue (created if missing)
+        """
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id TEXT PRIMARY KEY, created_at REAL NOT NULL, config TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS items ("
+            "run_id TEXT NOT NULL, model_id TEXT NOT NULL, image TEXT NOT NULL, "
+            "status TEXT NOT NULL, owner TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, PRIMARY KEY (run_id, model_id, image));"
+            "CREATE INDEX IF NOT EXISTS items_status ON items (run_id, model_id, status);"
+        )
+        self._conn.commit()
+
+    def create_run(self, config: str, items: Iterable[tuple[str, str]]) -> str:
+        """
+        Plan a new run.
+
+        Args:
+            config: The run's configuration (JSON), kept so the run can be resumed as planned
+            items: (model_id, image) pairs to process
+
+        Returns:
+            ID of the new run
+        """
+        run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, created_at, config) VALUES (?, ?, ?)", (run_id, time.time(), config)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (run_id, model_id, image, status) VALUES (?, ?, ?, ?)",
+                ((run_id, model_id, image, PENDING) for model_id, image in items),
+            )
+        return run_id
+
+    def get_config(self, run_id: str) -> str:
+        """
+        Get the configuration a run was planned with.
+
+        Raises:
+            ValueError: If there is no such run
+        """
+        row = self._conn.execute("SELECT config FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Unknown run: {run_id}")
+        return row[0]
+
+    def lease(
+        self,
+        run_id: str,
+        model_id: str,
+        owner: str,
+        limit: int,
+        lease_seconds: float = LEASE_SECONDS,
+    ) -> list[str]:
+        """
+        Lease pending items of a model, and items whose lease expired.
+
+        Args:
+            run_id: Run to lease from
+            model_id: Model whose items to lease
+            owner: ID of the leasing worker
+            limit: Most items to lease
+            lease_seconds: Seconds until the lease expires unless renewed
+
+        Returns:
+            Images of the leased items, in planning order
+        """
+        now = time.time()
+        with self._conn:
+            rows = self._conn.execute(
+                "UPDATE items SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE rowid IN (SELECT rowid FROM items WHERE run_id = ? AND model_id = ? "
+                "AND (status = ? OR (status = ? AND lease_expires < ?)) ORDER BY rowid LIMIT ?) "
+                "RETURNING rowid, image",
+                (LEASED, owner, now + lease_seconds, run_id, model_id, PENDING, LEASED, now, limit),
+            ).fetchall()
+        return [image for _, image in sorted(rows)]
+
+    def leased_by_others(self, run_id: str, model_id: str, owner: str) -> int:
+        """
+        Count a model's items currently leased by other workers (expired leases excluded).
+        """
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM items WHERE run_id = ? AND model_id = ? AND status = ? "
+            "AND owner != ? AND lease_expires >= ?",
+            (run_id, model_id, LEASED, owner, time.time()),
+        ).fetchone()[0]
+
+    def renew(self, run_id: str, owner: str, lease_seconds: float = LEASE_SECONDS) -> None:
+        """
+        Extend every lease a worker holds in a run.
+        """
+        with self._conn:
+            self._conn.execute(
+                "UPDATE items SET lease_expires = ? WHERE run_id = ? AND owner = ? AND status = ?",
+                (time.time() + lease_seconds, run_id, owner, LEASED),
+            )
+
+    def complete(self, run_id: str, items: Iterable[tuple[str, str]]) -> None:
+        """
+        Mark (model_id, image) items as done.
+        """
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE items SET status = ?, owner = NULL, lease_expires = NULL, error = NULL "
+                "WHERE run_id = ? AND model_id = ? AND image = ?",
+                ((DONE, run_id, model_id, image) for model_id, image in items),
+            )
+
+    def fail(self, run_id: str, items: Iterable[tuple[str, str]], error: str) -> None:
+        """
+        Mark (model_id, image) items as failed, with the error that stopped them.
+        """
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE items SET status = ?, owner = NULL, lease_expires = NULL, error = ? "
+                "WHERE run_id = ? AND model_id = ? AND image = ? AND status != ?",
+                ((FAILED, error, run_id, model_id, image, DONE) for model_id, image in items),
+            )
+
+    def release(self, run_id: str, owner: str) -> None:
+        """
+        Give back the items a worker still holds, e.g. when it is interrupted.
+        """
+        with self._conn:
+            self._conn.execute(
+                "UPDATE items SET status = ?, owner = NULL, lease_expires = NULL "
+                "WHERE run_id = ? AND owner = ? AND status = ?",
+                (PENDING, run_id, owner, LEASED),
+            )
+
+    def retry_failed(self, run_id: str) -> int:
+        """
+        Put a run's failed items back in the queue.
+
+        Returns:
+            Number of items requeued
+        """
+        with self._conn:
+            return self._conn.execute(
+                "UPDATE items SET status = ?, error = NULL WHERE run_id = ? AND status = ?",
+                (PENDING, run_id, FAILED),
+            ).rowcount
+
+    def progress(self, run_id: str) -> dict[str, int]:
+        """
+        Count a run's items by status.
+        """
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        for status, count in self._conn.execute(
+            "SELECT status, COUNT(*) FROM items WHERE run_id = ? GROUP BY status", (run_id,)
+        ):
+            counts[status] = count
+        return counts
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def new_worker_id() -> str:
+    """
+    Get a unique ID for a worker leasing from the queue.
+    """
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
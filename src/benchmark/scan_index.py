@@ -0,0 +1,137 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+
+SCAN_INDEX_VERSION = 1
+
+# Directory mtimes this close to the scan time are not trusted: a file created
+# within the same timestamp tick would not change the recorded value.
+MTIME_SAFETY_NS = 2_000_000_000
+
+
+def load_scan_index(path: Path) -> dict[str, Any]:
+    """
+    Load the persistent scan index of a benchmarks tree.
+
+    Args:
+        path: Index file
+
+    Returns:
+        Mapping of folder path (relative to the benchmarks root, "" for the root)
+        to its cached listing; empty if the index is missing or outdated
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if index.get("version") != SCAN_INDEX_VERSION:
+        return {}
+    return index["folders"]
+
+
+def save_scan_index(path: Path, folders: dict[str, Any]) -> None:
+    """
+    Save the persistent scan index of a benchmarks tree.
+
+    Args:
+        path: Index file
+        folders: Folder listings as returned by refresh_scan_index
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"version": SCAN_INDEX_VERSION, "folders": folders}, ensure_ascii=False))
+    tmp_path.replace(path)
+
+
+def _list_folder(folder: Path) -> dict[str, Any]:
+    """
+    List a folder's subfolders and per-image result files.
+    """
+    subdirs = []
+    files = []
+    has_summary = False
+
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.name == "_summary.json":
+                has_summary = True
+            elif entry.name.endswith(".json"):
+                files.append(entry.name)
+
+    return {
+        "subdirs": sorted(subdirs),
+        "files": sorted(files),
+        "has_summary": has_summary,
+    }
+
+
+def refresh_scan_index(
+    benchmarks_root: Path,
+    folders: dict[str, Any],
+    start: str = "",
+    rescan: bool = False,
+) -> tuple[dict[str, Any], int]:
+    """
+    Bring the scan index up to date for the subtree under `start`.
+
+    Every folder in the subtree is stat'ed, but only folders whose mtime changed
+    since the last scan are listed again. Adding, removing or renaming a file or
+    subfolder always bumps the parent folder's mtime, so unchanged folders can
+    reuse their cached listing. Index entries outside the subtree are kept as is.
+
+    Args:
+        benchmarks_root: Root directory for all benchmarks
+        folders: Current index, as returned by load_scan_index
+        start: Subtree to refresh, relative to the benchmarks root ("" for all)
+        rescan: Ignore cached listings and list every folder again
+
+    Returns:
+        The refreshed index and the number of folders that had to be listed or
+        dropped (0 means the index is unchanged)
+    """
+    prefix = f"{start}/" if start else ""
+    refreshed = {
+        rel: entry for rel, entry in folders.items()
+        if start and rel != start and not rel.startswith(prefix)
+    }
+    listed = 0
+    now_ns = time.time_ns()
+
+    stack = [start]
+    while stack:
+        rel = stack.pop()
+        folder = benchmarks_root / rel if rel else benchmarks_root
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            continue
+
+        cached = folders.get(rel)
+        if not rescan and cached is not None and cached["mtime_ns"] == mtime_ns:
+            entry = cached
+        else:
+            entry = _list_folder(folder)
+            listed += 1
+            # Leave recently modified folders unmatched so the next scan lists them again
+            entry["mtime_ns"] = mtime_ns if now_ns - mtime_ns > MTIME_SAFETY_NS else None
+
+        refreshed[rel] = entry
+        stack.extend(f"{_child_prefix(rel)}{name}" for name in entry["subdirs"])
+
+    return refreshed, listed + len(folders.keys() - refreshed.keys())
+
+
+def _child_prefix(rel: str) -> str:
+    """
+    Get the prefix to join child names onto a relative folder path.
+    """
+    return f"{rel}/" if rel else ""
@@ -0,0 +1,44 @@
+import hashlib
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Parse a shard given as "i/N", the i-th of N shards (1 <= i <= N).
+
+    Args:
+        value: Shard specification, e.g. "2/4"
+
+    Returns:
+        (index, count) of the shard
+
+    Raises:
+        ValueError: If the specification is malformed or out of range
+    """
+    index, sep, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Shard must be given as i/N, got {value!r}")
+    if not sep or count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard must be given as i/N with 1 <= i <= N, got {value!r}")
+    return index, count
+
+
+def get_shard(model_id: str, result_key: str, count: int) -> int:
+    """
+    Get the shard a (model, image) work item belongs to.
+
+    The shard only depends on the model and the image's result key, hashed
+    with a stable hash (unlike Python's salted hash()), so every machine
+    splits the same work set the same way.
+
+    Args:
+        model_id: Model the item is for (its result ID)
+        result_key: Image's result key (see get_result_key)
+        count: Number of shards
+
+    Returns:
+        Shard index, from 1 to count
+    """
+    digest = hashlib.blake2b(f"{model_id}\0{result_key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
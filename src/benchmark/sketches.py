@@ -0,0 +1,100 @@
+import math
+from typing import Any
+
+
+# Relative accuracy of the quantiles: every value is counted in a logarithmic
+# bucket whose representative value is within 1% of it (DDSketch). Buckets
+# only depend on the value, so sketches merge by adding counts, and a value
+# added earlier can be removed again by subtracting it from its bucket.
+RELATIVE_ACCURACY = 0.01
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def empty_sketch() -> dict[str, Any]:
+    """
+    Create an empty quantile sketch.
+
+    Returns:
+        Sketch with a count of values <= 0 ("zeros") and counts per bucket
+        index ("bins", keyed by the index as a string so it survives JSON)
+    """
+    return {"zeros": 0, "bins": {}}
+
+
+def _bucket(value: float) -> str:
+    return str(math.ceil(math.log(value) / _LOG_GAMMA))
+
+
+def add_value(sketch: dict[str, Any], value: float, sign: int = 1) -> None:
+    """
+    Add (sign=1) or remove (sign=-1) one value from a sketch.
+
+    Args:
+        sketch: Sketch to update in place
+        value: Value to count; values <= 0 (e.g. a perfect CER) share one bucket
+        sign: 1 to add the value, -1 to remove a previously added one
+    """
+    if value <= 0:
+        sketch["zeros"] += sign
+        return
+    bins = sketch["bins"]
+    key = _bucket(value)
+    count = bins.get(key, 0) + sign
+    if count:
+        bins[key] = count
+    else:
+        del bins[key]
+
+
+def merge_sketch(sketch: dict[str, Any], other: dict[str, Any]) -> None:
+    """
+    Add every value counted in another sketch to a sketch.
+
+    Args:
+        sketch: Sketch to update in place
+        other: Sketch to add
+    """
+    sketch["zeros"] += other["zeros"]
+    bins = sketch["bins"]
+    for key, count in other["bins"].items():
+        total = bins.get(key, 0) + count
+        if total:
+            bins[key] = total
+        else:
+            bins.pop(key, None)
+
+
+def get_quantiles(sketch: dict[str, Any], quantiles: tuple[float, ...]) -> list[float | None]:
+    """
+    Estimate quantiles of the values counted in a sketch.
+
+    Args:
+        sketch: Sketch to read
+        quantiles: Quantiles between 0 and 1 (0.95 for the 95th percentile)
+
+    Returns:
+        One estimate per quantile, within RELATIVE_ACCURACY of a value at that
+        rank; None for every quantile if the sketch is empty
+    """
+    buckets = sorted((int(key), count) for key, count in sketch["bins"].items())
+    total = sketch["zeros"] + sum(count for _, count in buckets)
+    if total <= 0:
+        return [None] * len(quantiles)
+
+    estimates = []
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = sketch["zeros"]
+        if seen > rank:
+            estimates.append(0.0)
+            continue
+        index = buckets[-1][0]
+        for bucket, count in buckets:
+            seen += count
+            if seen > rank:
+                index = bucket
+                break
+        estimates.append(2 * _GAMMA ** index / (_GAMMA + 1))
+    return estimates
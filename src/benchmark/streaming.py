@@ -0,0 +1,52 @@
+import time
+from typing import Any, NamedTuple
+
+
+class Completion(NamedTuple):
+    text: str
+    started_at: float  # perf_counter() when the request was sent
+    ttft: float | None  # seconds to the first content chunk
+    generation_time: float | None  # seconds from the first to the last chunk
+    output_tokens: int | None
+    usage: dict[str, Any] | None  # usage metadata reported by the provider
+
+    @property
+    def tokens_per_sec(self) -> float | None:
+        """Output tokens per second of generation, if both are known."""
+        if not self.output_tokens or not self.generation_time:
+            return None
+        return self.output_tokens / self.generation_time
+
+
+async def stream_completion(llm: Any, messages: list) -> Completion:
+    """
+    Stream a chat completion, timing the first token and the generation.
+
+    Args:
+        llm: ChatOpenAI instance (created with stream_usage=True to get token counts)
+        messages: Messages to send
+
+    Returns:
+        The completed response with its timings and usage
+    """
+    started_at = time.perf_counter()
+    first_chunk_at = None
+    last_chunk_at = None
+    response = None
+
+    async for chunk in llm.astream(messages):
+        now = time.perf_counter()
+        if first_chunk_at is None and chunk.content:
+            first_chunk_at = now
+        last_chunk_at = now
+        response = chunk if response is None else response + chunk
+
+    usage = getattr(response, "usage_metadata", None) if response is not None else None
+    return Completion(
+        text=str(response.content) if response is not None else "",
+        started_at=started_at,
+        ttft=first_chunk_at - started_at if first_chunk_at is not None else None,
+        generation_time=last_chunk_at - first_chunk_at if first_chunk_at is not None else None,
+        output_tokens=usage.get("output_tokens") if usage else None,
+        usage=dict(usage) if usage else None,
+    )
@@ -0,0 +1,113 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+
+# Snapshot of the OpenRouter model list, kept in the benchmarks state folder
+REGISTRY_PATH = Path("benchmarks") / ".palladia" / "openrouter_models.json"
+REGISTRY_VERSION = 1
+
+# The model list changes rarely; refetch it at most once a day
+REGISTRY_MAX_AGE = 24 * 60 * 60
+
+PRICE_FIELDS = ("prompt", "completion", "image", "request")
+
+# Snapshots already loaded by this process, by path
+_loaded: dict[Path, dict[str, Any]] = {}
+
+# Stale snapshots this process could not refresh, used as they are from then on
+_refresh_failed: set[Path] = set()
+
+
+def fetch_registry(api_key: str) -> dict[str, dict[str, str | None]]:
+    """
+    Download the list of models available on OpenRouter.
+
+    Args:
+        api_key: OpenRouter API key
+
+    Returns:
+        Model ID to its prices (USD per token, image or request, as decimal strings)
+    """
+    # Imported here: the client is slow to import and only needed to refresh the snapshot
+    from openrouter import OpenRouter
+
+    with OpenRouter(api_key=api_key) as client:
+        models = client.models.list()
+    return {m.id: {field: getattr(m.pricing, field, None) for field in PRICE_FIELDS} for m in models.data}
+
+
+def _read_snapshot(path: Path) -> dict[str, Any] | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if snapshot.get("version") != REGISTRY_VERSION:
+        return None
+    return snapshot
+
+
+def _write_snapshot(path: Path, snapshot: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    tmp_path.replace(path)
+
+
+def load_registry(
+    path: Path | None = None,
+    max_age: float = REGISTRY_MAX_AGE,
+    offline: bool = False,
+) -> dict[str, dict[str, str | None]] | None:
+    """
+    Get a snapshot of the OpenRouter model list, downloading it at most once per process.
+
+    The snapshot is cached on disk and reused while it is younger than
+    `max_age`. A stale snapshot is downloaded again; if that fails, the stale
+    one is used rather than failing, for the rest of the process.
+
+    Args:
+        path: Snapshot file (default: REGISTRY_PATH)
+        max_age: Seconds after which the snapshot is downloaded again
+        offline: Never download, only use the snapshot on disk (whatever its age)
+
+    Returns:
+        Model ID to its prices, or None if there is no snapshot and it could
+        not (or may not) be downloaded
+
+    Raises:
+        ValueError: If the snapshot must be downloaded and OPENROUTER_API_KEY is not set
+    """
+    path = path or REGISTRY_PATH
+    snapshot = _loaded.get(path) or _read_snapshot(path)
+    fresh = snapshot is not None and time.time() - snapshot["fetched_at"] < max_age
+    if offline or fresh or (snapshot is not None and path in _refresh_failed):
+        if snapshot is not None:
+            _loaded[path] = snapshot
+        return snapshot["models"] if snapshot is not None else None
+
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        if snapshot is not None:
+            return snapshot["models"]
+        raise ValueError("OPENROUTER_API_KEY required")
+
+    try:
+        models = fetch_registry(api_key)
+    except Exception as e:
+        if snapshot is None:
+            raise ValueError(f"Could not download the OpenRouter model list: {e}")
+        print("Could not download the OpenRouter model list, using the cached one:", e)
+        # Don't wait out the download again for every model validated in this process
+        _loaded[path] = snapshot
+        _refresh_failed.add(path)
+        return snapshot["models"]
+
+    snapshot = {"version": REGISTRY_VERSION, "fetched_at": time.time(), "models": models}
+    _write_snapshot(path, snapshot)
+    _loaded[path] = snapshot
+    return models
@@ -1,54 +1,112 @@
-from pydantic import BaseModel, Field, field_validator
-from openrouter import OpenRouter
+from pydantic import BaseModel, Field, ValidationInfo, field_validator, model_validator
+from collections import Counter
 from pathlib import Path
-from typing import List
+from typing import List, Literal
 
 import yaml
-import os
+
+from config.registry import load_registry
 
 from dotenv import load_dotenv
-load_dotenv()
+
+class ConcurrencyConfig(BaseModel):
+    initial: int = Field(2, ge=1, description="Concurrent requests to start with")
+    min: int = Field(1, ge=1, description="Lowest concurrency the adaptive limit can back off to")
+    max: int = Field(16, ge=1, description="Highest concurrency the adaptive limit can grow to")
+
+
+class RateLimitConfig(BaseModel):
+    requests_per_second: float = Field(..., gt=0, description="Sustained request rate cap")
+    burst: int | None = Field(None, ge=1, description="Requests allowed in a burst (default: the rate)")
+
+
+class RetryConfig(BaseModel):
+    max_attempts: int = Field(4, ge=1, description="Attempts per request, including the first one")
+    base_delay: float = Field(0.5, ge=0, description="Backoff in seconds before the first retry, doubled each attempt")
+    max_delay: float = Field(30.0, ge=0, description="Upper bound of a single backoff in seconds")
+
+
+class HedgingConfig(BaseModel):
+    percentile: float = Field(95, gt=0, lt=100, description="Latency percentile after which a duplicate request is sent")
+    budget: float = Field(0.05, gt=0, le=1, description="Maximum hedged requests as a fraction of all requests")
+    min_samples: int = Field(20, ge=1, description="Latencies to observe before hedging starts")
+
+
+class PreprocessingConfig(BaseModel):
+    max_height: int | None = Field(None, gt=0, description="Downscale images to at most this height in pixels")
+    color: Literal["original", "grayscale", "binary"] = Field("original", description="Color reduction")
+    format: Literal["original", "png", "webp", "jpeg"] = Field("original", description="Re-encoding format")
+    quality: int = Field(85, ge=1, le=100, description="Encoder quality for webp and jpeg")
+
+
+class HttpConfig(BaseModel):
+    base_url: str = Field("https://openrouter.ai/api/v1", description="OpenAI-compatible API the models are called on")
+    max_connections: int | None = Field(
+        None, ge=1, description="Connection pool size (default: twice the models' total max concurrency, for hedges)"
+    )
+    max_keepalive_connections: int | None = Field(
+        None, ge=0, description="Idle connections kept open for reuse (default: max_connections)"
+    )
+    keepalive_expiry: float = Field(60.0, ge=0, description="Seconds an idle connection is kept open")
+    http2: bool = Field(True, description="Use HTTP/2 where the server supports it (needs the h2 package)")
+    connect_timeout: float = Field(10.0, gt=0, description="Seconds to establish a connection")
+    read_timeout: float = Field(120.0, gt=0, description="Seconds to wait for the next chunk of a response")
+    write_timeout: float = Field(30.0, gt=0, description="Seconds to send a request")
+    pool_timeout: float = Field(60.0, gt=0, description="Seconds to wait for a free connection from the pool")
+
 
 class Model(BaseModel):
     model_id: str = Field(..., description="Name of the model")
     enabled: bool = Field(..., description="Whether the model is enabled")
     link: str = Field(..., description="OpenRouter model page")
-    
-    @field_validator("model_id")
-    def validate_model(cls, v: str):
+    label: str | None = Field(
+        None,
+        description="Name results are stored under (default: model_id); set it to compare variants "
+        "of the same model, e.g. batched and unbatched",
+    )
+    batch_size: int = Field(1, ge=1, le=50, description="Line images sent per request")
+    concurrency: ConcurrencyConfig = Field(
+        default_factory=ConcurrencyConfig, description="Adaptive concurrency bounds for this model"
+    )
+    rate_limit: RateLimitConfig | None = Field(None, description="Optional token-bucket request rate cap")
+    retries: RetryConfig = Field(default_factory=RetryConfig, description="Retries of transient failures")
+    hedging: HedgingConfig | None = Field(None, description="Optional hedged requests for slow calls")
+    preprocessing: PreprocessingConfig | None = Field(
+        None, description="Optional image preprocessing before upload (original image if unset)"
+    )
+
+    @property
+    def result_id(self) -> str:
         """
-        Validate that the model exists on OpenRouter.
+        Get the name this model's results are stored under.
         
-        Args:
-            v: Model ID to validate
-            
         Returns:
-            Validated model ID
-            
-        Raises:
-            ValueError: If API key is missing or model doesn't exist on OpenRouter
+            The label if set, the model ID otherwise
         """
-        api_key = os.getenv("OPENROUTER_API_KEY")
-        if not api_key: 
-            raise ValueError("OPENROUTER_API_KEY required")
-        
-        try:
-            with OpenRouter(api_key=api_key) as client:
-                models = client.models.list()
-                model_ids = [m.id for m in models.data]
-                if v not in model_ids:
-                    raise ValueError(f"Model '{v}' does not exist on OpenRouter")
-            return v
-        except Exception as e:
-            if "does not exist" in str(e):
-                raise ValueError(f"Model '{v}' does not exist on OpenRouter")
-            raise ValueError(f"Validation failed: {e}")
+        return self.label or self.model_id
 
 
 class InputConfig(BaseModel):
     source: Path = Field(..., description="Source path of input images")
     images_to_process: int = Field(..., description="Number of images to benchmark")
     avoid_rescan: bool = Field(..., description="Avoid rescanning already processed images")
+    sampling: Literal["random", "per_book", "proportional"] = Field(
+        "random",
+        description="random: images_to_process from the source folder; per_book: images_to_process "
+        "from every book under the source; proportional: images_to_process in total, split by corpus size",
+    )
+    seed: int | None = Field(
+        None,
+        description="Seed of the image sampling; set it so repeated or sharded runs select the same images "
+        "(sharded runs draw from every image, processed or not, so the draw does not depend on local results)",
+    )
+    response_cache: Literal["disabled", "enabled", "replay"] = Field(
+        "disabled",
+        description="enabled: reuse and store model responses; replay: only serve cached responses, "
+        "never call the models",
+    )
+    response_cache_max_mb: int = Field(1024, gt=0, description="Size bound of the response cache in MB")
+    http: HttpConfig = Field(default_factory=HttpConfig, description="HTTP client shared by all models")
     models: List[Model] = Field(..., description="All configured models")
 
     @field_validator("source")
@@ -89,6 +147,60 @@ class InputConfig(BaseModel):
             raise ValueError("images_to_process must be > 0")
         return v
 
+    @field_validator("models")
+    @classmethod
+    def validate_result_ids(cls, v: List[Model]) -> List[Model]:
+        """
+        Validate that no two enabled models store their results under the same name.
+        
+        Args:
+            v: Configured models to validate
+            
+        Returns:
+            Validated models
+            
+        Raises:
+            ValueError: If enabled models share a result_id (set a label to tell
+                variants of the same model apart)
+        """
+        result_ids = Counter(m.result_id for m in v if m.enabled)
+        duplicates = [result_id for result_id, count in result_ids.items() if count > 1]
+        if duplicates:
+            raise ValueError(
+                f"Models store their results under the same name, set a label: {', '.join(duplicates)}"
+            )
+        return v
+
+    @model_validator(mode="after")
+    def validate_models(self, info: ValidationInfo) -> "InputConfig":
+        """
+        Validate that every configured model exists on OpenRouter.
+        
+        All models are checked against a single snapshot of the OpenRouter
+        model list, cached on disk (see load_registry). The validation mode is
+        passed in the validation context (see load_config).
+        
+        Returns:
+            Validated configuration
+            
+        Raises:
+            ValueError: If a model doesn't exist on OpenRouter, or the model list
+                is needed but can't be downloaded
+        """
+        mode = (info.context or {}).get("model_validation", "online")
+        if mode == "skip":
+            return self
+        
+        registry = load_registry(offline=mode == "offline")
+        if registry is None:
+            print("No cached OpenRouter model list, skipping model validation")
+            return self
+        
+        missing = [m.model_id for m in self.models if m.model_id not in registry]
+        if missing:
+            raise ValueError(f"Models do not exist on OpenRouter: {', '.join(missing)}")
+        return self
+
     @property
     def enabled_models(self) -> List[Model]:
         """
@@ -107,6 +219,11 @@ class CleanConfig(BaseModel):
     source: Path
     images_to_process: int
     avoid_rescan: bool
+    sampling: str
+    seed: int | None = None
+    response_cache: str
+    response_cache_max_mb: int
+    http: HttpConfig
     models: List[Model]
 
 
@@ -132,6 +249,11 @@ def clean_config(config: InputConfig) -> CleanConfig:
         source=config.source,
         images_to_process=config.images_to_process,
         avoid_rescan=config.avoid_rescan,
+        sampling=config.sampling,
+        seed=config.seed,
+        response_cache=config.response_cache,
+        response_cache_max_mb=config.response_cache_max_mb,
+        http=config.http,
         models=enabled_models,
     )
 
@@ -152,7 +274,8 @@ def _load_yaml(path: Path) -> dict:
 
 def load_config(
     images_config_path: Path = Path("src/config/images.yaml"), 
-    models_config_path: Path = Path("src/config/models.yaml")
+    models_config_path: Path = Path("src/config/models.yaml"),
+    model_validation: Literal["online", "offline", "skip"] = "online",
 ) -> CleanConfig:
     """
     Load and validate configuration from YAML files.
@@ -160,6 +283,9 @@ def load_config(
     Args:
         images_config_path: Path to images configuration YAML file
         models_config_path: Path to models configuration YAML file
+        model_validation: How model IDs are checked against OpenRouter: online
+            (cached model list, downloaded again once a day), offline (cached
+            model list only, never downloaded) or skip
         
     Returns:
         Clean and validated configuration object
@@ -167,6 +293,8 @@ def load_config(
     Raises:
         ValidationError: If configuration fails validation
     """
+    # OPENROUTER_API_KEY may come from a .env file
+    load_dotenv()
     images_cfg = _load_yaml(images_config_path)
     models_cfg = _load_yaml(models_config_path)
 
@@ -175,5 +303,5 @@ def load_config(
         **models_cfg,
     }
 
-    validated = InputConfig.model_validate(full_cfg)
+    validated = InputConfig.model_validate(full_cfg, context={"model_validation": model_validation})
     return clean_config(validated)
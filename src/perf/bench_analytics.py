@@ -0,0 +1,107 @@
+"""
+Benchmark the analytics store on a large synthetic benchmarks tree.
+
+Builds a tree of books (spread over corpora and years) whose image result
+files hold every model's entry, then times building the store from scratch,
+refreshing it with nothing changed and with one file rewritten, and a set of
+grouped queries and leaderboards, checking the grouped averages against a
+row-level computation.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_analytics.py --images 50000 --models 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark.analytics import AnalyticsStore
+from benchmark.results_manager import read_results, write_results
+
+
+def build_tree(root: Path, images: int, books: int, models: int) -> None:
+    """
+    Create a benchmarks tree where every image has one result per model.
+    """
+    rng = random.Random(0)
+    per_book = max(1, images // books)
+    model_ids = [f"provider/model-{m}" for m in range(models)]
+    for b in range(books):
+        folder = root / f"GT4HistOCR/corpus/Corpus{b % 10:02d}/{1450 + b % 400}-Book{b:04d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        for i in range(per_book):
+            gt = "lorem ipsum dolor sit amet"[:rng.randint(5, 26)]
+            data = {
+                model_id: {
+                    "gt": gt, "response": gt, "wer": rng.uniform(0, 100), "cer": rng.uniform(0, 40),
+                    "accuracy": rng.uniform(60, 100), "time": rng.uniform(0.5, 30), "cost": rng.uniform(0, 0.01),
+                }
+                for model_id in model_ids
+            }
+            write_results(folder / f"{i:05d}.bin.json", data)
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<50} {elapsed * 1000:10.1f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50_000, help="Total number of images")
+    parser.add_argument("--books", type=int, default=500)
+    parser.add_argument("--models", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "benchmarks"
+        print(f"Building a tree of {args.images} images x {args.models} models...")
+        build_tree(root, args.images, args.books, args.models)
+        # Let the folder mtimes age past the scan index's safety window, as in a tree at rest
+        time.sleep(2.5)
+
+        store = AnalyticsStore(Path(tmp) / "analytics.sqlite")
+        timed("build the store", lambda: store.refresh(root))
+        rows = store.query((), ("cer",))[0]["results"]
+        print(f"{rows} rows, {os.path.getsize(store.db_path) / 1e6:.0f} MB")
+        timed("refresh, nothing changed", lambda: store.refresh(root))
+        touched = next(root.rglob("00000.bin.json"))
+        data = read_results(touched)
+        data["provider/model-0"]["cer"] = 0.0
+        write_results(touched, data)
+        changed = timed("refresh, one file rewritten", lambda: store.refresh(root))
+        if changed != 1:
+            raise SystemExit(f"refresh read {changed} files again, expected 1")
+
+        queries = {
+            "CER by model": dict(group_by=["model"], metrics=["cer"]),
+            "all metrics by model and corpus": dict(group_by=["model", "corpus"]),
+            "time by century": dict(group_by=["century"], metrics=["time"]),
+            "CER leaderboard, year < 1500": dict(
+                group_by=["model"], metrics=["cer"], where=["year<1500"], sort="cer", limit=10
+            ),
+            "CER by book, one corpus, two models": dict(
+                group_by=["book"], metrics=["cer"], where=["corpus=Corpus03", "model=provider/model-1,provider/model-2"]
+            ),
+            "CER by model, gt_chars >= 20 (row scan)": dict(
+                group_by=["model"], metrics=["cer"], where=["gt_chars>=20"]
+            ),
+        }
+        for label, query in queries.items():
+            timed(label, lambda: store.query(**query))
+
+        # The segment statistics must agree with the rows
+        fast = {row["model"]: row["avg_cer"] for row in store.query(["model"], ["cer"])}
+        slow = {row["model"]: row["avg_cer"] for row in store.query(["model"], ["cer"], ["gt_chars>=0"])}
+        if any(abs(fast[model] - slow[model]) > 1e-9 for model in slow) or fast.keys() != slow.keys():
+            raise SystemExit("segment averages differ from the row averages")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
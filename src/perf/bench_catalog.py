@@ -0,0 +1,78 @@
+"""
+Benchmark catalog builds and stratified sampling against a synthetic dataset.
+
+Builds a tree shaped like GT4HistOCR/corpus (corpora / books / line image and
+.gt.txt pairs), then times a cold parallel catalog build, a no-op incremental
+refresh, a refresh after adding one line, and per_book / proportional sampling.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_catalog.py --lines 300000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from utils.catalog import Catalog, stratified_sample
+
+
+def build_dataset(root: Path, corpora: int, books: int, lines: int) -> None:
+    """
+    Create a synthetic dataset with `lines` image / GT pairs spread evenly.
+    """
+    per_book = max(1, lines // (corpora * books))
+    for c in range(corpora):
+        for b in range(books):
+            book_dir = root / f"Corpus{c:02d}" / f"{1450 + b}-Book{b:04d}"
+            book_dir.mkdir(parents=True, exist_ok=True)
+            for i in range(per_book):
+                (book_dir / f"{i:05d}.bin.png").write_bytes(b"\x89PNG" + bytes(i % 97))
+                (book_dir / f"{i:05d}.gt.txt").write_text("x" * (20 + i % 60))
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=300_000, help="Total number of image / GT pairs")
+    parser.add_argument("--corpora", type=int, default=10)
+    parser.add_argument("--books", type=int, default=60, help="Books per corpus")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        print(f"Building synthetic dataset with {args.lines} lines...")
+        build_dataset(root, args.corpora, args.books, args.lines)
+        time.sleep(0.1)
+
+        catalog = Catalog(Path(tmp) / "catalog.sqlite")
+        timed("cold build (parallel scandir)", lambda: catalog.refresh(root))
+        timed("incremental refresh, nothing changed", lambda: catalog.refresh(root))
+
+        book_dir = root / "Corpus00" / "1450-Book0000"
+        (book_dir / "99999.bin.png").write_bytes(b"\x89PNG")
+        (book_dir / "99999.gt.txt").write_text("new line")
+        timed("incremental refresh, one book changed", lambda: catalog.refresh(root))
+
+        sample = timed("per_book sample (2 per book)", lambda: stratified_sample(catalog, root, 2, "per_book"))
+        print(f"  -> {len(sample)} images")
+        sample = timed(
+            "proportional sample (1000)", lambda: stratified_sample(catalog, root, 1000, "proportional")
+        )
+        print(f"  -> {len(sample)} images")
+        sample = timed(
+            "per_book sample, half excluded",
+            lambda: stratified_sample(catalog, root, 2, "per_book", lambda entry: hash(entry.path) % 2 == 0),
+        )
+        print(f"  -> {len(sample)} images")
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark config loading with model validation against OpenRouter.
+
+Writes a config with `--models` models and times load_config against a fake
+OpenRouter client that answers the model list after `--latency` seconds: the
+legacy validator (one client and one model list download per model), then the
+shared registry cold (one download), warm (cached on disk) and offline.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_config.py --models 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+import yaml
+
+import config.registry as registry
+from config.schemas import InputConfig, load_config
+
+
+class FakeOpenRouter:
+    """Stand-in for the OpenRouter client returning a fixed model list after a delay."""
+
+    latency = 0.5
+    model_ids: list[str] = []
+    calls = 0
+
+    def __init__(self, api_key: str):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def models(self):
+        return self
+
+    def list(self):
+        FakeOpenRouter.calls += 1
+        time.sleep(self.latency)
+        pricing = types.SimpleNamespace(prompt="0.000001", completion="0.000004", image=None, request=None)
+        return types.SimpleNamespace(
+            data=[types.SimpleNamespace(id=model_id, pricing=pricing) for model_id in self.model_ids]
+        )
+
+
+def legacy_validate(cfg: dict) -> None:
+    """
+    The pre-registry validation: a new client and a model list download for every model.
+    """
+    for model in cfg["models"]:
+        with FakeOpenRouter(api_key="bench") as client:
+            model_ids = [m.id for m in client.models.list().data]
+            if model["model_id"] not in model_ids:
+                raise ValueError(f"Model '{model['model_id']}' does not exist on OpenRouter")
+
+
+def write_config(root: Path, models: int) -> tuple[Path, Path, dict]:
+    """
+    Write images and models YAML files for `models` models.
+    """
+    (root / "source").mkdir()
+    images = {"source": str(root / "source"), "images_to_process": 1, "avoid_rescan": True}
+    model_list = {
+        "models": [
+            {"model_id": f"vendor/model-{m}", "enabled": True, "link": f"https://openrouter.ai/vendor/model-{m}"}
+            for m in range(models)
+        ]
+    }
+    images_path, models_path = root / "images.yaml", root / "models.yaml"
+    images_path.write_text(yaml.safe_dump(images))
+    models_path.write_text(yaml.safe_dump(model_list))
+    return images_path, models_path, {**images, **model_list}
+
+
+def timed(label: str, call) -> None:
+    FakeOpenRouter.calls = 0
+    start = time.perf_counter()
+    call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {FakeOpenRouter.calls:>10} {elapsed * 1000:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=30)
+    parser.add_argument("--registry-size", type=int, default=400, help="Models listed by the fake OpenRouter")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to download the model list")
+    args = parser.parse_args()
+
+    FakeOpenRouter.latency = args.latency
+    FakeOpenRouter.model_ids = [f"vendor/model-{m}" for m in range(args.registry_size)]
+    # fetch_registry imports the client when it needs it
+    sys.modules["openrouter"] = types.SimpleNamespace(OpenRouter=FakeOpenRouter)
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        images_path, models_path, raw = write_config(root, args.models)
+        registry.REGISTRY_PATH = root / "openrouter_models.json"
+
+        def load_config_with(mode: str) -> None:
+            load_config(images_path, models_path, model_validation=mode)
+
+        print(f"{args.models} models, {args.registry_size} listed, {args.latency}s per model list download")
+        print(f"{'mode':<34} {'downloads':>10} {'ms':>10}")
+        timed(
+            "legacy (one download per model)",
+            lambda: (legacy_validate(raw), InputConfig.model_validate(raw, context={"model_validation": "skip"})),
+        )
+        timed("registry, cold", lambda: load_config_with("online"))
+        registry._loaded.clear()
+        timed("registry, warm (disk cache)", lambda: load_config_with("online"))
+        timed("registry, warm (same process)", lambda: load_config_with("online"))
+        timed("offline", lambda: load_config_with("offline"))
+        timed("skip validation", lambda: load_config_with("skip"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark HTTP connection reuse: one client per model vs one shared client.
+
+Starts a local stand-in for the OpenAI-compatible API (HTTP/1.1 keep-alive,
+streamed chat completions, a fixed latency and a configurable delay on every
+new connection standing in for the TCP + TLS handshake) and sends the same
+requests from real ChatOpenAI clients: with the library's default client,
+with a separate tuned connection pool per model, and with the shared pool
+run_all uses. Connections are counted by the server.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_connections.py --models 10 --requests 40
+"""
+import argparse
+import asyncio
+import json
+import time
+import types
+
+from config.schemas import HttpConfig, Model
+from benchmark.concurrency import AdaptiveLimiter
+from benchmark.connections import ConnectionStats, build_http_client
+from benchmark.execution import build_llms, request_transcription
+
+
+def sse_body(model: str) -> bytes:
+    """
+    Build a streamed chat completion response body.
+    """
+    base = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": model}
+    events = [
+        {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": "lorem ipsum"}, "finish_reason": None}]},
+        {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+        {**base, "choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": 5, "total_tokens": 105}},
+    ]
+    return "".join(f"data: {json.dumps(event)}\n\n" for event in events).encode() + b"data: [DONE]\n\n"
+
+
+class StandInServer:
+    def __init__(self, latency: float, handshake: float):
+        self.latency = latency
+        self.handshake = handshake
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                body = json.loads(await reader.readexactly(length)) if length else {}
+                await asyncio.sleep(self.latency)
+                payload = sse_body(body.get("model", ""))
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run_mode(base_url: str, models: int, requests: int, concurrency: int, mode: str) -> float:
+    """
+    Send `requests` requests per model and return the wall time in seconds.
+    """
+    http = HttpConfig(base_url=base_url, http2=False)
+    model_list = [Model.model_construct(model_id=f"bench/model-{m}", enabled=True, link="") for m in range(models)]
+    stats = ConnectionStats()
+    if mode == "default":
+        clients = []
+        llms = build_llms(types.SimpleNamespace(http=http, models=model_list), offline=True)
+    elif mode == "shared":
+        clients = [build_http_client(http, models * concurrency, stats)]
+        llms = build_llms(types.SimpleNamespace(http=http, models=model_list), offline=True, http_client=clients[0])
+    else:
+        clients, llms = [], {}
+        for model in model_list:
+            client = build_http_client(http, concurrency, stats)
+            clients.append(client)
+            cfg = types.SimpleNamespace(http=http, models=[model])
+            llms.update(build_llms(cfg, offline=True, http_client=client))
+
+    async def lane(llm):
+        # Fixed concurrency, so every mode runs the same number of requests in parallel
+        limiter = AdaptiveLimiter(initial=concurrency, minimum=concurrency, maximum=concurrency)
+
+        async def one():
+            await request_transcription(llm, "data:image/png;base64,AAAA", limiter)
+
+        await asyncio.gather(*(one() for _ in range(requests)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(lane(llm) for llm in llms.values()))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.aclose()
+    return elapsed
+
+
+async def main_async(args) -> None:
+    server = StandInServer(args.latency, args.handshake)
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/v1"
+
+    requests = args.models * args.requests
+    print(f"{'mode':<26} {'requests':>9} {'connections':>12} {'wall s':>8}")
+    for label, mode in (
+        ("library default client", "default"),
+        ("tuned client per model", "per-model"),
+        ("shared tuned client", "shared"),
+    ):
+        before = server.connections
+        elapsed = await run_mode(base_url, args.models, args.requests, args.concurrency, mode)
+        print(f"{label:<26} {requests:>9} {server.connections - before:>12} {elapsed:>8.2f}")
+    listener.close()
+    await listener.wait_closed()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=40, help="Requests per model")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent requests per model")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stand-in response latency in seconds")
+    parser.add_argument("--handshake", type=float, default=0.15, help="Delay of every new connection in seconds")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
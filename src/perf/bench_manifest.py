@@ -0,0 +1,106 @@
+"""
+Benchmark manifest generation against a synthetic benchmarks tree.
+
+Builds a tree shaped like GT4HistOCR results (corpora / books / per-image JSONs)
+and times the legacy rglob scan against generate_manifest with a cold index, a
+warm index with no changes, a warm index after touching one book, and a
+subtree-only refresh.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_manifest.py --files 100000
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark.results_manager import generate_manifest
+
+
+def build_tree(root: Path, corpora: int, books: int, files: int) -> None:
+    """
+    Create a synthetic benchmarks tree with `files` result files spread evenly.
+    """
+    per_book = max(1, files // (corpora * books))
+    for c in range(corpora):
+        for b in range(books):
+            book_dir = root / "GT4HistOCR" / "corpus" / f"Corpus{c:02d}" / f"{1450 + b}-Book{b:04d}"
+            book_dir.mkdir(parents=True, exist_ok=True)
+            (book_dir / "_summary.json").write_text("{}")
+            for i in range(per_book):
+                (book_dir / f"{i:05d}.bin.json").write_text("{}")
+
+
+def legacy_generate_manifest(benchmarks_root: Path) -> None:
+    """
+    The pre-index implementation: rglob every summary, then glob each folder again.
+    """
+    structure = {}
+    for summary_file in benchmarks_root.rglob("_summary.json"):
+        rel_path = summary_file.relative_to(benchmarks_root)
+        parts = list(rel_path.parent.parts)
+        relevant_parts = parts[parts.index("corpus") + 1:]
+        current = structure
+        for part in relevant_parts[:-1]:
+            current = current.setdefault(part, {})
+        individual_files = [
+            str(json_file.relative_to(benchmarks_root))
+            for json_file in sorted(summary_file.parent.glob("*.json"))
+            if json_file.name != "_summary.json"
+        ]
+        current[relevant_parts[-1]] = {
+            "aggregated": str(rel_path),
+            "individual_files": individual_files,
+            "image_count": len(individual_files),
+        }
+    with open(benchmarks_root / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({"structure": structure}, f, indent=2, ensure_ascii=False)
+
+
+def timed(label: str, fn) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000, help="Total number of result files")
+    parser.add_argument("--corpora", type=int, default=10)
+    parser.add_argument("--books", type=int, default=100, help="Books per corpus")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "benchmarks"
+        print(f"Building synthetic tree with {args.files} result files...")
+        build_tree(root, args.corpora, args.books, args.files)
+        # Let directory mtimes age past the index's safety window
+        time.sleep(2.5)
+
+        timed("legacy rglob scan", lambda: legacy_generate_manifest(root))
+        timed("full rescan (no index)", lambda: generate_manifest(root, rescan=True))
+        timed("warm index, nothing changed", lambda: generate_manifest(root))
+
+        book_dir = root / "GT4HistOCR" / "corpus" / "Corpus00" / "1450-Book0000"
+        (book_dir / "99999.bin.json").write_text("{}")
+        timed("warm index, one book changed", lambda: generate_manifest(root))
+
+        subtree = Path("GT4HistOCR/corpus/Corpus01")
+        (root / subtree / "1451-Book0001" / "99999.bin.json").write_text("{}")
+        timed("subtree refresh (one corpus)", lambda: generate_manifest(root, subtree=subtree))
+
+        with open(root / "manifest.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        total = sum(
+            book["image_count"]
+            for corpus in manifest["structure"].values()
+            for book in corpus.values()
+        )
+        print(f"Manifest lists {total} result files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark merging the benchmarks trees of a sharded run.
+
+Builds one synthetic benchmarks tree per shard, each holding the results of
+its share of the (model, image) pairs (split with get_shard, as
+`palladia run --shard` does), then times merging them into an empty tree and
+merging them again (every entry a duplicate), and checks that no result was
+lost.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_merge.py --images 100000 --shards 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark.merging import merge_trees
+from benchmark.sharding import get_shard
+
+
+def build_shards(tmp: Path, images: int, books: int, models: int, shards: int) -> list[Path]:
+    """
+    Create one benchmarks tree per shard; each image's result file only holds the shard's models.
+    """
+    roots = [tmp / f"shard{i}" / "benchmarks" for i in range(1, shards + 1)]
+    per_book = max(1, images // books)
+    model_ids = [f"provider/model-{m}" for m in range(models)]
+    for b in range(books):
+        rel_dir = f"GT4HistOCR/corpus/Corpus{b % 10:02d}/{1450 + b}-Book{b:04d}"
+        for root in roots:
+            (root / rel_dir).mkdir(parents=True, exist_ok=True)
+        for i in range(per_book):
+            name = f"{i:05d}.bin"
+            entries: dict[int, dict] = {}
+            for model_id in model_ids:
+                shard = get_shard(model_id, f"{rel_dir}/{name}.json", shards)
+                entries.setdefault(shard, {})[model_id] = {
+                    "gt": "lorem ipsum", "response": "lorem ipsvm", "wer": 0.5, "cer": 0.09,
+                    "accuracy": 0.91, "time": 1.2, "diffs": [],
+                    "matches": 10, "deletions": 0, "insertions": 1,
+                }
+            for shard, data in entries.items():
+                folder = roots[shard - 1] / rel_dir
+                (folder / f"{name}.json").write_text(json.dumps(data))
+                (folder / f"{name}.png").write_bytes(b"\x89PNG")
+    return roots
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=100_000, help="Total number of images")
+    parser.add_argument("--books", type=int, default=400)
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--workers", type=int, help="Merging processes (default: CPU count)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        print(f"Building {args.shards} shard trees for {args.images} images x {args.models} models...")
+        sources = build_shards(tmp, args.images, args.books, args.models, args.shards)
+        files = sum(len(files) for source in sources for _, _, files in os.walk(source))
+        print(f"{files} files in the shard trees")
+
+        target = tmp / "benchmarks"
+        first = timed("merge into an empty tree", lambda: merge_trees(sources, target, workers=args.workers))
+        again = timed("merge again (all duplicates)", lambda: merge_trees(sources, target, workers=args.workers))
+
+        expected = (args.images // args.books) * args.books * args.models
+        print(f"added {first['added']} / {expected} results, {first['images']} images copied")
+        print(f"second merge: {again['added']} added, {again['duplicates']} duplicates")
+        if first["added"] != expected or again["added"] or first["conflicts"]:
+            raise SystemExit("merge lost or changed results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Check and benchmark the metrics engine against the legacy three-pass scoring.
+
+The legacy path is what benchmark results were produced with: diff_match_patch
+diff_main + diff_cleanupSemantic, then separate jiwer WER and CER passes. Every
+(response, gt) pair stored under benchmarks/ is re-scored both ways; all values
+must agree exactly. Synthetic long lines show how both scale with length.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_metrics.py
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+from diff_match_patch import diff_match_patch
+from jiwer import cer, wer
+
+from benchmark.metrics import score, score_batch
+from benchmark.results_manager import read_results
+
+
+def legacy_score(candidate: str, reference: str) -> dict:
+    dmp = diff_match_patch()
+    diffs = dmp.diff_main(reference, candidate)
+    dmp.diff_cleanupSemantic(diffs)
+    match_count = sum(len(text) for op, text in diffs if op == 0)
+    total = max(len(reference), len(candidate))
+    return {
+        "diffs": diffs,
+        "matches": match_count,
+        "deletions": sum(len(text) for op, text in diffs if op == -1),
+        "insertions": sum(len(text) for op, text in diffs if op == 1),
+        "accuracy": match_count / total if total > 0 else 1.0,
+        "wer": min(wer(reference, candidate), 1.0),
+        "cer": min(cer(reference, candidate), 1.0),
+    }
+
+
+def load_pairs(benchmarks_root: Path) -> list[tuple[str, str]]:
+    pairs = []
+    for json_file in sorted(benchmarks_root.rglob("*.json")):
+        if json_file.name in ("_summary.json", "manifest.json") or ".palladia" in json_file.parts:
+            continue
+        for entry in read_results(json_file).values():
+            pairs.append((entry["response"], entry["gt"]))
+    return pairs
+
+
+def mutate(text: str, rate: float) -> str:
+    chars = list(text)
+    for i in range(len(chars)):
+        roll = random.random()
+        if roll < rate / 3:
+            chars[i] = random.choice("abcdefghijklmnopqrstuvwxyzſæœ ")
+        elif roll < 2 * rate / 3:
+            chars[i] = ""
+        elif roll < rate:
+            chars[i] += random.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+
+def timed(label: str, pairs: list[tuple[str, str]], fn) -> float:
+    start = time.perf_counter()
+    fn(pairs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed / len(pairs) * 1e6:10.1f} us/pair")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--benchmarks-root", type=Path, default=Path("benchmarks"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    pairs = load_pairs(args.benchmarks_root)
+    print(f"Checking {len(pairs)} stored (response, gt) pairs...")
+    mismatches = 0
+    for candidate, reference in pairs:
+        expected, actual = legacy_score(candidate, reference), score(candidate, reference)
+        if any(expected[key] != actual[key] for key in expected):
+            mismatches += 1
+    print(f"Mismatches against legacy scoring: {mismatches}")
+
+    legacy = timed("legacy (dmp + jiwer wer + jiwer cer)", pairs, lambda ps: [legacy_score(c, r) for c, r in ps])
+    engine = timed("score", pairs, lambda ps: [score(c, r) for c, r in ps])
+    timed("score_batch", pairs, score_batch)
+    print(f"Speedup on stored results: {legacy / engine:.2f}x")
+
+    references = [reference for _, reference in pairs]
+    for length in (500, 5000):
+        long_pairs = []
+        for _ in range(20):
+            reference = " ".join(random.choices(references, k=length // 50))[:length]
+            long_pairs.append((mutate(reference, 0.05), reference))
+        print(f"Synthetic lines of {length} characters:")
+        legacy = timed("  legacy", long_pairs, lambda ps: [legacy_score(c, r) for c, r in ps])
+        engine = timed("  score", long_pairs, lambda ps: [score(c, r) for c, r in ps])
+        print(f"  speedup: {legacy / engine:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
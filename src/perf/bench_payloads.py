@@ -0,0 +1,153 @@
+"""
+Benchmark payload preparation in run_all: per-model encoding vs the shared payload cache.
+
+Builds a synthetic dataset of line images with ground truths and runs the full
+pipeline against fake models (fixed latency, no network) once with the payload
+cache disabled and once enabled. Each run happens in its own process so peak
+RSS is measured independently.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_payloads.py --models 10 --images 1000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessageChunk
+
+
+def build_dataset(root: Path, images: int, image_bytes: int) -> list[Path]:
+    """
+    Create `images` fake line images of `image_bytes` bytes each, with ground truths.
+    """
+    book = root / "GT4HistOCR" / "corpus" / "Synthetic" / "1500-Book"
+    book.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(images):
+        image = book / f"{i:05d}.bin.png"
+        image.write_bytes(os.urandom(image_bytes))
+        (book / f"{i:05d}.gt.txt").write_text("lorem ipsum dolor sit amet " * 3, encoding="utf-8")
+        paths.append(image)
+    return paths
+
+
+class FakeLLM:
+    def __init__(self, model_name: str, latency: float):
+        self.model_name = model_name
+        self.latency = latency
+
+    async def astream(self, messages):
+        await asyncio.sleep(self.latency)
+        yield AIMessageChunk(content="lorem ipsum dolor sit amet")
+
+
+def run_child(root: Path, models: int, payload_cache_mb: int, latency: float) -> None:
+    """
+    Run the pipeline in this process and print its measurements as JSON.
+    """
+    from config.schemas import CleanConfig, ConcurrencyConfig, HttpConfig, Model
+    import benchmark.execution as execution
+
+    os.chdir(root)
+    images = sorted(Path("GT4HistOCR/corpus/Synthetic/1500-Book").glob("*.png"))
+    model_ids = [f"model-{m}" for m in range(models)]
+    execution.build_llms = lambda cfg, offline=False, http_client=None: {m: FakeLLM(m, latency) for m in model_ids}
+
+    caches = []
+
+    class RecordingPayloadCache(execution.PayloadCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            caches.append(self)
+
+    execution.PayloadCache = RecordingPayloadCache
+
+    # model_construct skips validation (source folder, OpenRouter lookup) and fills in defaults
+    cfg = CleanConfig.model_construct(
+        source=images[0].parent,
+        images_to_process=len(images),
+        avoid_rescan=False,
+        sampling="random",
+        response_cache="disabled",
+        response_cache_max_mb=1024,
+        http=HttpConfig(),
+        models=[
+            Model.model_construct(
+                model_id=m,
+                enabled=True,
+                link="",
+                concurrency=ConcurrencyConfig(initial=16, max=16),
+            )
+            for m in model_ids
+        ],
+    )
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(execution.run_all(cfg, images, payload_cache_mb=payload_cache_mb))
+    elapsed = time.perf_counter() - start
+
+    report = caches[0].report()
+    print(json.dumps({
+        "wall_seconds": elapsed,
+        "encode_seconds": report["encode_seconds"],
+        "encodes": report["misses"],
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=10)
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--image-bytes", type=int, default=40_000, help="Size of each synthetic image")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake model latency in seconds")
+    parser.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--payload-cache-mb", type=int, default=16, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.models, args.payload_cache_mb, args.latency)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"Building {args.images} synthetic images of {args.image_bytes} bytes...")
+        build_dataset(root, args.images, args.image_bytes)
+
+        print(f"{'mode':<28} {'encodes':>8} {'encode s':>9} {'wall s':>8} {'peak RSS MB':>12}")
+        for label, cache_mb in (("per-model encoding", 0), ("shared payload cache, 16 MB", 16), ("shared payload cache, 64 MB", 64)):
+            # Fresh results tree for every run
+            shutil.rmtree(root / "benchmarks", ignore_errors=True)
+            output = subprocess.run(
+                [
+                    sys.executable, __file__,
+                    "--child", str(root),
+                    "--models", str(args.models),
+                    "--latency", str(args.latency),
+                    "--payload-cache-mb", str(cache_mb),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+                env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+            ).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{label:<28} {stats['encodes']:>8} {stats['encode_seconds']:>9.2f} "
+                f"{stats['wall_seconds']:>8.2f} {stats['peak_rss_mb']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
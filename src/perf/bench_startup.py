@@ -0,0 +1,95 @@
+"""
+Benchmark the startup time of the `palladia` commands.
+
+Runs each command in a fresh interpreter against a small synthetic benchmarks
+tree and reports the median wall time, plus which heavy dependencies the
+command loaded. The first row is the cost every tool used to pay by importing
+benchmark.execution, the former entry point.
+
+Usage:
+    PYTHONPATH=src python src/perf/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+HEAVY_MODULES = ("langchain_openai", "openrouter", "openai", "httpx", "jiwer", "diff_match_patch", "rapidfuzz")
+
+# Runs a command, then reports the heavy modules it imported on stderr
+SNIPPET = """
+import json, sys
+argv = sys.argv[1:]
+try:
+    if argv == ["<import>"]:
+        import benchmark.execution
+    else:
+        from benchmark.cli import main
+        main(argv)
+finally:
+    heavy = [name for name in {heavy!r} if name in sys.modules]
+    print(json.dumps(heavy), file=sys.stderr)
+"""
+
+
+def build_tree(root: Path, books: int, files: int) -> None:
+    """
+    Create a small benchmarks tree of scored results.
+    """
+    entry = {"gt": "lorem ipsum", "response": "lorem ipsvm", "wer": 0.5, "cer": 0.1, "accuracy": 0.9, "time": 1.0}
+    for b in range(books):
+        book_dir = root / "GT4HistOCR" / "corpus" / "Corpus00" / f"{1450 + b}-Book{b:04d}"
+        book_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(files):
+            (book_dir / f"{i:05d}.bin.json").write_text(json.dumps({"bench/model": entry}))
+
+
+def measure(argv: list[str], cwd: Path, runs: int) -> tuple[float, list[str]]:
+    """
+    Run a command `runs` times and return its median wall time and the heavy modules it loaded.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    code = SNIPPET.format(heavy=HEAVY_MODULES)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", code, *argv], cwd=cwd, env=env, capture_output=True, text=True, check=True
+        )
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), json.loads(proc.stderr.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command")
+    parser.add_argument("--books", type=int, default=5)
+    parser.add_argument("--files", type=int, default=50, help="Result files per book")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = Path(tmp)
+        build_tree(cwd / "benchmarks", args.books, args.files)
+
+        print(f"{'command':<34} {'median ms':>10}  heavy modules loaded")
+        for label, argv in (
+            ("import benchmark.execution", ["<import>"]),
+            ("palladia --help", ["--help"]),
+            ("palladia run --help", ["run", "--help"]),
+            ("palladia summarize", ["summarize"]),
+            ("palladia summarize --verify", ["summarize", "--verify"]),
+            ("palladia manifest", ["manifest"]),
+            ("palladia rescore --workers 1", ["rescore", "--workers", "1"]),
+        ):
+            elapsed, heavy = measure(argv, cwd, args.runs)
+            print(f"{label:<34} {elapsed * 1000:>10.1f}  {', '.join(heavy) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
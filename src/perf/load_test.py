@@ -0,0 +1,251 @@
+"""
+Load-test the run_all pipeline (encode -> request -> score -> persist) against the mock server.
+
+For every size, builds a synthetic dataset of line images with ground
+truths, starts the mock OpenRouter server (see mock_server.py) in its own
+process, and runs a planned run of `--models` models over it through the real
+pipeline (real ChatOpenAI clients, HTTP connection pool, scoring process
+pool, journal and compaction) in a fresh process, so peak memory is measured
+per run. Reports, per run:
+
+- throughput: work items (model, image pairs) per second of wall time
+- event-loop lag: how late a 10 ms timer fires, p50 / p99 / max
+- CPU seconds of the harness process and of its scoring processes
+- peak RSS of the harness process and of its largest scoring process
+- items done / failed and what the server served (429s, 500s, its CPU time)
+
+With `--json` the reports are also written to a file, to compare against
+the numbers of an earlier commit.
+
+Usage:
+    PYTHONPATH=src python src/perf/load_test.py --items 1000 10000 100000 --profile instant
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from perf.mock_server import load_profile
+
+LAG_INTERVAL = 0.01
+
+
+def build_dataset(root: Path, images: int, image_bytes: int, books: int = 20) -> Path:
+    """
+    Create `images` fake line images of about `image_bytes` bytes, with ground truths, spread over books.
+    """
+    corpus = root / "GT4HistOCR" / "corpus" / "Synthetic"
+    for i in range(images):
+        book = corpus / f"{1500 + i % books}-Book"
+        if i < books:
+            book.mkdir(parents=True, exist_ok=True)
+        # Unique bytes per image, so the server can echo its ground truth
+        (book / f"{i:06d}.bin.png").write_bytes(b"\x89PNG" + i.to_bytes(4, "big") + b"\0" * image_bytes)
+        (book / f"{i:06d}.gt.txt").write_text(f"lorem ipsum dolor sit amet {i}", encoding="utf-8")
+    return corpus
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def monitor_loop_lag(samples: list[float]) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(time.perf_counter() - start - LAG_INTERVAL)
+
+
+def run_child(root: Path, base_url: str, models: int, batch_size: int, concurrency: int) -> None:
+    """
+    Plan and run the load in this process and print its measurements as JSON.
+    """
+    from config.schemas import CleanConfig, ConcurrencyConfig, HttpConfig, Model
+    from benchmark.execution import plan_run, run_all
+    from benchmark.results_manager import get_state_dir
+    from benchmark.run_queue import RUN_QUEUE_FILENAME, RunQueue
+    from config.registry import REGISTRY_PATH
+
+    os.chdir(root)
+    os.environ["OPENROUTER_API_KEY"] = "load-test"
+    # A fresh model list snapshot, so the price table is never downloaded
+    state_dir = get_state_dir()
+    state_dir.mkdir(parents=True, exist_ok=True)
+    (state_dir / REGISTRY_PATH.name).write_text(
+        json.dumps({"version": 1, "fetched_at": time.time(), "models": {}})
+    )
+
+    images = sorted(Path("GT4HistOCR/corpus/Synthetic").rglob("*.png"))
+    # model_construct skips validation (source folder, OpenRouter lookup) and fills in defaults
+    cfg = CleanConfig.model_construct(
+        source=Path("GT4HistOCR/corpus/Synthetic"),
+        images_to_process=len(images),
+        avoid_rescan=False,
+        sampling="random",
+        seed=None,
+        response_cache="disabled",
+        response_cache_max_mb=1024,
+        http=HttpConfig(base_url=base_url, http2=False),
+        models=[
+            Model.model_construct(
+                model_id=f"mock/model-{m}",
+                enabled=True,
+                link="",
+                batch_size=batch_size,
+                concurrency=ConcurrencyConfig(initial=concurrency, max=concurrency),
+            )
+            for m in range(models)
+        ],
+    )
+    run_queue = RunQueue(state_dir / RUN_QUEUE_FILENAME)
+    run_id = plan_run(cfg, images, run_queue)
+    items = sum(run_queue.progress(run_id).values())
+
+    lag: list[float] = []
+
+    async def load() -> None:
+        monitor = asyncio.create_task(monitor_loop_lag(lag))
+        try:
+            await run_all(cfg, run_id=run_id)
+        finally:
+            monitor.cancel()
+
+    start = time.perf_counter()
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(load())
+    elapsed = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # The scoring processes have exited by now, so they are accounted as children
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    progress = run_queue.progress(run_id)
+    run_queue.close()
+    print(json.dumps({
+        "items": items,
+        "done": progress["done"],
+        "failed": progress["failed"],
+        "wall_seconds": elapsed,
+        "items_per_second": items / elapsed,
+        "loop_lag_ms": {
+            "p50": percentile(lag, 50) * 1000,
+            "p99": percentile(lag, 99) * 1000,
+            "max": max(lag, default=0.0) * 1000,
+        },
+        "cpu_seconds": usage.ru_utime + usage.ru_stime - before.ru_utime - before.ru_stime,
+        "scoring_cpu_seconds": children.ru_utime + children.ru_stime,
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+        "scoring_peak_rss_mb": children.ru_maxrss / 1024,
+    }))
+
+
+@contextlib.contextmanager
+def mock_server(profile: str, dataset: Path, env: dict):
+    """
+    Run the mock server in its own process and yield its base URL.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable, str(Path(__file__).with_name("mock_server.py")),
+            "--port", "0", "--profile", profile, "--dataset", str(dataset),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+        env=env,
+    )
+    try:
+        line = process.stdout.readline()
+        if not line.startswith("Listening on "):
+            raise RuntimeError(f"Mock server did not start: {line!r}")
+        yield line.removeprefix("Listening on ").strip()
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--items", type=int, nargs="+", default=[1000, 10_000], help="Work items (model, image pairs) per run"
+    )
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1, help="Line images per request")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent requests per model")
+    parser.add_argument("--image-bytes", type=int, default=4000, help="Size of each synthetic image")
+    parser.add_argument("--profile", default="instant", help="Mock server profile (preset name or YAML file)")
+    parser.add_argument("--json", type=Path, help="Also write the reports to this file")
+    parser.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.base_url, args.models, args.batch_size, args.concurrency)
+        return
+    try:
+        load_profile(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    reports = []
+    print(
+        f"{'items':>8} {'done':>8} {'failed':>6} {'items/s':>9} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} "
+        f"{'CPU s':>7} {'score s':>8} {'RSS MB':>7} {'server s':>9} {'429s':>6} {'500s':>6}"
+    )
+    for items in args.items:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            dataset = build_dataset(root, max(1, items // args.models), args.image_bytes)
+            with mock_server(args.profile, dataset, env) as base_url:
+                output = subprocess.run(
+                    [
+                        sys.executable, __file__,
+                        "--child", str(root),
+                        "--base-url", base_url,
+                        "--models", str(args.models),
+                        "--batch-size", str(args.batch_size),
+                        "--concurrency", str(args.concurrency),
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                    env=env,
+                ).stdout
+                with urllib.request.urlopen(f"{base_url}/stats") as response:
+                    server = json.load(response)
+
+        report = {
+            **json.loads(output.strip().splitlines()[-1]),
+            "server": server,
+            "profile": args.profile,
+            "models": args.models,
+            "batch_size": args.batch_size,
+            "concurrency": args.concurrency,
+        }
+        reports.append(report)
+        lag = report["loop_lag_ms"]
+        print(
+            f"{report['items']:>8} {report['done']:>8} {report['failed']:>6} {report['items_per_second']:>9.1f} "
+            f"{lag['p50']:>8.1f} {lag['p99']:>8.1f} {lag['max']:>8.1f} {report['cpu_seconds']:>7.1f} "
+            f"{report['scoring_cpu_seconds']:>8.1f} {report['peak_rss_mb']:>7.1f} "
+            f"{server['cpu_seconds']:>9.1f} {server['throttled']:>6} {server['errors']:>6}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(reports, indent=2))
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Microbenchmarks of the hot pure-Python paths, compared against a stored baseline.
+
+Times the scoring functions (get_diff, get_metrics) on every (response, gt)
+pair stored under benchmarks/GT4HistOCR and on synthetic long lines, and the
+result I/O (save_individual_result, update_folder_summary, generate_manifest)
+and image selection (random_selection) on synthetic trees in a temporary
+folder. Each case is timed `--repeat` times; its best time per operation is
+compared with the baseline, and the suite exits with status 1 if any case is
+slower than the baseline by more than `--threshold`.
+
+Baselines depend on the machine: record one with --save-baseline before
+changing the code, then run the suite again after the change.
+
+Usage:
+    PYTHONPATH=src python src/perf/microbench.py --save-baseline
+    PYTHONPATH=src python src/perf/microbench.py --threshold 0.2
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from benchmark.metrics import get_diff, get_metrics, score
+from benchmark.results_manager import (
+    generate_manifest,
+    read_results,
+    save_individual_result,
+    update_folder_summary,
+    write_results,
+)
+from utils.preprocessing import random_selection
+
+DEFAULT_BASELINE = Path(__file__).with_name("microbench_baseline.json")
+
+# A case builds its inputs and returns a function running `ops` operations
+Case = Callable[["Inputs"], tuple[Callable[[], None], int]]
+CASES: dict[str, Case] = {}
+
+
+def case(name: str) -> Callable[[Case], Case]:
+    def register(setup: Case) -> Case:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class Inputs:
+    def __init__(self, pairs: list[tuple[str, str]], root: Path, files: int):
+        self.pairs = pairs  # (response, gt) of the stored results
+        self.root = root  # temporary working directory, the cwd while the cases run
+        self.files = files  # result files in the synthetic manifest tree
+        rng = random.Random(0)
+        self.long_lines = [edit_line(synthetic_line(rng, 2000), rng, 0.05) for _ in range(20)]
+
+
+def synthetic_line(rng: random.Random, length: int) -> str:
+    words = ["vnde", "der", "ſich", "gnad", "herre", "ſprach", "daz", "wir", "gotes", "cymbalen"]
+    text = ""
+    while len(text) < length:
+        text += rng.choice(words) + " "
+    return text[:length].strip()
+
+
+def edit_line(reference: str, rng: random.Random, rate: float) -> tuple[str, str]:
+    """
+    Get a (candidate, reference) pair, the candidate with substitutions, insertions and deletions.
+    """
+    chars = []
+    for char in reference:
+        draw = rng.random()
+        if draw >= rate:
+            chars.append(char)
+        elif draw < rate / 3:
+            chars.append(rng.choice("abcdefghijklmnopqrstuvwxyz"))
+        elif draw < 2 * rate / 3:
+            chars.append(char + rng.choice("aeiou"))
+    return "".join(chars), reference
+
+
+def load_pairs(results: Path) -> list[tuple[str, str]]:
+    """
+    Collect the (response, gt) pair of every model entry in a results tree.
+    """
+    pairs = []
+    for path in sorted(results.rglob("*.json")):
+        if path.name in ("_summary.json", "manifest.json"):
+            continue
+        pairs.extend(
+            (entry.get("response", ""), entry.get("gt", ""))
+            for entry in read_results(path).values() if isinstance(entry, dict)
+        )
+    return pairs
+
+
+def build_images(folder: Path, count: int) -> list[Path]:
+    """
+    Create `count` line images with ground truths in a dataset folder (relative to the cwd).
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    images = []
+    for i in range(count):
+        image = folder / f"{i:05d}.bin.png"
+        image.write_bytes(b"\x89PNG" + i.to_bytes(4, "big"))
+        (folder / f"{i:05d}.gt.txt").write_text("vnde bunghen vnde vedelen", encoding="utf-8")
+        images.append(image)
+    return images
+
+
+def run_result(image: Path, model_id: str, candidate: str, reference: str) -> dict:
+    scores = score(candidate, reference)
+    return {
+        "image": str(image),
+        "model_id": model_id,
+        "ground_truth": reference,
+        "content": candidate,
+        "wer": scores["wer"],
+        "cer": scores["cer"],
+        "diff": {field: scores[field] for field in ("diffs", "matches", "deletions", "insertions", "accuracy")},
+        "time_sec": 1.0,
+    }
+
+
+@case("get_diff/stored")
+def get_diff_stored(inputs: Inputs):
+    return lambda: [get_diff(*pair) for pair in inputs.pairs], len(inputs.pairs)
+
+
+@case("get_diff/long_lines")
+def get_diff_long(inputs: Inputs):
+    return lambda: [get_diff(*pair) for pair in inputs.long_lines], len(inputs.long_lines)
+
+
+@case("get_metrics/stored")
+def get_metrics_stored(inputs: Inputs):
+    return lambda: [get_metrics(*pair) for pair in inputs.pairs], len(inputs.pairs)
+
+
+@case("get_metrics/long_lines")
+def get_metrics_long(inputs: Inputs):
+    return lambda: [get_metrics(*pair) for pair in inputs.long_lines], len(inputs.long_lines)
+
+
+@case("save_individual_result")
+def save_result(inputs: Inputs):
+    # Image files already holding the results of three other models
+    images = build_images(Path("GT4HistOCR/corpus/Save/1500-Book"), 200)
+    for model in range(3):
+        for image in images:
+            save_individual_result(run_result(image, f"other/model-{model}", "vnde bunghen", "vnde bunghen vnde"))
+    results = [run_result(image, "bench/model", "vnde bvnghen", "vnde bunghen vnde") for image in images]
+
+    def run():
+        for result in results:
+            save_individual_result(result)
+
+    return run, len(results)
+
+
+def build_summary_folder(folder: Path, images: int, models: int) -> None:
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(1)
+    for i in range(images):
+        data = {}
+        for model in range(models):
+            candidate, reference = edit_line("vnde bunghen vnde vedelen", rng, 0.1)
+            result = run_result(folder / f"{i:05d}.bin.png", f"bench/model-{model}", candidate, reference)
+            data[result["model_id"]] = {
+                "gt": result["ground_truth"], "response": result["content"], "wer": result["wer"],
+                "cer": result["cer"], "time": 1.0, **result["diff"],
+            }
+        write_results(folder / f"{i:05d}.bin.json", data)
+
+
+@case("update_folder_summary")
+def summary(inputs: Inputs):
+    folder = Path("benchmarks/GT4HistOCR/corpus/Summary/1500-Book")
+    build_summary_folder(folder, 1000, 4)
+    update_folder_summary(folder, rebuild=True)
+    return lambda: [update_folder_summary(folder) for _ in range(20)], 20
+
+
+@case("update_folder_summary/rebuild")
+def summary_rebuild(inputs: Inputs):
+    folder = Path("benchmarks/GT4HistOCR/corpus/SummaryRebuild/1500-Book")
+    build_summary_folder(folder, 1000, 4)
+    return lambda: update_folder_summary(folder, rebuild=True), 1
+
+
+def build_manifest_tree(root: Path, files: int, corpora: int = 10, books: int = 20) -> None:
+    per_book = max(1, files // (corpora * books))
+    for c in range(corpora):
+        for b in range(books):
+            book = root / "GT4HistOCR" / "corpus" / f"Corpus{c:02d}" / f"{1450 + b}-Book{b:04d}"
+            book.mkdir(parents=True, exist_ok=True)
+            (book / "_summary.json").write_text("{}")
+            for i in range(per_book):
+                (book / f"{i:05d}.bin.json").write_text("{}")
+
+
+@case("generate_manifest")
+def manifest(inputs: Inputs):
+    root = Path("manifest_tree")
+    build_manifest_tree(root, inputs.files)
+    generate_manifest(root)
+    return lambda: generate_manifest(root), 1
+
+
+@case("generate_manifest/rescan")
+def manifest_rescan(inputs: Inputs):
+    root = Path("manifest_tree_rescan")
+    build_manifest_tree(root, inputs.files)
+    return lambda: generate_manifest(root, rescan=True), 1
+
+
+@case("random_selection")
+def selection(inputs: Inputs):
+    folder = Path("GT4HistOCR/corpus/Selection/1500-Book")
+    build_images(folder, 5000)
+    return lambda: [random_selection(folder, 100, seed=seed) for seed in range(10)], 10
+
+
+@case("random_selection/avoid_rescan")
+def selection_avoid_rescan(inputs: Inputs):
+    folder = Path("GT4HistOCR/corpus/SelectionProcessed/1500-Book")
+    images = build_images(folder, 2000)
+    # Half of the images already have results
+    for image in images[::2]:
+        save_individual_result(run_result(image, "bench/model", "vnde", "vnde"))
+    return lambda: [random_selection(folder, 100, True, ["bench/model"], seed) for seed in range(10)], 10
+
+
+def measure(run: Callable[[], None], ops: int, repeat: int, min_time: float) -> list[float]:
+    """
+    Time a case `repeat` times and get its seconds per operation of every sample.
+
+    A first, untimed run warms up caches and sizes the samples: each one calls
+    the case enough times to last at least `min_time`, so fast cases are not
+    timed at the resolution of the scheduler.
+    """
+    start = time.perf_counter()
+    run()
+    loops = max(1, math.ceil(min_time / max(time.perf_counter() - start, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        times.append((time.perf_counter() - start) / (loops * ops))
+    return times
+
+
+def compare(results: dict[str, float], baseline: dict, threshold: float) -> list[str]:
+    """
+    Print every case against the baseline and get the names of the regressed ones.
+    """
+    meta = baseline.get("meta", {})
+    if meta and meta != get_meta():
+        print(f"Note: the baseline was recorded on {meta}, this is {get_meta()}")
+    regressions = []
+    print(f"{'case':<34} {'best us/op':>12} {'baseline':>12} {'ratio':>7}")
+    for name, seconds in results.items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            print(f"{name:<34} {seconds * 1e6:>12.1f} {'-':>12} {'new':>7}")
+            continue
+        ratio = seconds / reference
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<34} {seconds * 1e6:>12.1f} {reference * 1e6:>12.1f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def get_meta() -> dict[str, str]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="Slowdown over the baseline counted as a regression (0.25: 25%%)"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed samples of every case; the best one counts")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Seconds every sample lasts at least")
+    parser.add_argument("--only", nargs="+", default=[], help="Only run the cases whose name contains one of these")
+    parser.add_argument(
+        "--results", type=Path, default=Path("benchmarks/GT4HistOCR"), help="Stored results to score"
+    )
+    parser.add_argument("--files", type=int, default=20_000, help="Result files in the synthetic manifest tree")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.results) if args.results.is_dir() else []
+    if not pairs:
+        print(f"No stored results under {args.results}, scoring synthetic lines only")
+        rng = random.Random(2)
+        pairs = [edit_line(synthetic_line(rng, rng.randint(20, 80)), rng, 0.05) for _ in range(500)]
+    baseline_path = args.baseline.resolve()
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Relative default paths (benchmarks/, the dataset) resolve inside the temporary folder
+        os.chdir(tmp)
+        try:
+            inputs = Inputs(pairs, Path(tmp), args.files)
+            for name, setup in CASES.items():
+                if args.only and not any(part in name for part in args.only):
+                    continue
+                run, ops = setup(inputs)
+                times = measure(run, ops, args.repeat, args.min_time)
+                results[name] = min(times)
+                print(
+                    f"{name:<34} {min(times) * 1e6:>10.1f} us/op best, {statistics.median(times) * 1e6:>10.1f} median",
+                    file=sys.stderr,
+                )
+        finally:
+            os.chdir(cwd)
+
+    if args.save_baseline:
+        baseline = {"meta": get_meta(), "cases": {}}
+        if baseline_path.exists():
+            # Keep the cases that were not run this time
+            baseline["cases"] = json.loads(baseline_path.read_text()).get("cases", {})
+        baseline["cases"].update(results)
+        baseline_path.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Saved baseline of {len(results)} cases to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        sys.exit(f"No baseline at {baseline_path}; record one with --save-baseline")
+    regressions = compare(results, json.loads(baseline_path.read_text()), args.threshold)
+    if regressions:
+        sys.exit(f"{len(regressions)} cases regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
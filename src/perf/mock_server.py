@@ -0,0 +1,327 @@
+"""
+Local stand-in for the OpenRouter (OpenAI-compatible) chat completions API.
+
+Serves streamed chat completions over HTTP/1.1 keep-alive, driven by a
+profile: the latency distribution of a request, the delay between streamed
+chunks (with a share of slow streams), random and bursty 429 throttling with
+a Retry-After header, random 500 errors, and the transcription returned: a
+canned text, or the ground truth of the image sent (looked up by the SHA-256
+of the image bytes in a dataset folder), optionally corrupted at a given
+character error rate. Requests with several images get one numbered line
+per image, like the batch prompt asks for. GET /stats reports what was
+served and the server's own CPU time, so a load test can tell when the
+server rather than the harness was the bottleneck.
+
+Point a run at it with `http.base_url` (and `http2: False`) in models.yaml.
+
+Usage:
+    PYTHONPATH=src python src/perf/mock_server.py --profile typical --dataset GT4HistOCR/corpus
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import resource
+import time
+from pathlib import Path
+from typing import Literal
+
+import yaml
+from pydantic import BaseModel, Field
+
+from utils.catalog import IMAGE_EXTENSIONS, get_ground_truth_path
+
+
+class MockProfile(BaseModel):
+    latency: Literal["fixed", "uniform", "lognormal"] = Field(
+        "fixed", description="Distribution of the time to first token"
+    )
+    latency_seconds: float = Field(0.05, ge=0, description="Fixed latency, or the median of the distribution")
+    latency_spread: float = Field(0.0, ge=0, description="uniform: +/- seconds around the median; lognormal: sigma")
+    chunk_chars: int = Field(16, ge=1, description="Characters per streamed chunk")
+    chunk_delay: float = Field(0.0, ge=0, description="Seconds between streamed chunks")
+    slow_stream_rate: float = Field(
+        0.0, ge=0, le=1, description="Share of responses streamed with slow_chunk_delay"
+    )
+    slow_chunk_delay: float = Field(0.1, ge=0, description="Seconds between the chunks of a slow stream")
+    error_rate: float = Field(0.0, ge=0, le=1, description="Share of requests failing with a 500")
+    throttle_rate: float = Field(
+        0.0, ge=0, le=1, description="Share of requests throttled with a 429 at any time"
+    )
+    throttle_every: float = Field(0.0, ge=0, description="Seconds between 429 bursts (0: no bursts)")
+    throttle_seconds: float = Field(
+        0.0, ge=0, description="Length of a 429 burst, during which every request is throttled"
+    )
+    retry_after: float | None = Field(1.0, ge=0, description="Retry-After of throttled requests in seconds")
+    transcription: Literal["canned", "echo"] = Field("echo", description="echo: the image's ground truth, if known")
+    canned_text: str = Field("lorem ipsum dolor sit amet", description="Transcription of unknown images")
+    corruption: float = Field(0.0, ge=0, le=1, description="Character error rate applied to the transcription")
+    seed: int | None = Field(None, description="Seed of the random draws")
+
+
+PROFILES = {
+    "instant": MockProfile(latency_seconds=0.0),
+    "typical": MockProfile(
+        latency="lognormal", latency_seconds=0.8, latency_spread=0.5, chunk_delay=0.01, corruption=0.03
+    ),
+    "throttled": MockProfile(throttle_rate=0.02, throttle_every=10.0, throttle_seconds=2.0, retry_after=0.5),
+    "slow-streams": MockProfile(slow_stream_rate=0.1, slow_chunk_delay=0.2),
+    "flaky": MockProfile(error_rate=0.05),
+}
+
+
+def load_profile(value: str) -> MockProfile:
+    """
+    Get a profile by preset name, or load it from a YAML file.
+
+    Raises:
+        ValueError: If the value is neither a preset nor a valid profile file
+    """
+    if value in PROFILES:
+        return PROFILES[value]
+    try:
+        with open(value, "r", encoding="utf-8") as f:
+            return MockProfile.model_validate(yaml.safe_load(f) or {})
+    except OSError as e:
+        raise ValueError(f"Unknown profile {value!r} (presets: {', '.join(PROFILES)}): {e}")
+
+
+def index_ground_truths(folder: Path) -> dict[str, str]:
+    """
+    Map the SHA-256 of every image under a folder to its ground truth text.
+    """
+    ground_truths = {}
+    for dirpath, _, files in os.walk(folder):
+        for name in files:
+            if os.path.splitext(name.lower())[1] not in IMAGE_EXTENSIONS:
+                continue
+            image = Path(dirpath) / name
+            try:
+                ground_truth = get_ground_truth_path(image).read_text(encoding="utf-8").strip()
+            except FileNotFoundError:
+                continue
+            ground_truths[hashlib.sha256(image.read_bytes()).hexdigest()] = ground_truth
+    return ground_truths
+
+
+def _sse(events: list[dict]) -> list[bytes]:
+    return [f"data: {json.dumps(event)}\n\n".encode() for event in events] + [b"data: [DONE]\n\n"]
+
+
+class MockServer:
+    """
+    HTTP/1.1 server answering chat completions as its profile says.
+    """
+
+    def __init__(self, profile: MockProfile, ground_truths: dict[str, str] | None = None):
+        """
+        Args:
+            profile: How to answer
+            ground_truths: Image SHA-256 to ground truth, for echoed transcriptions
+        """
+        self.profile = profile
+        self.ground_truths = ground_truths or {}
+        self.random = random.Random(profile.seed)
+        self.started = time.monotonic()
+        self.stats = dict.fromkeys(
+            ("connections", "requests", "completions", "images", "unknown_images", "throttled", "errors", "bytes_in"),
+            0,
+        )
+
+    def _latency(self) -> float:
+        profile = self.profile
+        if profile.latency == "uniform":
+            spread = profile.latency_spread
+            return max(0.0, profile.latency_seconds + self.random.uniform(-spread, spread))
+        if profile.latency == "lognormal" and profile.latency_seconds > 0:
+            return self.random.lognormvariate(0.0, profile.latency_spread) * profile.latency_seconds
+        return profile.latency_seconds
+
+    def _throttled(self) -> bool:
+        profile = self.profile
+        if profile.throttle_every > 0:
+            elapsed = time.monotonic() - self.started
+            if elapsed >= profile.throttle_every and elapsed % profile.throttle_every < profile.throttle_seconds:
+                return True
+        return self.random.random() < profile.throttle_rate
+
+    def _corrupt(self, text: str) -> str:
+        rate = self.profile.corruption
+        if not rate:
+            return text
+        chars = []
+        for char in text:
+            draw = self.random.random()
+            if draw >= rate:
+                chars.append(char)
+            elif draw < rate / 3:
+                chars.append(self.random.choice("abcdefghijklmnopqrstuvwxyz"))
+            elif draw < 2 * rate / 3:
+                chars.append(char + char)
+            # else: deleted
+        return "".join(chars)
+
+    def transcribe(self, image_url: str) -> str:
+        """
+        Get the transcription of an image sent as a data URL.
+        """
+        self.stats["images"] += 1
+        if self.profile.transcription == "echo":
+            _, _, data = image_url.partition(",")
+            sha = hashlib.sha256(base64.b64decode(data)).hexdigest()
+            ground_truth = self.ground_truths.get(sha)
+            if ground_truth is not None:
+                return self._corrupt(ground_truth)
+            self.stats["unknown_images"] += 1
+        return self._corrupt(self.profile.canned_text)
+
+    def complete(self, body: dict) -> tuple[str, int]:
+        """
+        Get the response text of a chat completion request and its prompt tokens.
+        """
+        content = body.get("messages", [{}])[-1].get("content", "")
+        if isinstance(content, str):
+            return self._corrupt(self.profile.canned_text), len(content) // 4
+        image_urls = [part["image_url"]["url"] for part in content if part.get("type") == "image_url"]
+        prompt = sum(len(part.get("text", "")) for part in content) // 4 + 600 * len(image_urls)
+        lines = [self.transcribe(url) for url in image_urls]
+        if len(lines) == 1:
+            return lines[0], prompt
+        return "\n".join(f"{i}: {line}" for i, line in enumerate(lines, 1)), prompt
+
+    async def _respond(
+        self, writer: asyncio.StreamWriter, status: str, headers: dict, chunks: list[bytes], delay: float
+    ) -> None:
+        head = f"HTTP/1.1 {status}\r\nContent-Length: {sum(map(len, chunks))}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode() + b"\r\n")
+        for i, chunk in enumerate(chunks):
+            if delay and i:
+                await writer.drain()
+                await asyncio.sleep(delay)
+            writer.write(chunk)
+        await writer.drain()
+
+    async def _error(
+        self, writer: asyncio.StreamWriter, status: str, message: str, headers: dict | None = None
+    ) -> None:
+        payload = json.dumps({"error": {"message": message, "code": int(status.split()[0])}}).encode()
+        await self._respond(writer, status, {"Content-Type": "application/json", **(headers or {})}, [payload], 0.0)
+
+    async def _chat_completion(self, writer: asyncio.StreamWriter, body: dict) -> None:
+        profile = self.profile
+        if self._throttled():
+            self.stats["throttled"] += 1
+            headers = {"Retry-After": f"{profile.retry_after:g}"} if profile.retry_after is not None else {}
+            await self._error(writer, "429 Too Many Requests", "Rate limit exceeded", headers)
+            return
+        if self.random.random() < profile.error_rate:
+            self.stats["errors"] += 1
+            await self._error(writer, "500 Internal Server Error", "Internal server error")
+            return
+
+        text, prompt_tokens = self.complete(body)
+        completion_tokens = max(1, len(text) // 3)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        await asyncio.sleep(self._latency())
+        self.stats["completions"] += 1
+
+        base = {"id": "mock", "created": int(time.time()), "model": body.get("model", "")}
+        if not body.get("stream"):
+            payload = json.dumps({
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }).encode()
+            await self._respond(writer, "200 OK", {"Content-Type": "application/json"}, [payload], 0.0)
+            return
+
+        base["object"] = "chat.completion.chunk"
+        step = profile.chunk_chars
+        events = [
+            {
+                **base,
+                "choices": [
+                    {"index": 0, "delta": {"role": "assistant", "content": text[i:i + step]}, "finish_reason": None}
+                ],
+            }
+            for i in range(0, max(len(text), 1), step)
+        ]
+        events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        events.append({**base, "choices": [], "usage": usage})
+        slow = self.random.random() < profile.slow_stream_rate
+        delay = profile.slow_chunk_delay if slow else profile.chunk_delay
+        await self._respond(writer, "200 OK", {"Content-Type": "text/event-stream"}, _sse(events), delay)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["connections"] += 1
+        try:
+            while request_line := await reader.readline():
+                method, path, _ = request_line.decode().split(" ", 2)
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                raw = await reader.readexactly(length) if length else b""
+                self.stats["requests"] += 1
+                self.stats["bytes_in"] += len(raw)
+
+                if method == "POST" and path.endswith("/chat/completions"):
+                    await self._chat_completion(writer, json.loads(raw))
+                elif method == "GET" and path.endswith("/stats"):
+                    usage = resource.getrusage(resource.RUSAGE_SELF)
+                    stats = {**self.stats, "cpu_seconds": usage.ru_utime + usage.ru_stime}
+                    payload = json.dumps(stats).encode()
+                    await self._respond(writer, "200 OK", {"Content-Type": "application/json"}, [payload], 0.0)
+                elif method == "GET" and path.endswith("/models"):
+                    payload = json.dumps({"object": "list", "data": []}).encode()
+                    await self._respond(writer, "200 OK", {"Content-Type": "application/json"}, [payload], 0.0)
+                else:
+                    await self._error(writer, "404 Not Found", f"No route for {method} {path}")
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(server: MockServer, host: str, port: int) -> None:
+    listener = await asyncio.start_server(server.handle, host, port, backlog=1024)
+    bound_host, bound_port = listener.sockets[0].getsockname()[:2]
+    # Load tests read this line to find the port
+    print(f"Listening on http://{bound_host}:{bound_port}/v1", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8777, help="Port to listen on (0: any free port)")
+    parser.add_argument(
+        "--profile", default="instant", help=f"Preset ({', '.join(PROFILES)}) or YAML file of MockProfile fields"
+    )
+    parser.add_argument("--dataset", type=Path, help="Folder of images and ground truths to echo")
+    args = parser.parse_args()
+
+    try:
+        profile = load_profile(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    ground_truths = index_ground_truths(args.dataset) if args.dataset else {}
+    try:
+        asyncio.run(serve(MockServer(profile, ground_truths), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
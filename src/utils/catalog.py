@@ -0,0 +1,360 @@
+import json
+import os
+import random
+import sqlite3
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.tif'}
+
+
+def get_ground_truth_path(image_path: Path) -> Path:
+    """
+    Get the corresponding ground truth file path for an image.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        Path to the ground truth text file
+    """
+    return image_path.parent / get_ground_truth_filename(image_path.name)
+
+
+def get_ground_truth_filename(filename: str) -> str:
+    """
+    Get the ground truth file name for an image file name.
+
+    Args:
+        filename: Image file name, e.g. 00082.bin.png
+
+    Returns:
+        Ground truth file name, e.g. 00082.gt.txt
+    """
+    if filename.endswith('.bin.png'):
+        return filename.replace('.bin.png', '.gt.txt')
+    return filename.rsplit('.', 1)[0] + '.gt.txt'
+
+
+class CatalogImage(NamedTuple):
+    path: str
+    corpus: str
+    book: str
+    gt_chars: int
+    size: int
+
+
+class CatalogBook(NamedTuple):
+    path: str
+    corpus: str
+    book: str
+    image_count: int
+
+
+class _FolderScan(NamedTuple):
+    path: str
+    mtime_ns: int
+    subdirs: list[str]
+    images: list[tuple[str, int, int]] | None  # None when the cached listing is still valid
+
+
+class Catalog:
+    """
+    Persisted catalog of every image / ground truth pair under a dataset root.
+
+    The catalog records the corpus (first folder under the root), the book (the
+    folder holding the images), the ground truth length and the image size of
+    every line. It is built once with a parallel scandir walk and refreshed
+    incrementally: only folders whose mtime changed are listed again.
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Args:
+            db_path: SQLite file backing the catalog (created if missing)
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS folders (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                subdirs TEXT NOT NULL,
+                image_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                folder TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                gt_chars INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (folder, position)
+            );
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _scan_folder(path: str, cached: tuple[int, list[str]] | None, rescan: bool) -> _FolderScan:
+        """
+        Stat a folder and, if it changed, list its subfolders and image / GT pairs.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        if not rescan and cached is not None and cached[0] == mtime_ns:
+            return _FolderScan(path, mtime_ns, cached[1], None)
+
+        subdirs = []
+        files = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    files[entry.name] = entry
+
+        images = []
+        for name, entry in files.items():
+            if os.path.splitext(name.lower())[1] not in IMAGE_EXTENSIONS:
+                continue
+            gt_name = get_ground_truth_filename(name)
+            if gt_name not in files:
+                continue  # not an image / GT pair
+            try:
+                with open(files[gt_name].path, "rb") as f:
+                    gt_chars = len(f.read().decode("utf-8").strip())
+            except (OSError, UnicodeDecodeError):
+                continue
+            images.append((f"{path}/{name}", gt_chars, entry.stat().st_size))
+
+        return _FolderScan(path, mtime_ns, sorted(subdirs), sorted(images))
+
+    def refresh(self, root: Path, workers: int = 16, rescan: bool = False) -> int:
+        """
+        Bring the catalog up to date for everything under a dataset root.
+
+        Args:
+            root: Dataset root, e.g. GT4HistOCR/corpus
+            workers: Threads used to stat and list folders in parallel
+            rescan: Ignore cached listings and list every folder again
+
+        Returns:
+            Number of folders that had to be listed
+        """
+        root_path, lower, upper = self._range(root)
+        cached = {
+            path: (mtime_ns, json.loads(subdirs))
+            for path, mtime_ns, subdirs in self._conn.execute(
+                "SELECT path, mtime_ns, subdirs FROM folders WHERE path = ? OR (path >= ? AND path < ?)",
+                (root_path, lower, upper),
+            )
+        }
+
+        visited = set()
+        listed = 0
+        frontier = [root_path]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool, self._conn:
+            while frontier:
+                scans = pool.map(lambda path: self._scan_folder(path, cached.get(path), rescan), frontier)
+                frontier = []
+                for scan in scans:
+                    visited.add(scan.path)
+                    frontier.extend(f"{scan.path}/{name}" for name in scan.subdirs)
+                    if scan.images is None:
+                        continue
+
+                    listed += 1
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO folders (path, mtime_ns, subdirs, image_count) VALUES (?, ?, ?, ?)",
+                        (scan.path, scan.mtime_ns, json.dumps(scan.subdirs), len(scan.images)),
+                    )
+                    self._conn.execute("DELETE FROM images WHERE folder = ?", (scan.path,))
+                    self._conn.executemany(
+                        "INSERT INTO images (folder, position, path, gt_chars, size) VALUES (?, ?, ?, ?, ?)",
+                        (
+                            (scan.path, position, path, gt_chars, size)
+                            for position, (path, gt_chars, size) in enumerate(scan.images)
+                        ),
+                    )
+
+            for path in cached.keys() - visited:
+                self._conn.execute("DELETE FROM folders WHERE path = ?", (path,))
+                self._conn.execute("DELETE FROM images WHERE folder = ?", (path,))
+
+        return listed
+
+    def _range(self, root: Path) -> tuple[str, str, str]:
+        """
+        Get (root, lower, upper) bounds selecting a root folder and everything below it.
+
+        Range comparisons use the primary key index, which LIKE patterns can't.
+        """
+        root_path = root.as_posix().rstrip("/")
+        return root_path, f"{root_path}/", f"{root_path}0"  # "0" sorts right after "/"
+
+    def books(self, root: Path) -> list[CatalogBook]:
+        """
+        Get every cataloged folder holding images under a dataset root.
+
+        Args:
+            root: Dataset root the catalog was refreshed for
+
+        Returns:
+            Books ordered by path, with their corpus and image count
+        """
+        root_path, lower, upper = self._range(root)
+        books = []
+        for path, image_count in self._conn.execute(
+            "SELECT path, image_count FROM folders "
+            "WHERE image_count > 0 AND (path = ? OR (path >= ? AND path < ?)) ORDER BY path",
+            (root_path, lower, upper),
+        ):
+            relative = path[len(lower):] if path.startswith(lower) else ""
+            corpus = relative.split("/", 1)[0] if relative else root_path.rsplit("/", 1)[-1]
+            books.append(CatalogBook(path, corpus, path.rsplit("/", 1)[-1], image_count))
+        return books
+
+    def image_at(self, book: CatalogBook, position: int) -> CatalogImage:
+        """
+        Get the image at a position (0 .. image_count - 1) of a book.
+        """
+        path, gt_chars, size = self._conn.execute(
+            "SELECT path, gt_chars, size FROM images WHERE folder = ? AND position = ?",
+            (book.path, position),
+        ).fetchone()
+        return CatalogImage(path, book.corpus, book.book, gt_chars, size)
+
+    def images(self, root: Path) -> list[CatalogImage]:
+        """
+        Get every cataloged image under a dataset root.
+
+        Args:
+            root: Dataset root the catalog was refreshed for
+
+        Returns:
+            Catalog entries, grouped by book
+        """
+        entries = []
+        for book in self.books(root):
+            for path, gt_chars, size in self._conn.execute(
+                "SELECT path, gt_chars, size FROM images WHERE folder = ? ORDER BY position",
+                (book.path,),
+            ):
+                entries.append(CatalogImage(path, book.corpus, book.book, gt_chars, size))
+        return entries
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _draw(
+    count: int,
+    k: int,
+    fetch: Callable[[int], CatalogImage],
+    exclude: Callable[[CatalogImage], bool] | None,
+    rng: random.Random | None = None,
+) -> list[CatalogImage]:
+    """
+    Draw up to k distinct random items out of `count`, skipping excluded ones.
+
+    Only the drawn positions are fetched, so the cost depends on k (and on how many
+    candidates are excluded), not on the size of the stratum.
+    """
+    rng = rng or random.Random()
+    if exclude is None:
+        return [fetch(i) for i in rng.sample(range(count), min(k, count))]
+
+    picked = []
+    seen = set()
+    while len(picked) < k and len(seen) < count:
+        i = rng.randrange(count)
+        if i in seen:
+            continue
+        seen.add(i)
+        item = fetch(i)
+        if not exclude(item):
+            picked.append(item)
+    return picked
+
+
+def stratified_sample(
+    catalog: Catalog,
+    root: Path,
+    number_of_images: int,
+    strategy: str,
+    exclude: Callable[[CatalogImage], bool] | None = None,
+    rng: random.Random | None = None,
+) -> list[CatalogImage]:
+    """
+    Sample cataloged images per stratum.
+
+    Strategies:
+    - per_book: up to `number_of_images` from every book
+    - proportional: `number_of_images` in total, split across corpora in proportion
+      to their size (largest remainder), drawn uniformly within each corpus
+
+    Args:
+        catalog: Catalog refreshed for `root`
+        root: Dataset root to sample from
+        number_of_images: Images per book (per_book) or in total (proportional)
+        strategy: "per_book" or "proportional"
+        exclude: Predicate for images that must not be picked (e.g. already processed)
+        rng: Random generator to draw with, e.g. a seeded one for a repeatable sample
+
+    Returns:
+        The sampled images
+
+    Raises:
+        ValueError: If the strategy is unknown
+    """
+    books = catalog.books(root)
+
+    if strategy == "per_book":
+        return [
+            image
+            for book in books
+            for image in _draw(
+                book.image_count,
+                number_of_images,
+                lambda i, book=book: catalog.image_at(book, i),
+                exclude,
+                rng,
+            )
+        ]
+
+    if strategy == "proportional":
+        corpora: dict[str, list[CatalogBook]] = {}
+        for book in books:
+            corpora.setdefault(book.corpus, []).append(book)
+        sizes = {name: sum(book.image_count for book in items) for name, items in corpora.items()}
+        total = sum(sizes.values())
+        if total == 0:
+            return []
+
+        quotas = {name: number_of_images * size // total for name, size in sizes.items()}
+        by_remainder = sorted(sizes, key=lambda name: (number_of_images * sizes[name]) % total, reverse=True)
+        for name in by_remainder[: number_of_images - sum(quotas.values())]:
+            quotas[name] += 1
+
+        sample = []
+        for name, items in corpora.items():
+            # Map a corpus-wide index onto (book, position) through cumulative counts
+            offsets = list(accumulate(book.image_count for book in items))
+
+            def fetch(i: int, items=items, offsets=offsets) -> CatalogImage:
+                b = bisect_right(offsets, i)
+                start = offsets[b - 1] if b else 0
+                return catalog.image_at(items[b], i - start)
+
+            sample.extend(_draw(sizes[name], quotas[name], fetch, exclude, rng))
+        return sample
+
+    raise ValueError(f"Unknown sampling strategy: {strategy}")
@@ -1,5 +1,22 @@
 import base64
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import threading
 from pathlib import Path
+from typing import Any
+
+from PIL import Image
+
+
+# Output formats of preprocess_image: Pillow format name, MIME type and save options
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
 
 def convert_to_b64(image_path: Path) -> str:
     """
@@ -12,8 +29,152 @@ def convert_to_b64(image_path: Path) -> str:
         Base64 encoded string of the image content
     """
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+        return encode_b64(image_file.read())
+
+
+def encode_b64(data: bytes) -> str:
+    """
+    Encode raw image bytes as base64.
+    
+    Args:
+        data: Image file content
+        
+    Returns:
+        Base64 encoded string of the content
+    """
+    return base64.b64encode(data).decode('utf-8')
+
+
+def get_mime_type(image_path: Path) -> str:
+    """
+    Get the MIME type of an image from its extension.
+    
+    Args:
+        image_path: Path to the image file, e.g. 00082.bin.png
+        
+    Returns:
+        MIME type, e.g. image/png (image/jpeg if the extension is unknown)
+    """
+    mime_type, _ = mimetypes.guess_type(image_path.name)
+    return mime_type if mime_type and mime_type.startswith("image/") else "image/jpeg"
+
+
+def to_data_url(data: bytes, mime_type: str) -> str:
+    """
+    Encode raw image bytes as a base64 data URL.
     
+    Args:
+        data: Image file content
+        mime_type: MIME type of the content
+        
+    Returns:
+        Data URL, e.g. data:image/png;base64,...
+    """
+    return f"data:{mime_type};base64,{encode_b64(data)}"
+    
+
+
+def get_data_mime_type(data: bytes) -> str | None:
+    """
+    Get the MIME type of encoded image bytes from their signature.
+    
+    Args:
+        data: Image file content
+        
+    Returns:
+        MIME type for PNG, JPEG and WebP content, None otherwise
+    """
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def preprocess_image(
+    data: bytes,
+    max_height: int | None = None,
+    color: str = "original",
+    image_format: str = "original",
+    quality: int = 85,
+) -> bytes:
+    """
+    Shrink an image before upload.
+    
+    Args:
+        data: Image file content
+        max_height: Downscale (keeping the aspect ratio) to at most this height in pixels
+        color: "original", "grayscale" or "binary" (1-bit, thresholded at mid-gray)
+        image_format: "original" (PNG for formats other than PNG/JPEG/WebP), "png"
+            (optimized), "webp" or "jpeg"
+        quality: Encoder quality for WebP and JPEG (1-100)
+        
+    Returns:
+        The re-encoded image
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = source.copy()
+        source_format = (source.format or "").lower()
+
+    if max_height and image.height > max_height:
+        width = max(1, round(image.width * max_height / image.height))
+        image = image.resize((width, max_height), Image.Resampling.LANCZOS)
+
+    if color == "grayscale":
+        image = image.convert("L")
+    elif color == "binary":
+        image = image.convert("L").point(lambda value: 255 if value >= 128 else 0, mode="1")
+
+    if image_format == "original":
+        image_format = source_format if source_format in IMAGE_FORMATS else "png"
+    pillow_format, _ = IMAGE_FORMATS[image_format]
+
+    options: dict[str, Any] = {}
+    if image_format == "png":
+        options["optimize"] = True
+    elif image_format == "webp":
+        options.update(quality=quality, method=6)
+    else:
+        options.update(quality=quality, optimize=True)
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("L" if image.mode in ("1", "LA") else "RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=pillow_format, **options)
+    return buffer.getvalue()
+
+
+def preprocess_image_cached(data: bytes, options: dict[str, Any], cache_dir: Path) -> bytes:
+    """
+    Preprocess an image, reusing earlier output stored on disk.
+    
+    Output is cached by the hash of the source content and the options, so every
+    variant of an image is computed once across runs.
+    
+    Args:
+        data: Image file content
+        options: Keyword arguments of preprocess_image
+        cache_dir: Folder holding the preprocessed images
+        
+    Returns:
+        The re-encoded image
+    """
+    key = hashlib.sha256(data + json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+    cached_path = cache_dir / key[:2] / key
+    try:
+        return cached_path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    processed = preprocess_image(data, **options)
+    cached_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cached_path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(processed)
+    tmp_path.replace(cached_path)
+    return processed
+
 
 # def convert_to_b64(buffer):
 #     buffer.seek(0)
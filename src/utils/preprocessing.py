@@ -1,29 +1,44 @@
-from benchmark.results_manager import is_image_processed_by_any_model
+from benchmark.results_manager import get_processed_index, get_result_key, get_state_dir
+from utils.catalog import IMAGE_EXTENSIONS, Catalog, stratified_sample
 
 from pathlib import Path
 
 import random
 import os
+import sys
 
 
-def is_image_processed(image_path: Path, benchmarks_root: Path = Path("benchmarks")) -> bool:
+def is_image_processed(
+    image_path: Path,
+    benchmarks_root: Path = Path("benchmarks"),
+    model_ids: list[str] | None = None,
+) -> bool:
     """
-    Check if an image has already been processed by any model.
+    Check if an image has already been processed.
     
     Args:
         image_path: Path to the image file
         benchmarks_root: Root directory for all benchmarks
+        model_ids: If given, the image counts as processed only once every one of
+            these models has a result for it; otherwise any model will do
         
     Returns:
-        True if the image has been processed by any model, False otherwise
+        True if the image has already been processed, False otherwise
     """
-    return is_image_processed_by_any_model(image_path, benchmarks_root)
+    index = get_processed_index(benchmarks_root)
+    result_key = get_result_key(image_path)
+    
+    if model_ids is None:
+        return index.is_processed_by_any(result_key)
+    return all(index.is_processed(result_key, model_id) for model_id in model_ids)
 
 
 def random_selection(
     corpora: Path, 
     number_of_images: int, 
-    avoid_rescan: bool = False
+    avoid_rescan: bool = False,
+    model_ids: list[str] | None = None,
+    seed: int | None = None,
 ) -> list[Path]:
     """
     Randomly select images from a corpus.
@@ -32,18 +47,21 @@ def random_selection(
         corpora: Path to the directory containing images
         number_of_images: Number of images to select
         avoid_rescan: If True, only select images that haven't been processed yet
+        model_ids: Models the selection is for. With avoid_rescan, an image is kept
+            as long as at least one of them has not processed it yet
+        seed: Seed of the draw; the same seed selects the same images from the
+            same folder, on any machine
         
     Returns:
         List of selected image paths
     """
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.tif'}
     image_files = []
     
-    for file in os.listdir(corpora):
-        if os.path.splitext(file.lower())[1] in image_extensions:
+    for file in sorted(os.listdir(corpora)):
+        if os.path.splitext(file.lower())[1] in IMAGE_EXTENSIONS:
             image_path = corpora / file
             
-            if avoid_rescan and is_image_processed(image_path):
+            if avoid_rescan and is_image_processed(image_path, model_ids=model_ids):
                 continue
                 
             image_files.append(image_path)
@@ -53,6 +71,102 @@ def random_selection(
     
     actual_count = min(number_of_images, len(image_files))
     
-    sample = random.sample(image_files, actual_count)
+    sample = random.Random(seed).sample(image_files, actual_count)
     
     return sample
+
+
+def get_catalog(benchmarks_root: Path = Path("benchmarks")) -> Catalog:
+    """
+    Open the persisted dataset catalog.
+    
+    Args:
+        benchmarks_root: Root directory for all benchmarks (the catalog lives in its state directory)
+        
+    Returns:
+        The dataset catalog
+    """
+    return Catalog(get_state_dir(benchmarks_root) / "catalog.sqlite")
+
+
+def stratified_selection(
+    corpora: Path,
+    number_of_images: int,
+    strategy: str,
+    avoid_rescan: bool = False,
+    model_ids: list[str] | None = None,
+    seed: int | None = None,
+) -> list[Path]:
+    """
+    Select images across a whole dataset tree (e.g. GT4HistOCR/corpus) by stratum.
+    
+    The catalog is refreshed incrementally first, so only folders that changed
+    since the last selection are listed again.
+    
+    Args:
+        corpora: Dataset root containing corpus / book folders
+        number_of_images: Images per book (per_book) or in total (proportional)
+        strategy: "per_book" or "proportional"
+        avoid_rescan: If True, only select images that haven't been processed yet
+        model_ids: Models the selection is for (see random_selection)
+        seed: Seed of the draw (see random_selection)
+        
+    Returns:
+        List of selected image paths
+    """
+    def already_processed(entry) -> bool:
+        return is_image_processed(Path(entry.path), model_ids=model_ids)
+    
+    catalog = get_catalog()
+    try:
+        catalog.refresh(corpora)
+        sample = stratified_sample(
+            catalog,
+            corpora,
+            number_of_images,
+            strategy,
+            already_processed if avoid_rescan else None,
+            random.Random(seed),
+        )
+    finally:
+        catalog.close()
+    
+    return [Path(entry.path) for entry in sample]
+
+
+def select_images(cfg, for_shard: bool = False) -> list[Path]:
+    """
+    Select the images a run will process, following the configured sampling.
+    
+    A selection smaller than images_to_process (e.g. because most images were
+    already processed) is reported on stderr.
+    
+    Args:
+        cfg: Configuration object (source, images_to_process, sampling,
+            avoid_rescan, seed and models)
+        for_shard: Draw from every image, processed or not, so that machines
+            with different local results select the same images for a sharded
+            run; processed (model, image) pairs are still skipped when the run
+            is planned
+        
+    Returns:
+        List of selected image paths
+    """
+    model_ids = [model.result_id for model in cfg.models]
+    avoid_rescan = cfg.avoid_rescan and not for_shard
+    if cfg.sampling == "random":
+        images = random_selection(
+            cfg.source, cfg.images_to_process, avoid_rescan, model_ids=model_ids, seed=cfg.seed
+        )
+    else:
+        images = stratified_selection(
+            cfg.source, cfg.images_to_process, cfg.sampling, avoid_rescan, model_ids=model_ids, seed=cfg.seed
+        )
+    
+    if len(images) < cfg.images_to_process:
+        print(
+            f"Selected {len(images)} of the {cfg.images_to_process} images to process: the source has too few"
+            + (" unprocessed images" if avoid_rescan else " images"),
+            file=sys.stderr,
+        )
+    return images